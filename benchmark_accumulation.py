@@ -0,0 +1,63 @@
+import argparse
+import math
+
+import numpy as np
+
+import rtx
+
+
+def build_scene():
+    scene = rtx.Scene(ambient_color=(0, 0, 0))
+    geometry = rtx.BoxGeometry(1, 1, 1)
+    material = rtx.LambertMaterial(0.8)
+    mapping = rtx.SolidColorMapping((1, 1, 1))
+    scene.add(rtx.Object(geometry, material, mapping))
+
+    geometry = rtx.PlainGeometry(50, 50)
+    geometry.set_rotation((0, math.pi / 2, 0))
+    geometry.set_position((-10, 0, 0))
+    material = rtx.EmissiveMaterial(10, visible=False)
+    mapping = rtx.SolidColorMapping((1, 1, 1))
+    scene.add(rtx.Object(geometry, material, mapping))
+    return scene
+
+
+def main():
+    rt_args = rtx.RayTracingArguments()
+    rt_args.num_rays_per_pixel = args.num_rays_per_pixel
+    rt_args.max_bounce = 1
+    cuda_args = rtx.CUDAKernelLaunchArguments()
+    cuda_args.num_threads = 64
+    cuda_args.num_rays_per_thread = args.num_rays_per_thread
+
+    scene = build_scene()
+    camera = rtx.OrthographicCamera()
+    camera.look_at((3, 3, 3), (0, 0, 0), up=(0, 1, 0))
+
+    # Time spent summing the rays of each pixel and writing the
+    # mean into the NumPy buffer, excluding the path tracing kernel
+    print("{:<12}{:>18}{:>18}".format("image size", "reduce+copy [ms]",
+                                      "ns / pixel"))
+    for image_size in args.image_sizes:
+        renderer = rtx.Renderer(backend=args.backend)
+        render_buffer = np.zeros((image_size, image_size, 3), dtype=np.float32)
+        elapsed = []
+        for _ in range(args.num_renders):
+            renderer.render(scene, camera, rt_args, cuda_args, render_buffer)
+            elapsed.append(renderer.accumulation_milliseconds)
+        # The first render includes page faults of the new buffers
+        elapsed = np.median(elapsed[1:]) if len(elapsed) > 1 else elapsed[0]
+        print("{:<12}{:>18.3f}{:>18.2f}".format(
+            "{}x{}".format(image_size, image_size), elapsed,
+            elapsed * 1e6 / image_size**2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", type=str, default="cuda")
+    parser.add_argument("--image-sizes", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--num-rays-per-pixel", type=int, default=512)
+    parser.add_argument("--num-rays-per-thread", type=int, default=32)
+    parser.add_argument("--num-renders", type=int, default=10)
+    args = parser.parse_args()
+    main()
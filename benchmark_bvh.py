@@ -0,0 +1,102 @@
+import argparse
+import time
+
+import numpy as np
+
+import rtx
+
+
+def uv_sphere_mesh(num_rings, num_segments):
+    theta = np.linspace(0, np.pi, num_rings + 1)
+    phi = np.linspace(0, 2 * np.pi, num_segments + 1)
+    theta, phi = np.meshgrid(theta, phi, indexing="ij")
+    vertices = np.stack(
+        [np.sin(theta) * np.cos(phi),
+         np.cos(theta),
+         np.sin(theta) * np.sin(phi)], axis=-1).reshape((-1, 3))
+    faces = []
+    for ring in range(num_rings):
+        for segment in range(num_segments):
+            a = ring * (num_segments + 1) + segment
+            b = a + num_segments + 1
+            faces.append((a, b, a + 1))
+            faces.append((a + 1, b, b + 1))
+    return np.array(faces, dtype=np.int32), vertices.astype(np.float32)
+
+
+def terrain_mesh(resolution, random_state):
+    x, z = np.meshgrid(
+        np.linspace(-1, 1, resolution + 1), np.linspace(-1, 1, resolution + 1))
+    y = 0.2 * np.sin(4 * x) * np.cos(3 * z) + 0.02 * random_state.normal(size=x.shape)
+    vertices = np.stack([x, y, z], axis=-1).reshape((-1, 3))
+    faces = []
+    for row in range(resolution):
+        for column in range(resolution):
+            a = row * (resolution + 1) + column
+            b = a + resolution + 1
+            faces.append((a, b, a + 1))
+            faces.append((a + 1, b, b + 1))
+    return np.array(faces, dtype=np.int32), vertices.astype(np.float32)
+
+
+def triangle_soup_mesh(num_faces, random_state):
+    # Clusters of small triangles with very different densities,
+    # closer to an imported scene than a regular tessellation
+    num_clusters = 32
+    centers = random_state.uniform(-1, 1, size=(num_clusters, 3))
+    scales = random_state.uniform(0.01, 0.3, size=(num_clusters, 1))
+    assignment = random_state.randint(0, num_clusters, size=num_faces)
+    positions = centers[assignment] + scales[assignment] * random_state.normal(
+        size=(num_faces, 3))
+    vertices = positions[:, None, :] + 0.02 * random_state.normal(size=(num_faces, 3, 3))
+    faces = np.arange(num_faces * 3).reshape((num_faces, 3))
+    return faces.astype(np.int32), vertices.reshape((-1, 3)).astype(np.float32)
+
+
+def generate_rays(num_rays, random_state):
+    # From a sphere around the mesh towards points inside its bounding box
+    origins = random_state.normal(size=(num_rays, 3))
+    origins = 4 * origins / np.linalg.norm(origins, axis=1, keepdims=True)
+    targets = random_state.uniform(-1, 1, size=(num_rays, 3))
+    directions = targets - origins
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return origins.astype(np.float32), directions.astype(np.float32)
+
+
+def main():
+    random_state = np.random.RandomState(0)
+    meshes = [
+        ("sphere mesh", uv_sphere_mesh(args.mesh_resolution // 2, args.mesh_resolution)),
+        ("terrain mesh", terrain_mesh(args.mesh_resolution, random_state)),
+        ("triangle soup", triangle_soup_mesh(args.mesh_resolution**2, random_state)),
+    ]
+    geometries = [
+        ("box", rtx.BoxGeometry(2, 2, 2), 12),
+        ("sphere", rtx.SphereGeometry(1), 1),
+    ]
+    for name, (faces, vertices) in meshes:
+        geometries.append((name, rtx.StandardGeometry(faces, vertices, args.triangles_per_node),
+                           len(faces)))
+    ray_origins, ray_directions = generate_rays(args.num_rays, random_state)
+
+    print("{:<16}{:>10}{:>12}{:>10}{:>14}".format("geometry", "faces", "build [ms]", "nodes",
+                                                  "steps / ray"))
+    for name, geometry, num_faces in geometries:
+        start = time.time()
+        for _ in range(args.num_builds):
+            bvh = rtx.BVH(geometry)
+        build_elapsed = (time.time() - start) / args.num_builds
+
+        num_steps = bvh.count_traversal_steps(ray_origins, ray_directions)
+        print("{:<16}{:>10}{:>12.2f}{:>10}{:>14.2f}".format(
+            name, num_faces, build_elapsed * 1000, bvh.num_nodes(), np.mean(num_steps)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mesh-resolution", type=int, default=300)
+    parser.add_argument("--triangles-per-node", type=int, default=25)
+    parser.add_argument("--num-rays", type=int, default=100000)
+    parser.add_argument("--num-builds", type=int, default=3)
+    args = parser.parse_args()
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import math
+import numpy as np
+
+import c_gqn
+
+
+def get_squared_distance_loop(img_original, img_predict):
+    total_distance = 0
+    regional_distance = np.zeros(img_original.shape[1:] + (3, ))
+
+    img_original = img_original.transpose((1, 2, 0)).astype(np.float32)
+    img_predict = img_predict.transpose((1, 2, 0)).astype(np.float32)
+
+    for i, (row_orig, row_pred) in enumerate(zip(img_original, img_predict)):
+        for j, (dot_orig, dot_pred) in enumerate(zip(row_orig, row_pred)):
+            for k, (rgb_orig, rgb_pred) in enumerate(zip(dot_orig, dot_pred)):
+                distance = 0.5 * (rgb_orig - rgb_pred)**2
+                total_distance += distance
+                regional_distance[i][j][0] += distance
+                regional_distance[i][j][1] += distance
+                regional_distance[i][j][2] += distance
+
+    regional_distance = regional_distance.transpose((2, 0, 1))
+
+    return total_distance, regional_distance
+
+
+def get_KL_div_loop(img_original, img_predict):
+    img_original = img_original.transpose((1, 2, 0)).astype(np.float32)
+    img_predict = img_predict.transpose((1, 2, 0)).astype(np.float32)
+
+    img_pixel_num = img_original.shape[0] * img_original.shape[1]
+
+    img_original = cv2.cvtColor(img_original, cv2.COLOR_RGB2GRAY)
+    img_predict = cv2.cvtColor(img_predict, cv2.COLOR_RGB2GRAY)
+
+    img_original_flat = [int(item * 255) for sublist in img_original for item in sublist]
+    img_predict_flat = [int(item * 255) for sublist in img_predict for item in sublist]
+
+    bit_per_pixel = 8
+    entropy_original = 0
+    entropy_original_gen = 0
+
+    for i in range(2**bit_per_pixel - 1):
+        original_i_ratio = len([x for x in img_original_flat if x == i]) / img_pixel_num
+        gen_i_ratio = len([x for x in img_predict_flat if x == i]) / img_pixel_num
+
+        if gen_i_ratio > 0:
+            entropy_original_gen += original_i_ratio * math.log(gen_i_ratio)
+        if original_i_ratio > 0:
+            entropy_original += original_i_ratio * math.log(original_i_ratio)
+
+    entropy_original_gen = -entropy_original_gen
+    entropy_original = -entropy_original
+
+    KL_divergence = entropy_original_gen - entropy_original
+
+    return KL_divergence if KL_divergence > 0 else 0
+
+
+def load_rotations(dataset_path):
+    # Each file holds [images, original_images] saved by generate_obs_image.py
+    rotations = []
+    for path in sorted(glob.glob(os.path.join(dataset_path, "test_data", "*.npy"))):
+        data = np.load(path, allow_pickle=True)
+        original_images = np.asarray(list(data[1]), dtype=np.uint8)
+        # (frames, H, W, 3) -> (frames, 3, H, W) in [0, 1]
+        rotations.append(original_images.transpose((0, 3, 1, 2)).astype(np.float32) / 255)
+    return rotations
+
+
+def benchmark_squared_distance(rotations):
+    loop_elapsed = 0
+    batch_elapsed = 0
+    max_error = 0
+    for images_original in rotations:
+        # Compare each frame with the next one in the rotation
+        images_predict = np.roll(images_original, 1, axis=0)
+
+        start = time.time()
+        loop_results = [
+            get_squared_distance_loop(original, predict)
+            for original, predict in zip(images_original, images_predict)
+        ]
+        loop_elapsed += time.time() - start
+
+        start = time.time()
+        total_distance, regional_distance = c_gqn.math.get_squared_distance_batch(
+            images_original, images_predict)
+        batch_elapsed += time.time() - start
+
+        for n, (total, regional) in enumerate(loop_results):
+            max_error = max(max_error,
+                            abs(float(total) - float(total_distance[n])) / max(abs(float(total)), 1e-8))
+            max_error = max(max_error,
+                            float(np.max(np.abs(regional - regional_distance[n]))))
+
+    print("squared distance")
+    print("    loop:  {:.3f} sec".format(loop_elapsed))
+    print("    batch: {:.3f} sec".format(batch_elapsed))
+    print("    speedup: {:.1f}x".format(loop_elapsed / max(batch_elapsed, 1e-8)))
+    print("    max error: {:.3e}".format(max_error))
+
+
+def benchmark_KL_div(rotations):
+    loop_elapsed = 0
+    batch_elapsed = 0
+    num_mismatches = 0
+    for images_original in rotations:
+        images_predict = np.roll(images_original, 1, axis=0)
+
+        start = time.time()
+        loop_results = [
+            get_KL_div_loop(original, predict)
+            for original, predict in zip(images_original, images_predict)
+        ]
+        loop_elapsed += time.time() - start
+
+        start = time.time()
+        KL_divergence = c_gqn.math.get_KL_div_batch(images_original, images_predict)
+        batch_elapsed += time.time() - start
+
+        for n, value in enumerate(loop_results):
+            if value != KL_divergence[n]:
+                num_mismatches += 1
+
+    print("KL divergence")
+    print("    loop:  {:.3f} sec".format(loop_elapsed))
+    print("    batch: {:.3f} sec".format(batch_elapsed))
+    print("    speedup: {:.1f}x".format(loop_elapsed / max(batch_elapsed, 1e-8)))
+    print("    mismatches: {}".format(num_mismatches))
+
+
+def main():
+    rotations = load_rotations(args.dataset_path)
+    if args.num_rotations > 0:
+        rotations = rotations[:args.num_rotations]
+    assert len(rotations) > 0
+    print("{} rotations, {} frames each".format(len(rotations), rotations[0].shape[0]))
+
+    benchmark_squared_distance(rotations)
+    benchmark_KL_div(rotations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset-path", "-dataset", type=str)
+    parser.add_argument("--num-rotations", "-n", type=int, default=10)
+    args = parser.parse_args()
+    main()
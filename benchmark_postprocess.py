@@ -0,0 +1,54 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import gqn
+
+
+def to_image_per_frame(render_buffer):
+    # Convert to sRGB
+    image = np.power(np.clip(render_buffer, 0, 1), 1.0 / 2.2)
+    image = np.uint8(image * 255)
+    image = cv2.bilateralFilter(image, 3, 25, 25)
+    return image
+
+
+def main():
+    # One scene: the rotation frames followed by the views
+    num_frames = args.frames_per_rotation + args.num_views_per_scene
+    random_state = np.random.RandomState(0)
+    render_buffers = random_state.uniform(
+        -0.1, 1.2, size=(num_frames, args.image_size, args.image_size,
+                         3)).astype(np.float32)
+    out = np.empty(render_buffers.shape, dtype=np.uint8)
+
+    start = time.time()
+    for _ in range(args.num_scenes):
+        expected = np.stack(
+            [to_image_per_frame(render_buffer) for render_buffer in render_buffers])
+    per_frame_elapsed = time.time() - start
+
+    start = time.time()
+    for _ in range(args.num_scenes):
+        gqn.postprocess.to_images(render_buffers, out=out, num_threads=args.num_threads)
+    batch_elapsed = time.time() - start
+
+    print("{} scenes, {} frames of {}x{}".format(args.num_scenes, num_frames, args.image_size,
+                                               args.image_size))
+    print("    per frame: {:.3f} sec".format(per_frame_elapsed))
+    print("    batch:     {:.3f} sec".format(batch_elapsed))
+    print("    speedup: {:.2f}x".format(per_frame_elapsed / max(batch_elapsed, 1e-8)))
+    print("    mismatches: {}".format(np.count_nonzero(expected != out)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-scenes", "-n", type=int, default=200)
+    parser.add_argument("--num-views-per-scene", "-k", type=int, default=15)
+    parser.add_argument("--frames-per-rotation", type=int, default=24)
+    parser.add_argument("--image-size", type=int, default=64)
+    parser.add_argument("--num-threads", type=int, default=0)
+    args = parser.parse_args()
+    main()
@@ -0,0 +1,20 @@
+import argparse
+
+from gqn.data import index
+
+
+def main():
+    dataset_index = index.update(args.dataset_directory)
+    print("{} observations in {} files".format(
+        dataset_index["num_observations"], len(dataset_index["files"])))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dataset-directory",
+        "-dataset",
+        type=str,
+        default="dataset_shepard_matzler_train")
+    args = parser.parse_args()
+    main()
@@ -1,3 +1,3 @@
 from .dataset import Dataset
-from .sampler import Sampler
+from .sampler import Sampler, GlobalSampler
 from .iterator import Iterator
\ No newline at end of file
@@ -0,0 +1,179 @@
+import json
+import mmap
+import zlib
+import numpy as np
+
+# Layout of a .chunks file:
+#   magic | chunk 0 | chunk 1 | ... | offsets | header | offsets position, header size, magic
+# Each chunk is one compressed scene, i.e. one row along the first axis.
+# offsets holds num_scenes + 1 uint64 positions, so scene i is stored in
+# [offsets[i], offsets[i + 1]) and can be decoded on its own.
+MAGIC = b"GQNCHUNK"
+EXTENSION = ".chunks"
+FOOTER_SIZE = 16 + len(MAGIC)
+
+codecs = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "none": (lambda data, level: data, bytes),
+}
+
+
+class ChunkedWriter():
+    # Appends scenes one by one, so a file can be written without holding it in memory.
+    # scene_shape and dtype are taken from the first scene unless given, and
+    # are required to write a file without scenes
+    def __init__(self, path, codec="zlib", level=1, scene_shape=None, dtype=None):
+        assert codec in codecs
+        self.path = path
+        self.codec = codec
+        self.level = level
+        self.compress = codecs[codec][0]
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.offsets = [self.file.tell()]
+        self.scene_shape = None if scene_shape is None else tuple(scene_shape)
+        self.dtype = None if dtype is None else np.dtype(dtype)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def append(self, scene):
+        scene = np.ascontiguousarray(scene)
+        if self.scene_shape is None:
+            self.scene_shape = scene.shape
+        if self.dtype is None:
+            self.dtype = scene.dtype
+        assert scene.shape == self.scene_shape
+        assert scene.dtype == self.dtype
+        self.file.write(self.compress(scene.tobytes(), self.level))
+        self.offsets.append(self.file.tell())
+
+    def __setitem__(self, index, scene):
+        # Lets the writer stand in for a preallocated array that is filled in order
+        assert index == len(self)
+        self.append(scene)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.scene_shape is None or self.dtype is None:
+            self.file.close()
+            self.file = None
+            raise ValueError("scene_shape and dtype are unknown for {} without scenes".format(self.path))
+        offsets_position = self.file.tell()
+        self.file.write(np.asarray(self.offsets, dtype=np.uint64).tobytes())
+        header = json.dumps({
+            "codec": self.codec,
+            "shape": (len(self), ) + tuple(self.scene_shape),
+            "dtype": np.lib.format.dtype_to_descr(self.dtype),
+        }).encode("utf-8")
+        self.file.write(header)
+        self.file.write(np.asarray([offsets_position, len(header)], dtype=np.uint64).tobytes())
+        self.file.write(MAGIC)
+        self.file.close()
+        self.file = None
+
+
+class ChunkedArray():
+    # Read-only array over a .chunks file that decodes only the scenes it is indexed with
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # The mapping stays valid after the file is closed
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        assert self.buffer[:len(MAGIC)] == MAGIC
+        footer = self.buffer[-FOOTER_SIZE:]
+        assert footer[16:] == MAGIC
+        offsets_position, header_size = np.frombuffer(footer[:16], dtype=np.uint64)
+        offsets_position, header_size = int(offsets_position), int(header_size)
+        header_position = len(self.buffer) - FOOTER_SIZE - header_size
+        header = json.loads(self.buffer[header_position:header_position + header_size].decode("utf-8"))
+        self.shape = tuple(header["shape"])
+        self.dtype = np.dtype(header["dtype"])
+        self.codec = header["codec"]
+        self.decompress = codecs[self.codec][1]
+        self.offsets = np.frombuffer(
+            self.buffer, dtype=np.uint64, count=self.shape[0] + 1, offset=offsets_position).copy()
+        assert offsets_position + self.offsets.nbytes == header_position
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def read_scene(self, index, out=None):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        data = self.decompress(memoryview(self.buffer)[start:end])
+        scene = np.frombuffer(data, dtype=self.dtype).reshape(self.shape[1:])
+        if out is None:
+            return scene.copy()
+        out[...] = scene
+        return out
+
+    def take(self, indices, axis=0, out=None, mode="raise"):
+        assert axis == 0
+        indices = np.asarray(indices)
+        if np.any(indices < -len(self)) or np.any(indices >= len(self)):
+            raise IndexError("index out of range for {} scenes".format(len(self)))
+        if out is None:
+            out = np.empty(indices.shape + self.shape[1:], dtype=self.dtype)
+        scenes = out.reshape((-1, ) + self.shape[1:])
+        for position, index in enumerate(indices.reshape(-1)):
+            if index < 0:
+                index += len(self)
+            self.read_scene(int(index), out=scenes[position])
+        return out
+
+    def __getitem__(self, indices):
+        if isinstance(indices, tuple):
+            # Rows are selected by the first key and the rest applies to the decoded scenes
+            if len(indices) == 0 or indices[0] is Ellipsis or indices[0] is None:
+                return self[:][indices]
+            rows = self[indices[0]]
+            if isinstance(indices[0], slice) or np.ndim(indices[0]) > 0:
+                return rows[(slice(None), ) + indices[1:]]
+            return rows[indices[1:]]
+        if isinstance(indices, slice):
+            return self.take(np.arange(*indices.indices(len(self))))
+        if np.ndim(indices) == 0:
+            index = int(indices)
+            if index < 0:
+                index += len(self)
+            if index < 0 or index >= len(self):
+                raise IndexError(index)
+            return self.read_scene(index)
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return self.take(indices)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
+    def close(self):
+        self.buffer.close()
+
+
+def save(path, array, codec="zlib", level=1):
+    array = np.asanyarray(array)
+    writer = ChunkedWriter(
+        path, codec=codec, level=level, scene_shape=array.shape[1:], dtype=array.dtype)
+    for scene in array:
+        writer.append(scene)
+    writer.close()
+
+
+def load(path, mmap_mode=None):
+    # Like np.load: decoded at once, or decoded per scene on access when mmap_mode is set
+    array = ChunkedArray(path)
+    if mmap_mode is None:
+        data = array[:]
+        array.close()
+        return data
+    return array
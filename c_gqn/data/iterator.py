@@ -1,8 +1,12 @@
+import numpy as np
 from .sampler import Sampler
 
 class Iterator:
-    def __init__(self, subset, batch_size, drop_last=True):
-        self.sampler = Sampler(subset)
+    def __init__(self, subset, batch_size, drop_last=True, sampler=None):
+        # With a GlobalSampler, subset is dataset.observations, which gathers
+        # every batch of global indices file by file
+        self.subset = subset
+        self.sampler = Sampler(subset) if sampler is None else sampler
         self.drop_last = drop_last
         self.batch_size = batch_size
 
@@ -10,11 +14,25 @@ class Iterator:
         return len(self.sampler) // self.batch_size
 
     def __iter__(self):
-        batch = []
-        for index in self.sampler:
-            batch.append(int(index))
-            if len(batch) == self.batch_size:
-                yield batch
-                batch = []
-        if len(batch) > 0 and not self.drop_last:
-            yield batch
+        # Yields a slice for sequential batches and a sorted index array for shuffled ones
+        num_indices = len(self.sampler)
+        while self.sampler.position < num_indices:
+            start = self.sampler.position
+            stop = min(start + self.batch_size, num_indices)
+            if stop - start < self.batch_size and self.drop_last:
+                break
+            self.sampler.position = stop
+            if self.sampler.shuffle:
+                yield np.sort(self.sampler.indices(start, stop))
+            else:
+                yield slice(start, stop)
+        self.sampler.position = 0
+        self.sampler.epoch += 1
+
+    def batches(self, out=None):
+        # Every batch is written into the same preallocated arrays, which are
+        # overwritten on the next step
+        if out is None:
+            out = self.subset.empty_batch(self.batch_size)
+        for indices in self:
+            yield self.subset.take(indices, out)
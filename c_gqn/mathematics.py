@@ -1,3 +1,4 @@
+import functools
 import math
 import numpy as np
 import cv2
@@ -26,65 +27,92 @@ def pitch(eye, center):
     return rad
 
 
-def get_KL_div(img_original, img_predict):
-    assert img_original.shape == img_predict.shape
-    assert len(img_original.shape) <= 3
-    assert len(img_predict.shape) <= 3
+@functools.lru_cache(maxsize=None)
+def _get_log_ratio_table(img_pixel_num):
+    # log(count / img_pixel_num) for count = 1, ..., img_pixel_num
+    # math.log keeps the values identical to the per-pixel implementation
+    return np.array(
+        [0.0] + [math.log(count / img_pixel_num) for count in range(1, img_pixel_num + 1)],
+        dtype=np.float64)
 
-    img_original = img_original.transpose((1, 2, 0)).astype(np.float32)
-    img_predict = img_predict.transpose((1, 2, 0)).astype(np.float32)
 
-    img_shape = img_original.shape # ex) (64, 64) expected for black and white image
-    img_pixel_num = img_original.shape[0] * img_original.shape[1]
+def _get_intensity_histograms(images, bit_per_pixel):
+    # (N, C, H, W) -> (N, H, W) grayscale intensities
+    num_images = images.shape[0]
+    images = images.transpose((0, 2, 3, 1)).astype(np.float32)
+    height, width = images.shape[1], images.shape[2]
+    images = cv2.cvtColor(
+        images.reshape((num_images * height, width, 3)), cv2.COLOR_RGB2GRAY)
+    intensities = np.trunc(images * 255).astype(np.int64).reshape((num_images, -1))
 
-    if len(img_shape) == 3:
-        img_original = cv2.cvtColor(img_original, cv2.COLOR_RGB2GRAY)
-        img_predict = cv2.cvtColor(img_predict, cv2.COLOR_RGB2GRAY)
+    # Intensities outside [0, 2**bit_per_pixel - 1) are not counted
+    num_bins = 2**bit_per_pixel - 1
+    valid = np.logical_and(intensities >= 0, intensities < num_bins)
+    offsets = np.arange(num_images, dtype=np.int64)[:, None] * num_bins
+    histograms = np.bincount(
+        (intensities + offsets)[valid], minlength=num_images * num_bins)
+    return histograms.reshape((num_images, num_bins))
 
 
-    img_original_flat = [int(item * 255) for sublist in img_original for item in sublist]
-    img_predict_flat = [int(item * 255) for sublist in img_predict for item in sublist]
+def get_KL_div_batch(images_original, images_predict):
+    assert images_original.shape == images_predict.shape
+    assert len(images_original.shape) == 4
 
+    # (N, C, H, W)
+    img_pixel_num = images_original.shape[2] * images_original.shape[3]
     bit_per_pixel = 8
-    entropy_original = 0
-    entropy_original_gen = 0
 
-    for i in range(2**bit_per_pixel - 1):
-        original_i_ratio = len([x for x in img_original_flat if x == i]) / img_pixel_num
-        gen_i_ratio = len([x for x in img_predict_flat if x == i]) / img_pixel_num
+    histogram_original = _get_intensity_histograms(images_original, bit_per_pixel)
+    histogram_predict = _get_intensity_histograms(images_predict, bit_per_pixel)
+
+    log_ratio = _get_log_ratio_table(img_pixel_num)
+    original_ratio = histogram_original / img_pixel_num
 
-        if gen_i_ratio > 0:
-            entropy_original_gen += original_i_ratio * math.log(gen_i_ratio)
-        if original_i_ratio > 0:
-            entropy_original += original_i_ratio * math.log(original_i_ratio)
+    terms_original_gen = np.where(histogram_predict > 0,
+                                  original_ratio * log_ratio[histogram_predict], 0)
+    terms_original = np.where(histogram_original > 0,
+                              original_ratio * log_ratio[histogram_original], 0)
 
-    entropy_original_gen = -entropy_original_gen
-    entropy_original = -entropy_original
+    # Accumulate sequentially over intensities to match get_KL_div
+    entropy_original_gen = -np.cumsum(terms_original_gen, axis=1)[:, -1]
+    entropy_original = -np.cumsum(terms_original, axis=1)[:, -1]
 
     KL_divergence = entropy_original_gen - entropy_original
 
-    return KL_divergence if KL_divergence > 0 else 0
+    return np.maximum(KL_divergence, 0)
 
-def get_squared_distance(img_original, img_predict):
+
+def get_KL_div(img_original, img_predict):
     assert img_original.shape == img_predict.shape
     assert len(img_original.shape) <= 3
     assert len(img_predict.shape) <= 3
 
-    total_distance = 0
-    regional_distance = np.zeros((64, 64, 3))
+    KL_divergence = get_KL_div_batch(img_original[None, ...], img_predict[None, ...])[0]
 
-    img_original = img_original.transpose((1, 2, 0)).astype(np.float32)
-    img_predict = img_predict.transpose((1, 2, 0)).astype(np.float32)
+    return KL_divergence if KL_divergence > 0 else 0
 
-    for i, (row_orig, row_pred) in enumerate(zip(img_original, img_predict)):
-        for j, (dot_orig, dot_pred) in enumerate(zip(row_orig, row_pred)):
-            for k, (rgb_orig, rgb_pred) in enumerate(zip(dot_orig, dot_pred)):
-                distance = 0.5 * (rgb_orig - rgb_pred)**2
-                total_distance += distance
-                regional_distance[i][j][0] += distance
-                regional_distance[i][j][1] += distance
-                regional_distance[i][j][2] += distance
+def get_squared_distance_batch(images_original, images_predict):
+    assert images_original.shape == images_predict.shape
+    assert len(images_original.shape) == 4
+
+    # (N, C, H, W)
+    difference = images_original.astype(np.float32) - images_predict.astype(np.float32)
+    distance = 0.5 * difference**2
+
+    # Every channel of the regional map holds the distance summed over all channels
+    regional_distance = np.sum(distance, axis=1, keepdims=True)
+    total_distance = np.sum(regional_distance, axis=(1, 2, 3))
+    regional_distance = np.repeat(regional_distance, images_original.shape[1], axis=1)
+
+    return total_distance, regional_distance
+
+
+def get_squared_distance(img_original, img_predict):
+    assert img_original.shape == img_predict.shape
+    assert len(img_original.shape) <= 3
+    assert len(img_predict.shape) <= 3
 
-    regional_distance = regional_distance.transpose((2, 0, 1))
+    total_distance, regional_distance = get_squared_distance_batch(
+        img_original[None, ...], img_predict[None, ...])
 
-    return total_distance, regional_distance
\ No newline at end of file
+    return total_distance[0], regional_distance[0]
\ No newline at end of file
@@ -0,0 +1,50 @@
+import argparse
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+from gqn.data import chunked
+
+
+def main():
+    names = ["images", "viewpoints", "original_images"]
+    filenames = sorted(
+        filename
+        for filename in os.listdir(os.path.join(args.source_directory, "images"))
+        if filename.endswith(".npy"))
+
+    source_bytes = 0
+    output_bytes = 0
+    for filename in tqdm(filenames):
+        for name in names:
+            source_path = os.path.join(args.source_directory, name, filename)
+            if os.path.exists(source_path) is False:
+                continue
+            output_directory = os.path.join(args.output_directory, name)
+            os.makedirs(output_directory, exist_ok=True)
+            output_path = os.path.join(
+                output_directory,
+                os.path.splitext(filename)[0] + chunked.EXTENSION)
+
+            # Scenes are read one at a time from the memory map
+            array = np.load(source_path, mmap_mode="r")
+            chunked.save(output_path, array, codec=args.codec, level=args.level)
+
+            source_bytes += os.path.getsize(source_path)
+            output_bytes += os.path.getsize(output_path)
+
+    print("{:.1f} MB -> {:.1f} MB ({:.1f}x)".format(
+        source_bytes / 1024**2, output_bytes / 1024**2,
+        source_bytes / max(output_bytes, 1)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source-directory", "-source", type=str, required=True)
+    parser.add_argument("--output-directory", "-out", type=str, required=True)
+    parser.add_argument(
+        "--codec", type=str, default="zlib", choices=sorted(chunked.codecs))
+    parser.add_argument("--level", type=int, default=1)
+    args = parser.parse_args()
+    main()
@@ -1,7 +1,6 @@
 import argparse
 import colorsys
 import math
-import random
 import time
 import cv2
 import os
@@ -10,7 +9,6 @@ import matplotlib.pyplot as plt
 import numpy as np
 from tqdm import tqdm
 
-import gqn
 import c_gqn
 import rtx
 
@@ -45,7 +43,7 @@ def get_available_axis_and_direction(space, pos):
     return ret
 
 
-def generate_block_positions(num_cubes):
+def generate_block_positions(num_cubes, random_state):
     assert num_cubes > 0
 
     current_relative_pos = (0, 0, 0)
@@ -59,7 +57,8 @@ def generate_block_positions(num_cubes):
     for _ in range(num_cubes - 1):
         available_axis_and_direction = get_available_axis_and_direction(
             block_abs_locations, current_absolute_pos)
-        axis, direction = random.choice(available_axis_and_direction)
+        axis, direction = available_axis_and_direction[random_state.randint(
+            len(available_axis_and_direction))]
         offset = [0, 0, 0]
         offset[axis] = direction
         new_relative_pos = (offset[0] + current_relative_pos[0],
@@ -95,9 +94,10 @@ def generate_block_positions(num_cubes):
     return position_array, center_of_gravity
 
 
-def build_scene(color_array):
+def build_scene(color_array, random_state):
     # Generate positions of each cube
-    cube_position_array, shift = generate_block_positions(args.num_cubes)
+    cube_position_array, shift = generate_block_positions(
+        args.num_cubes, random_state)
     assert len(cube_position_array) == args.num_cubes
 
     # Place block
@@ -110,7 +110,8 @@ def build_scene(color_array):
             position[2] - shift[2],
         ))
         material = rtx.LambertMaterial(0.3)
-        mapping = rtx.SolidColorMapping(random.choice(color_array))
+        mapping = rtx.SolidColorMapping(
+            color_array[random_state.randint(len(color_array))])
         cube = rtx.Object(geometry, material, mapping)
         scene.add(cube)
 
@@ -139,6 +140,23 @@ def build_scene(color_array):
     return scene
 
 
+def update_scene(scene, color_array, random_state):
+    # Only the cube positions and colors change between observations.
+    # They are drawn in the same order as build_scene
+    cube_position_array, shift = generate_block_positions(
+        args.num_cubes, random_state)
+    assert len(cube_position_array) == args.num_cubes
+
+    positions = np.array(cube_position_array, dtype=np.float32) - np.array(
+        shift, dtype=np.float32)
+    colors = np.array([
+        color_array[random_state.randint(len(color_array))]
+        for _ in range(args.num_cubes)
+    ], dtype=np.float32)[:, :3]
+    scene.set_object_transforms(positions)
+    scene.set_colors(colors)
+
+
 def main():
     try:
         os.mkdir(os.path.join(args.dataset_path, "test_data"))
@@ -165,16 +183,19 @@ def main():
     rt_args.num_rays_per_pixel = 512
     rt_args.max_bounce = 2
     rt_args.supersampling_enabled = False
+    rt_args.denoise_enabled = True
 
     cuda_args = rtx.CUDAKernelLaunchArguments()
     cuda_args.num_threads = 64
     cuda_args.num_rays_per_thread = 32
 
     renderer = rtx.Renderer()
+    # The renderer writes gamma corrected and denoised uint8 images
     render_buffer = np.zeros(
-        (screen_height, screen_width, 3), dtype=np.float32)
+        (screen_height, screen_width, 3), dtype=np.uint8)
 
     camera = rtx.OrthographicCamera()
+    scene = None
 
     # enumerateがちゃんと動くか心配...
     original_data = c_gqn.data.Dataset(args.dataset_path)
@@ -184,8 +205,15 @@ def main():
         for j, data_indices in enumerate(iterator):
             _images, viewpoints, _original_images = subset[data_indices]
 
+            # Each observation has its own seed for the cubes and the path
+            # tracing noise, so the output can be regenerated
+            random_state = np.random.RandomState([args.seed, i, j])
+            rt_args.seed = random_state.randint(2**31)
             images = []
-            scene = build_scene(color_array)
+            if scene is None:
+                scene = build_scene(color_array, random_state)
+            else:
+                update_scene(scene, color_array, random_state)
             for viewpoint in viewpoints[0]:
                 eye = tuple(viewpoint[0:3])
 
@@ -193,15 +221,7 @@ def main():
                 camera.look_at(eye, center, up=(0, 1, 0))
 
                 renderer.render(scene, camera, rt_args, cuda_args, render_buffer)
-
-                # Convert to sRGB
-                image = np.power(np.clip(render_buffer, 0, 1), 1.0 / 2.2)
-                image = np.uint8(image * 255)
-                image = cv2.bilateralFilter(image, 3, 25, 25)
-
-                images.append(image)
-
-
+                images.append(render_buffer.copy())
 
             view_radius = 3
             angle_rad = 0
@@ -213,13 +233,8 @@ def main():
                 camera.look_at(eye, center, up=(0, 1, 0))
 
                 renderer.render(scene, camera, rt_args, cuda_args, render_buffer)
+                original_images.append(render_buffer.copy())
 
-                # Convert to sRGB
-                original_image = np.power(np.clip(render_buffer, 0, 1), 1.0 / 2.2)
-                original_image = np.uint8(original_image * 255)
-                original_image = cv2.bilateralFilter(original_image, 3, 25, 25)
-
-                original_images.append(original_image)
                 angle_rad += 2 * math.pi / args.frames_per_rotation
 
             np.save(os.path.join(args.dataset_path, "test_data", str(i)+"_"+str(j)+".npy"), [images, original_images])
@@ -233,5 +248,6 @@ if __name__ == "__main__":
     parser.add_argument("--image-size", type=int, default=64)
     parser.add_argument("--num-cubes", "-cubes", type=int, default=5)
     parser.add_argument("--num-colors", "-colors", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
     args = parser.parse_args()
     main()
@@ -1,7 +1,6 @@
 import argparse
 import colorsys
 import math
-import random
 import time
 import cv2
 
@@ -10,7 +9,6 @@ import matplotlib.animation as animation
 import numpy as np
 from tqdm import tqdm
 
-import gqn
 import rtx
 
 
@@ -38,7 +36,7 @@ def get_available_axis_and_direction(space, pos):
     return ret
 
 
-def generate_block_positions(num_cubes):
+def generate_block_positions(num_cubes, random_state):
     assert num_cubes > 0
 
     current_relative_pos = (0, 0, 0)
@@ -52,7 +50,8 @@ def generate_block_positions(num_cubes):
     for _ in range(num_cubes - 1):
         available_axis_and_direction = get_available_axis_and_direction(
             block_abs_locations, current_absolute_pos)
-        axis, direction = random.choice(available_axis_and_direction)
+        axis, direction = available_axis_and_direction[random_state.randint(
+            len(available_axis_and_direction))]
         offset = [0, 0, 0]
         offset[axis] = direction
         new_relative_pos = (offset[0] + current_relative_pos[0],
@@ -88,9 +87,10 @@ def generate_block_positions(num_cubes):
     return position_array, center_of_gravity
 
 
-def build_scene(color_array):
+def build_scene(color_array, random_state):
     # Generate positions of each cube
-    cube_position_array, shift = generate_block_positions(args.num_cubes)
+    cube_position_array, shift = generate_block_positions(
+        args.num_cubes, random_state)
     assert len(cube_position_array) == args.num_cubes
 
     # Place block
@@ -103,7 +103,8 @@ def build_scene(color_array):
             position[2] - shift[2],
         ))
         material = rtx.LambertMaterial(0.3)
-        mapping = rtx.SolidColorMapping(random.choice(color_array))
+        mapping = rtx.SolidColorMapping(
+            color_array[random_state.randint(len(color_array))])
         cube = rtx.Object(geometry, material, mapping)
         scene.add(cube)
 
@@ -153,25 +154,30 @@ def main():
     rt_args.num_rays_per_pixel = 512
     rt_args.max_bounce = 2
     rt_args.supersampling_enabled = False
+    rt_args.denoise_enabled = True
 
     cuda_args = rtx.CUDAKernelLaunchArguments()
     cuda_args.num_threads = 64
     cuda_args.num_rays_per_thread = 32
 
     renderer = rtx.Renderer()
+    # The renderer writes gamma corrected and denoised uint8 images
     render_buffer = np.zeros(
-        (screen_height, screen_width, 3), dtype=np.float32)
+        (screen_height, screen_width, 3), dtype=np.uint8)
 
     camera = rtx.OrthographicCamera()
 
     fig = plt.figure(figsize=(3, 3))
     ims = []
 
-    scene = build_scene(color_array)
+    random_state = np.random.RandomState(args.seed)
+    rt_args.seed = args.seed
+    scene = build_scene(color_array, random_state)
 
     view_radius = 3
     rotation = 0
 
+    images = []
     for _ in range(args.num_views_per_scene):
         eye = (view_radius * math.cos(rotation),
                view_radius * math.sin(math.pi / 6),
@@ -180,17 +186,15 @@ def main():
         camera.look_at(eye, center, up=(0, 1, 0))
 
         renderer.render(scene, camera, rt_args, cuda_args, render_buffer)
+        images.append(render_buffer.copy())
 
-        # Convert to sRGB
-        image = np.power(np.clip(render_buffer, 0, 1), 1.0 / 2.2)
-        image = np.uint8(image * 255)
-        image = cv2.bilateralFilter(image, 3, 25, 25)
+        rotation += math.pi / 36
 
+    for image in images:
         im = plt.imshow(image, interpolation="none", animated=True)
         ims.append([im])
 
         plt.pause(1e-8)
-        rotation += math.pi / 36
 
     ani = animation.ArtistAnimation(
         fig, ims, interval=1 / 24, blit=True, repeat_delay=0)
@@ -205,5 +209,6 @@ if __name__ == "__main__":
     parser.add_argument("--image-size", type=int, default=64)
     parser.add_argument("--num-cubes", "-cubes", type=int, default=5)
     parser.add_argument("--num-colors", "-colors", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
     args = parser.parse_args()
     main()
@@ -1,2 +1,3 @@
 from . import mathematics as math
-from . import archiver
\ No newline at end of file
+from . import archiver
+from . import postprocess
@@ -1,6 +1,133 @@
+import json
 import os
+import queue
+import threading
+import time
+import zlib
 import numpy as np
 import cupy as cp
+from .data import chunked
+
+
+def truncate_npy(path, num_rows):
+    # Shrink the first axis of an .npy file in place and rewrite its header
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        data_offset = f.tell()
+        assert num_rows <= shape[0]
+        new_shape = (num_rows, ) + shape[1:]
+        header = {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": fortran_order,
+            "shape": new_shape,
+        }
+        row_bytes = int(np.prod(shape[1:])) * dtype.itemsize
+        f.seek(0)
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(f, header)
+        else:
+            np.lib.format.write_array_header_2_0(f, header)
+        # The header is padded to a fixed alignment, so a smaller shape fits in place
+        assert f.tell() == data_offset
+        f.truncate(data_offset + num_rows * row_bytes)
+
+
+def temporary_path(path):
+    # Files are written here and renamed once complete
+    return path + ".tmp"
+
+
+def file_checksum(path):
+    checksum = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(1 << 24)
+            if len(block) == 0:
+                break
+            checksum = zlib.crc32(block, checksum)
+    return "{:08x}".format(checksum)
+
+
+def fsync_file(path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def save_json(path, data):
+    with open(temporary_path(path), "w") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path(path), path)
+
+
+def load_manifest(directory):
+    # file_number -> entry of every file that was written completely
+    manifest = {}
+    manifest_directory = os.path.join(directory, "manifest")
+    if os.path.isdir(manifest_directory) is False:
+        return manifest
+    for filename in sorted(os.listdir(manifest_directory)):
+        if filename.endswith(".json") is False:
+            continue
+        with open(os.path.join(manifest_directory, filename)) as f:
+            entry = json.load(f)
+        manifest[entry["file_number"]] = entry
+    return manifest
+
+
+def verify_entry(directory, entry, checksums=False):
+    # Sizes catch files that were replaced or cut short; checksums also
+    # catch corrupted contents but read every file
+    for name, array in entry["arrays"].items():
+        path = os.path.join(directory, name, array["filename"])
+        if os.path.isfile(path) is False:
+            return False
+        if os.path.getsize(path) != array["bytes"]:
+            return False
+        if checksums and file_checksum(path) != array["crc32"]:
+            return False
+    return True
+
+
+class Writer():
+    # Runs save jobs in submission order on a background thread
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception as error:
+                if self.error is None:
+                    self.error = error
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, job):
+        self.check()
+        self.queue.put(job)
+
+    def close(self):
+        # Waits for every pending job
+        self.queue.put(None)
+        self.thread.join()
+        self.check()
 
 
 class SceneData:
@@ -60,19 +187,49 @@ class Archiver:
                  image_size=(64, 64),
                  num_views_per_scene=5,
                  frames_per_rotation=24,
-                 initial_file_number=1):
+                 initial_file_number=1,
+                 streaming=False,
+                 flush_interval=100,
+                 async_write=False,
+                 format="npy",
+                 codec="zlib",
+                 metadata=None):
         assert directory is not None
-        self.images = np.zeros(
-            (num_observations_per_file, num_views_per_scene) + image_size +
-            (3, ),
-            dtype="uint8")
-        self.viewpoints = np.zeros(
-            (num_observations_per_file, num_views_per_scene, 7),
-            dtype="float32")
-        self.original_images = np.zeros(
-            (num_observations_per_file, frames_per_rotation) + image_size +
-            (3, ),
-            dtype="uint8")
+        assert format in ("npy", "chunked")
+        self.subset_shapes = {
+            "images": ((num_observations_per_file, num_views_per_scene) +
+                       image_size + (3, ), "uint8"),
+            "viewpoints": ((num_observations_per_file, num_views_per_scene,
+                            7), "float32"),
+            "original_images": ((num_observations_per_file,
+                                 frames_per_rotation) + image_size + (3, ),
+                                "uint8"),
+        }
+        # In streaming mode these are memory maps of the current file on disk
+        # instead of an in-memory pool
+        self.streaming = streaming
+        self.flush_interval = flush_interval
+        # "chunked" stores every scene as a separately compressed chunk
+        self.format = format
+        self.codec = codec
+        # Stored in the manifest entry of every file, e.g. the generator seed
+        self.metadata = metadata
+        self.images = None
+        self.viewpoints = None
+        self.original_images = None
+        # With async_write a full pool is saved by the writer thread while
+        # the next one is being filled, so two pools are allocated
+        self.writer = Writer() if async_write else None
+        self.free_pools = queue.Queue()
+        if self.streaming is False:
+            num_pools = 2 if async_write else 1
+            for _ in range(num_pools):
+                self.free_pools.put({
+                    name: np.zeros(shape, dtype=dtype)
+                    for name, (shape, dtype) in self.subset_shapes.items()
+                })
+        # One entry per file: file_number, seconds and bytes
+        self.write_stats = []
         self.current_num_observations = 0
         self.current_pool_index = 0
         self.current_file_number = initial_file_number
@@ -103,15 +260,30 @@ class Archiver:
             os.mkdir(os.path.join(directory, "original_images"))
         except:
             pass
+        try:
+            os.mkdir(os.path.join(directory, "manifest"))
+        except:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def add(self, scene: SceneData):
         assert isinstance(scene, SceneData)
 
+        if self.current_pool_index == 0:
+            self.acquire_subset()
+
         self.images[self.current_pool_index] = scene.images
         self.viewpoints[self.current_pool_index] = scene.viewpoints
         self.original_images[self.current_pool_index] = scene.original_images
 
         self.current_pool_index += 1
+        if self.streaming and self.current_pool_index % self.flush_interval == 0:
+            self.flush_subset()
         if self.current_pool_index >= self.num_observations_per_file:
             self.save_subset()
 
@@ -148,16 +320,169 @@ class Archiver:
         cp.save(os.path.join(self.directory, "mean.npy"), self.dataset_mean)
         cp.save(os.path.join(self.directory, "std.npy"), self.dataset_std)
 
-    def save_subset(self):
-        filename = "{:03d}.npy".format(self.current_file_number)
-        np.save(os.path.join(self.directory, "images", filename), self.images)
+    def start_file(self, file_number):
+        # The next observations go into file_number, so that completed files
+        # can be skipped
+        assert self.current_pool_index == 0
+        self.current_file_number = file_number
+
+    def manifest_path(self, file_number):
+        return os.path.join(self.directory, "manifest",
+                            "{:03d}.json".format(file_number))
+
+    def subset_path(self, name, file_number=None):
+        if file_number is None:
+            file_number = self.current_file_number
+        extension = chunked.EXTENSION if self.format == "chunked" else ".npy"
+        filename = "{:03d}{}".format(file_number, extension)
+        return os.path.join(self.directory, name, filename)
+
+    def acquire_subset(self):
+        if self.streaming:
+            self.open_subset("w+")
+            return
+        # Blocks until the writer has released a pool
+        while True:
+            if self.writer is not None:
+                self.writer.check()
+            try:
+                pool = self.free_pools.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        for name, array in pool.items():
+            setattr(self, name, array)
+
+    def release_subset(self):
+        arrays = {name: getattr(self, name) for name in self.subset_shapes}
+        for name in self.subset_shapes:
+            setattr(self, name, None)
+        return arrays
+
+    def open_subset(self, mode):
+        if self.format == "chunked":
+            # Scenes are compressed and appended as they are added
+            for name, (shape, dtype) in self.subset_shapes.items():
+                setattr(self, name, chunked.ChunkedWriter(
+                    temporary_path(self.subset_path(name)), codec=self.codec,
+                    scene_shape=shape[1:], dtype=dtype))
+            return
+        for name, (shape, dtype) in self.subset_shapes.items():
+            array = np.lib.format.open_memmap(
+                temporary_path(self.subset_path(name)), mode=mode, dtype=dtype, shape=shape)
+            setattr(self, name, array)
 
-        filename = "{:03d}.npy".format(self.current_file_number)
-        np.save(
-            os.path.join(self.directory, "viewpoints", filename),
-            self.viewpoints)
+    def close_subset(self):
+        for name in self.subset_shapes:
+            getattr(self, name).flush()
+            setattr(self, name, None)
 
-        filename = "{:03d}.npy".format(self.current_file_number)
-        np.save(
-            os.path.join(self.directory, "original_images", filename),
-            self.original_images)
+    def flush_subset(self):
+        if self.format == "chunked":
+            for name in self.subset_shapes:
+                getattr(self, name).flush()
+            return
+        # Unmapping releases the written pages so that memory usage stays constant
+        self.close_subset()
+        self.open_subset("r+")
+
+    def write(self, job):
+        if self.writer is None:
+            job()
+        else:
+            self.writer.submit(job)
+
+    def record_write(self, file_number, start):
+        num_bytes = sum(
+            os.path.getsize(self.subset_path(name, file_number))
+            for name in self.subset_shapes)
+        self.write_stats.append({
+            "file_number": file_number,
+            "seconds": time.time() - start,
+            "bytes": num_bytes,
+        })
+
+    def save_array(self, path, array):
+        if self.format == "chunked":
+            chunked.save(temporary_path(path), array, codec=self.codec)
+        else:
+            with open(temporary_path(path), "wb") as f:
+                np.save(f, array)
+
+    def commit_subset(self, file_number, num_observations):
+        # The files are renamed into place and the manifest entry is written
+        # last, so a file without an entry is incomplete and is generated again
+        manifest_path = self.manifest_path(file_number)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        arrays = {}
+        for name, (shape, dtype) in self.subset_shapes.items():
+            path = self.subset_path(name, file_number)
+            fsync_file(temporary_path(path))
+            os.replace(temporary_path(path), path)
+            arrays[name] = {
+                "filename": os.path.basename(path),
+                "shape": [num_observations] + list(shape[1:]),
+                "dtype": dtype,
+                "bytes": os.path.getsize(path),
+                "crc32": file_checksum(path),
+            }
+        save_json(manifest_path, {
+            "file_number": file_number,
+            "num_observations": num_observations,
+            "format": self.format,
+            "metadata": self.metadata,
+            "arrays": arrays,
+        })
+
+    def write_throughput(self):
+        # Bytes per second over every file written so far
+        seconds = sum(stats["seconds"] for stats in self.write_stats)
+        num_bytes = sum(stats["bytes"] for stats in self.write_stats)
+        return num_bytes / seconds if seconds > 0 else 0
+
+    def save_subset(self, num_rows=None):
+        file_number = self.current_file_number
+        num_observations = self.num_observations_per_file if num_rows is None else num_rows
+        arrays = self.release_subset()
+
+        if self.streaming:
+            def job():
+                start = time.time()
+                for name in self.subset_shapes:
+                    if self.format == "chunked":
+                        # Writes the offset index, so a partial file needs nothing else
+                        arrays[name].close()
+                    else:
+                        arrays[name].flush()
+                # Unmap before shrinking the files
+                arrays.clear()
+                if num_rows is not None and self.format == "npy":
+                    for name in self.subset_shapes:
+                        truncate_npy(temporary_path(self.subset_path(name, file_number)), num_rows)
+                self.commit_subset(file_number, num_observations)
+                self.record_write(file_number, start)
+        else:
+            def job():
+                try:
+                    start = time.time()
+                    for name, array in arrays.items():
+                        self.save_array(self.subset_path(name, file_number), array[:num_rows])
+                    self.commit_subset(file_number, num_observations)
+                    self.record_write(file_number, start)
+                finally:
+                    # The pool can be filled again
+                    self.free_pools.put(arrays)
+
+        self.write(job)
+
+    def close(self):
+        # Saves the partially filled last file and waits for pending writes
+        if self.current_pool_index > 0:
+            self.save_subset(self.current_pool_index)
+            self.total_images += self.current_pool_index
+            self.current_pool_index = 0
+            self.current_file_number += 1
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
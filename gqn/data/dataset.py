@@ -1,43 +1,136 @@
 import os
 import sys
+import time
 import random
 import numpy as np
+from . import index
+from .cache import LRUCache
+from .index import Observations
 from .subset import Subset
+from .prefetcher import Prefetcher
 
 
 class Dataset():
-    def __init__(self, directory, use_original_images=True):
+    def __init__(self, directory, use_original_images=True, mmap_mode=None, prefetch_depth=0,
+                 cache_bytes=0):
         self.directory = directory
         self.use_original_images = use_original_images
+        self.mmap_mode = mmap_mode
+        self.prefetch_depth = prefetch_depth
+        self.prefetcher = None
+        # Seconds the consumer spent waiting for subsets in the current pass
+        self.io_wait_time = 0
         self.current_subset_index = 0
-        self.subset_filenames = []
-        files = os.listdir(os.path.join(self.directory, "images"))
-        for filename in files:
-            if filename.endswith(".npy"):
-                self.subset_filenames.append(filename)
-        self.subset_filenames.sort()
+        self.subset_filenames = index.list_subset_filenames(self.directory)
+        self._observations = None
+        # Recently read subsets are kept up to cache_bytes of loaded arrays, so
+        # that alternating between a few files does not load them again.
+        # With mmap_mode the subsets hold no loaded arrays and are not charged
+        self.cache = LRUCache(cache_bytes) if cache_bytes > 0 else None
+
+    @property
+    def observations(self):
+        # Every observation by its global index, e.g. dataset.observations[1234567]
+        # or dataset.observations.take(indices) for a batch
+        if self._observations is None:
+            self._observations = Observations(
+                self.directory, index.load(self.directory), self.use_original_images)
+        return self._observations
 
     def __iter__(self):
+        self.close()
         self.current_subset_index = 0
+        self.io_wait_time = 0
+        if self.prefetch_depth > 0:
+            self.prefetcher = Prefetcher(
+                self.read_ahead, range(len(self.subset_filenames)), self.prefetch_depth)
         return self
 
     def __next__(self):
         if self.current_subset_index >= len(self.subset_filenames):
+            self.close()
             raise StopIteration
-        subset = self.read(self.current_subset_index)
+        start = time.time()
+        if self.prefetcher is None:
+            subset = self.read(self.current_subset_index)
+        else:
+            subset = self.prefetcher.get()
+        self.io_wait_time += time.time() - start
         self.current_subset_index += 1
         return subset
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+        if self._observations is not None:
+            self._observations.close()
+            self._observations = None
+
+    def __getitem__(self, subset_index):
+        if isinstance(subset_index, slice):
+            return [self.read(k) for k in range(*subset_index.indices(len(self)))]
+        subset_index = int(subset_index)
+        if subset_index < 0:
+            subset_index += len(self)
+        if subset_index < 0 or subset_index >= len(self):
+            raise IndexError("subset index out of range for {} subsets".format(len(self)))
+        return self.read(subset_index)
+
     def read(self, subset_index):
-        filename = self.subset_filenames[self.current_subset_index]
+        if self.cache is None:
+            return self.open_subset(subset_index)
+        subset = self.cache.get(subset_index)
+        if subset is None:
+            subset = self.open_subset(subset_index)
+            self.cache.put(subset_index, subset, self.subset_bytes(subset_index, subset))
+        return subset
+
+    def subset_bytes(self, subset_index, subset):
+        # Memory maps and chunked arrays only read the scenes they are indexed
+        # with, so a subset opened with mmap_mode keeps next to nothing resident
+        if self.mmap_mode is not None:
+            return 0
+        # Size of the arrays once loaded; original_images is counted before
+        # it is read so that the cache does not outgrow its budget later
+        arrays = [subset.images, subset.viewpoints]
+        num_bytes = sum(int(np.prod(array.shape)) * array.dtype.itemsize for array in arrays)
+        if self.use_original_images:
+            path = os.path.join(self.directory, "original_images", self.subset_filenames[subset_index])
+            shape, dtype, _ = index.read_array_header(path)
+            num_bytes += int(np.prod(shape)) * dtype.itemsize
+        return num_bytes
+
+    def open_subset(self, subset_index):
+        filename = self.subset_filenames[subset_index]
         images_npy_path = os.path.join(self.directory, "images", filename)
         viewpoints_npy_path = os.path.join(self.directory, "viewpoints",
                                            filename)
         if self.use_original_images:
             original_images_npy_path = os.path.join(self.directory, "original_images", filename)
-            subset = Subset(images_npy_path, viewpoints_npy_path, original_images_npy_path)
+            subset = Subset(images_npy_path, viewpoints_npy_path, original_images_npy_path,
+                            mmap_mode=self.mmap_mode)
         else:
-            subset = Subset(images_npy_path, viewpoints_npy_path)
+            subset = Subset(images_npy_path, viewpoints_npy_path, mmap_mode=self.mmap_mode)
+        return subset
+
+    def subset_size(self, subset_index):
+        # Only the header of the file is read
+        filename = self.subset_filenames[subset_index]
+        shape, _, _ = index.read_array_header(os.path.join(self.directory, "images", filename))
+        return shape[0]
+
+    def read_ahead(self, subset_index):
+        subset = self.read(subset_index)
+        if self.use_original_images and self.mmap_mode is None:
+            # Load on the background thread rather than on first access
+            subset.original_images
         return subset
 
     def __len__(self):
@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+import numpy as np
+from . import chunked
+
+# Layout of index.json:
+#   {"num_observations": N, "files": [{"filename", "start", "stop", "arrays"}, ...]}
+# Observations [start, stop) of the dataset are rows [0, stop - start) of the file.
+# "arrays" maps images, viewpoints and original_images to their shape, dtype,
+# the byte offset of the data in .npy files and the file size.
+FILENAME = "index.json"
+NAMES = ("images", "viewpoints", "original_images")
+
+
+def list_subset_filenames(directory):
+    filenames = [
+        filename for filename in os.listdir(os.path.join(directory, "images"))
+        if filename.endswith((".npy", chunked.EXTENSION))
+    ]
+    return sorted(filenames)
+
+
+def read_array_header(path):
+    # Shape, dtype and data offset without reading the data
+    if path.endswith(chunked.EXTENSION):
+        array = chunked.ChunkedArray(path)
+        shape, dtype = array.shape, array.dtype
+        array.close()
+        return shape, dtype, None
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        assert fortran_order is False
+        return shape, dtype, f.tell()
+
+
+def build(directory):
+    files = []
+    start = 0
+    for filename in list_subset_filenames(directory):
+        arrays = {}
+        for name in NAMES:
+            path = os.path.join(directory, name, filename)
+            if os.path.exists(path) is False:
+                continue
+            shape, dtype, offset = read_array_header(path)
+            arrays[name] = {
+                "shape": list(shape),
+                "dtype": np.lib.format.dtype_to_descr(dtype),
+                "offset": offset,
+                "bytes": os.path.getsize(path),
+            }
+        num_observations = arrays["images"]["shape"][0]
+        files.append({
+            "filename": filename,
+            "start": start,
+            "stop": start + num_observations,
+            "arrays": arrays,
+        })
+        start += num_observations
+    return {"num_observations": start, "files": files}
+
+
+def is_valid(directory, index):
+    # The same files with the same sizes; headers are not read again
+    filenames = list_subset_filenames(directory)
+    if filenames != [entry["filename"] for entry in index["files"]]:
+        return False
+    for entry in index["files"]:
+        for name in NAMES:
+            path = os.path.join(directory, name, entry["filename"])
+            if name not in entry["arrays"]:
+                if os.path.exists(path):
+                    return False
+                continue
+            if os.path.exists(path) is False:
+                return False
+            if os.path.getsize(path) != entry["arrays"][name]["bytes"]:
+                return False
+    return True
+
+
+def save(directory, index):
+    # A unique temporary file, so that concurrent writers never rename each
+    # other's file away
+    with tempfile.NamedTemporaryFile("w", dir=directory, prefix=FILENAME, suffix=".tmp",
+                                     delete=False) as f:
+        json.dump(index, f)
+    os.replace(f.name, os.path.join(directory, FILENAME))
+
+
+def update(directory):
+    # Scans the headers of every file and persists the result
+    index = build(directory)
+    save(directory, index)
+    return index
+
+
+def load(directory):
+    # Rebuilt when files were added, removed or rewritten since it was saved
+    path = os.path.join(directory, FILENAME)
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                index = json.load(f)
+            if is_valid(directory, index):
+                return index
+        except (ValueError, OSError, KeyError, TypeError):
+            # A truncated or corrupt index is rebuilt like a stale one
+            pass
+    index = build(directory)
+    try:
+        save(directory, index)
+    except OSError:
+        # A read-only dataset is indexed in memory only
+        pass
+    return index
+
+
+class Observations():
+    # Observations of every file addressed by their global index and read
+    # from memory maps, so only the requested rows are loaded
+    def __init__(self, directory, index, use_original_images=True):
+        self.directory = directory
+        self.index = index
+        self.names = NAMES if use_original_images else NAMES[:2]
+        self.starts = np.asarray([entry["start"] for entry in index["files"]], dtype=np.int64)
+        self.maps = {}
+
+    def __len__(self):
+        return self.index["num_observations"]
+
+    def open(self, file_position, name):
+        key = (file_position, name)
+        if key not in self.maps:
+            entry = self.index["files"][file_position]
+            path = os.path.join(self.directory, name, entry["filename"])
+            array = entry["arrays"][name]
+            if array["offset"] is None:
+                self.maps[key] = chunked.ChunkedArray(path)
+            else:
+                self.maps[key] = np.memmap(
+                    path, dtype=np.dtype(array["dtype"]), mode="r",
+                    offset=array["offset"], shape=tuple(array["shape"]))
+        return self.maps[key]
+
+    def locate(self, global_indices):
+        # File position and row of each global index
+        global_indices = np.asarray(global_indices, dtype=np.int64)
+        global_indices = np.where(global_indices < 0, global_indices + len(self), global_indices)
+        if np.any(global_indices < 0) or np.any(global_indices >= len(self)):
+            raise IndexError("index out of range for {} observations".format(len(self)))
+        file_positions = np.searchsorted(self.starts, global_indices, side="right") - 1
+        return file_positions, global_indices - self.starts[file_positions]
+
+    def empty_batch(self, batch_size):
+        arrays = [self.index["files"][0]["arrays"][name] for name in self.names]
+        return tuple(
+            np.empty((batch_size, ) + tuple(array["shape"][1:]), dtype=np.dtype(array["dtype"]))
+            for array in arrays)
+
+    def take(self, global_indices, out=None):
+        # Rows are gathered file by file into out, in the order of global_indices
+        global_indices = np.asarray(global_indices, dtype=np.int64).reshape(-1)
+        if out is None:
+            out = self.empty_batch(len(global_indices))
+        batch = tuple(buffer[:len(global_indices)] for buffer in out)
+        file_positions, rows = self.locate(global_indices)
+        for file_position in np.unique(file_positions):
+            selection = np.flatnonzero(file_positions == file_position)
+            for name, buffer in zip(self.names, batch):
+                array = self.open(int(file_position), name)
+                buffer[selection] = array[rows[selection]]
+        return batch
+
+    def __getitem__(self, global_index):
+        if isinstance(global_index, slice):
+            return self.take(np.arange(*global_index.indices(len(self))))
+        if np.ndim(global_index) == 0:
+            file_positions, rows = self.locate([global_index])
+            return tuple(
+                np.asarray(self.open(int(file_positions[0]), name)[int(rows[0])])
+                for name in self.names)
+        return self.take(global_index)
+
+    def close(self):
+        for array in self.maps.values():
+            if isinstance(array, chunked.ChunkedArray):
+                array.close()
+        self.maps = {}
@@ -0,0 +1,60 @@
+import queue
+import threading
+import time
+
+
+class Prefetcher():
+    def __init__(self, read, indices, depth=2):
+        assert depth > 0
+        self.queue = queue.Queue(maxsize=depth)
+        self.wait_time = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(read, indices))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, read, indices):
+        for index in indices:
+            if self.stop_event.is_set():
+                return
+            try:
+                item = (read(index), None)
+            except Exception as error:
+                item = (None, error)
+            if not self.put(item) or item[1] is not None:
+                return
+        # End of the indices
+        self.put((None, None))
+
+    def put(self, item):
+        # The queue is bounded, so wake up regularly to notice close()
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        start = time.time()
+        data, error = self.queue.get()
+        self.wait_time += time.time() - start
+        if error is not None:
+            self.close()
+            raise error
+        if data is None:
+            self.close()
+            raise StopIteration
+        return data
+
+    def close(self):
+        self.stop_event.set()
+        # Unblock the worker if it is waiting on a full queue
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        if self.thread is not threading.current_thread():
+            self.thread.join()
@@ -1,12 +1,157 @@
 import numpy as np
 
 
+class Permutation:
+    # Seeded bijection on [0, size) evaluated in O(1) memory
+    def __init__(self, size, seed=0, num_rounds=3):
+        if size < 0:
+            raise ValueError("size must not be negative: {}".format(size))
+        self.size = size
+        num_bits = max((size - 1).bit_length(), 2)
+        self.mask = np.uint64((1 << num_bits) - 1)
+        self.shift = np.uint64(max(num_bits // 2, 1))
+        random_state = np.random.RandomState(seed)
+        # Odd multipliers keep every round invertible modulo 2**num_bits
+        self.multipliers = [
+            np.uint64(2 * random_state.randint(0, 2**30) + 1)
+            for _ in range(num_rounds)
+        ]
+        self.increments = [
+            np.uint64(random_state.randint(0, 2**30)) for _ in range(num_rounds)
+        ]
+
+    def mix(self, x):
+        for multiplier, increment in zip(self.multipliers, self.increments):
+            x ^= x >> self.shift
+            x = (x * multiplier + increment) & self.mask
+        return x
+
+    def __call__(self, positions):
+        positions = np.asarray(positions)
+        if np.any(positions < 0) or np.any(positions >= self.size):
+            raise IndexError("positions out of range for a permutation of {}".format(self.size))
+        x = self.mix(positions.astype(np.uint64))
+        # Walk the cycle until the value falls back into [0, size)
+        out_of_range = x >= np.uint64(self.size)
+        while np.any(out_of_range):
+            x[out_of_range] = self.mix(x[out_of_range])
+            out_of_range = x >= np.uint64(self.size)
+        return x.astype(np.int64)
+
+
 class Sampler:
-    def __init__(self, subset):
+    block_size = 1024
+
+    def __init__(self, subset, shuffle=False, seed=0):
         self.subset = subset
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.position = 0
 
     def __len__(self):
         return len(self.subset)
 
+    def indices(self, start, stop):
+        positions = np.arange(start, stop, dtype=np.int64)
+        if self.shuffle is False:
+            return positions
+        return Permutation(len(self), [self.seed, self.epoch])(positions)
+
+    def __iter__(self):
+        num_indices = len(self)
+        while self.position < num_indices:
+            stop = min(self.position + self.block_size, num_indices)
+            for index in self.indices(self.position, stop):
+                self.position += 1
+                yield index
+        self.position = 0
+        self.epoch += 1
+
+    def state_dict(self):
+        return {"seed": self.seed, "epoch": self.epoch, "position": self.position}
+
+    def load_state_dict(self, state):
+        self.seed = state["seed"]
+        self.epoch = state["epoch"]
+        self.position = state["position"]
+
+
+class GlobalSampler:
+    block_size = 1024
+    shuffle = True
+
+    # Shuffles observations across every subset of a dataset. The files are
+    # visited in a seeded order with the scenes of each file permuted, and
+    # that stream is shuffled within windows of buffer_size positions, so a
+    # window mixes scenes of a few neighbouring files. Every position maps
+    # directly to an observation, so a pass can start anywhere.
+    def __init__(self, dataset, buffer_size=10000, seed=0):
+        assert buffer_size > 0
+        self.dataset = dataset
+        self.buffer_size = buffer_size
+        self.seed = seed
+        self.epoch = 0
+        self.position = 0
+        self.subset_sizes = np.asarray([
+            dataset.subset_size(subset_index)
+            for subset_index in range(len(dataset))
+        ], dtype=np.int64)
+        # Global index of the first observation of each subset
+        self.subset_offsets = np.cumsum(self.subset_sizes) - self.subset_sizes
+
+    def __len__(self):
+        return int(self.subset_sizes.sum())
+
+    def locate(self, start, stop):
+        # (subset_index, index) of the positions [start, stop) of this epoch
+        if start < 0 or stop > len(self):
+            raise IndexError("positions [{}, {}) out of range for {} observations".format(
+                start, stop, len(self)))
+        positions = np.arange(start, stop, dtype=np.int64)
+        stream_positions = np.empty_like(positions)
+        windows = positions // self.buffer_size
+        for window in np.unique(windows):
+            selection = windows == window
+            window_start = int(window) * self.buffer_size
+            window_size = min(self.buffer_size, len(self) - window_start)
+            permutation = Permutation(window_size, [self.seed, self.epoch, int(window)])
+            stream_positions[selection] = window_start + permutation(positions[selection] - window_start)
+
+        num_subsets = len(self.subset_sizes)
+        subset_order = Permutation(num_subsets, [self.seed, self.epoch])(np.arange(num_subsets))
+        sizes = self.subset_sizes[subset_order]
+        starts = np.cumsum(sizes) - sizes
+        # Empty subsets share their start with the next one and are skipped
+        slots = np.searchsorted(starts, stream_positions, side="right") - 1
+        subset_indices = subset_order[slots]
+        indices = stream_positions - starts[slots]
+        for subset_index in np.unique(subset_indices):
+            selection = subset_indices == subset_index
+            permutation = Permutation(
+                int(self.subset_sizes[subset_index]), [self.seed, self.epoch, int(subset_index)])
+            indices[selection] = permutation(indices[selection])
+        return subset_indices, indices
+
+    def indices(self, start, stop):
+        # Global observation indices, e.g. for dataset.observations.take
+        subset_indices, indices = self.locate(start, stop)
+        return self.subset_offsets[subset_indices] + indices
+
     def __iter__(self):
-        return iter(np.array([i for i in range(len(self.subset))]))
\ No newline at end of file
+        num_indices = len(self)
+        while self.position < num_indices:
+            stop = min(self.position + self.block_size, num_indices)
+            for subset_index, index in zip(*self.locate(self.position, stop)):
+                self.position += 1
+                yield int(subset_index), int(index)
+        self.position = 0
+        self.epoch += 1
+
+    def state_dict(self):
+        return {"seed": self.seed, "epoch": self.epoch, "position": self.position}
+
+    def load_state_dict(self, state):
+        self.seed = state["seed"]
+        self.epoch = state["epoch"]
+        self.position = state["position"]
@@ -1,21 +1,59 @@
 import os
 import numpy as np
+from . import chunked
+
+
+def load(path, mmap_mode=None):
+    if path.endswith(chunked.EXTENSION):
+        return chunked.load(path, mmap_mode=mmap_mode)
+    return np.load(path, mmap_mode=mmap_mode)
 
 
 class Subset():
-    def __init__(self, image_npy_path, viewpoints_npy_path, original_images_npy_path=""):
-        self.images = np.load(image_npy_path)
-        self.viewpoints = np.load(viewpoints_npy_path)
+    def __init__(self, image_npy_path, viewpoints_npy_path, original_images_npy_path="", mmap_mode=None):
+        self.mmap_mode = mmap_mode
+        self.images = load(image_npy_path, mmap_mode=mmap_mode)
+        self.viewpoints = load(viewpoints_npy_path, mmap_mode=mmap_mode)
         self.use_original_images = not original_images_npy_path == ""
-        if self.use_original_images:
-            self.original_images = np.load(original_images_npy_path)
+        self.original_images_npy_path = original_images_npy_path
+        self._original_images = None
         assert self.images.shape[0] == self.viewpoints.shape[0]
 
+    @property
+    def original_images(self):
+        # Not read until a batch asks for it
+        if self._original_images is None:
+            self._original_images = load(self.original_images_npy_path, mmap_mode=self.mmap_mode)
+        return self._original_images
+
     def __getitem__(self, indices):
         if self.use_original_images:
             return self.images[indices], self.viewpoints[indices], self.original_images[indices]
         else:
             return self.images[indices], self.viewpoints[indices]
 
+    def arrays(self):
+        if self.use_original_images:
+            return self.images, self.viewpoints, self.original_images
+        return self.images, self.viewpoints
+
+    def empty_batch(self, batch_size):
+        return tuple(
+            np.empty((batch_size, ) + array.shape[1:], dtype=array.dtype)
+            for array in self.arrays())
+
+    def take(self, indices, out):
+        if isinstance(indices, slice):
+            num_indices = len(range(*indices.indices(len(self))))
+        else:
+            num_indices = len(indices)
+        batch = tuple(buffer[:num_indices] for buffer in out)
+        for array, buffer in zip(self.arrays(), batch):
+            if isinstance(indices, slice):
+                buffer[...] = array[indices]
+            else:
+                np.take(array, indices, axis=0, out=buffer)
+        return batch
+
     def __len__(self):
         return self.images.shape[0]
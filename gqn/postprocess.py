@@ -0,0 +1,72 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def gamma_correct(render_buffers, out=None, gamma=2.2):
+    # (N, H, W, 3) float32 linear -> (N, H, W, 3) uint8 sRGB, with a single
+    # float32 scratch array instead of a temporary per operation
+    render_buffers = np.asarray(render_buffers, dtype=np.float32)
+    if out is None:
+        out = np.empty(render_buffers.shape, dtype=np.uint8)
+    assert out.shape == render_buffers.shape
+    scratch = np.clip(render_buffers, 0, 1)
+    np.power(scratch, np.float32(1.0 / gamma), out=scratch)
+    np.multiply(scratch, 255, out=scratch)
+    # Truncates like np.uint8(image * 255)
+    np.copyto(out, scratch, casting="unsafe")
+    return out
+
+
+def bilateral_filter(images, out=None, diameter=3, sigma_color=25, sigma_space=25):
+    # Filters a (N, H, W, 3) uint8 stack with a single cv2 call. Frames are
+    # stacked vertically, each padded the way cv2 pads a single frame, so the
+    # result matches filtering every frame separately.
+    assert images.ndim == 4
+    if out is None:
+        out = np.empty_like(images)
+    assert out.shape == images.shape
+    num_frames, height, width, channels = images.shape
+    radius = diameter // 2 if diameter > 0 else int(round(sigma_space * 1.5))
+    padded = np.pad(images, ((0, 0), (radius, radius), (0, 0), (0, 0)), mode="reflect")
+    filtered = cv2.bilateralFilter(
+        padded.reshape((-1, width, channels)), diameter, sigma_color, sigma_space)
+    filtered = filtered.reshape((num_frames, height + 2 * radius, width, channels))
+    out[...] = filtered[:, radius:radius + height]
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor(num_threads):
+    return ThreadPoolExecutor(num_threads)
+
+
+def to_images(render_buffers, out=None, gamma=2.2, diameter=3, sigma_color=25, sigma_space=25,
+              num_threads=0):
+    # Gamma correction followed by the bilateral filter for a whole stack of
+    # frames. NumPy and OpenCV release the GIL, so with num_threads > 1 the
+    # stack is split between threads.
+    render_buffers = np.asarray(render_buffers, dtype=np.float32)
+    if out is None:
+        out = np.empty(render_buffers.shape, dtype=np.uint8)
+    assert out.shape == render_buffers.shape
+
+    def process(start, stop):
+        srgb = gamma_correct(render_buffers[start:stop], gamma=gamma)
+        bilateral_filter(srgb, out=out[start:stop], diameter=diameter,
+                         sigma_color=sigma_color, sigma_space=sigma_space)
+
+    num_frames = render_buffers.shape[0]
+    if num_threads > 1 and num_frames > 1:
+        bounds = np.linspace(0, num_frames, min(num_threads, num_frames) + 1).astype(int)
+        jobs = [
+            get_executor(num_threads).submit(process, start, stop)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        for job in jobs:
+            job.result()
+    else:
+        process(0, num_frames)
+    return out
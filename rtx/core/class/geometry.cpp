@@ -10,6 +10,7 @@ Shape::Shape()
     _position = glm::vec3f(0.0f);
     _rotation_rad = glm::vec3f(0.0f);
     _scale = glm::vec3f(1.0f);
+    _version = 0;
     update_model_matrix();
 }
 void Shape::set_scale(py::tuple scale)
@@ -54,6 +55,11 @@ void Shape::set_rotation(float (&rotation)[3])
     _rotation_rad[2] = rotation[2];
     update_model_matrix();
 }
+void Shape::set_model_matrix(glm::mat4f& model_matrix)
+{
+    _model_matrix = model_matrix;
+    _version++;
+}
 void Shape::update_model_matrix()
 {
     _model_matrix = glm::mat4(1.0);
@@ -62,15 +68,11 @@ void Shape::update_model_matrix()
     _model_matrix = glm::rotate(_model_matrix, _rotation_rad[1], glm::vec3(0.0f, 1.0f, 0.0f));
     _model_matrix = glm::rotate(_model_matrix, _rotation_rad[2], glm::vec3(0.0f, 0.0f, 1.0f));
     _model_matrix = glm::scale(_model_matrix, _scale);
-    _updated = true;
-}
-bool Shape::updated()
-{
-    return _updated;
+    _version++;
 }
-void Shape::set_updated(bool updated)
+int Shape::version()
 {
-    _updated = updated;
+    return _version;
 }
 glm::mat4f Shape::model_matrix()
 {
@@ -11,7 +11,8 @@ protected:
     glm::vec3f _position;
     glm::vec3f _rotation_rad;
     glm::vec3f _scale;
-    bool _updated;
+    // 変形するたびに増える
+    int _version;
 
 public:
     glm::mat4 _model_matrix;
@@ -22,8 +23,9 @@ public:
     void set_position(float (&position)[3]);
     void set_rotation(pybind11::tuple rotation_rad);
     void set_rotation(float (&rotation)[3]);
-    bool updated();
-    void set_updated(bool updated);
+    // 位置・回転・拡大を経由せず直接設定する
+    void set_model_matrix(glm::mat4f& model_matrix);
+    int version();
     glm::mat4f model_matrix();
 };
 
@@ -16,6 +16,7 @@ Object::Object(std::shared_ptr<Geometry> geometry, std::shared_ptr<Material> mat
             break;
         }
     }
+    _version = 0;
     set_geometry(geometry);
     set_material(material);
     set_mapping(mapping);
@@ -33,6 +34,7 @@ Object::Object(std::shared_ptr<Geometry> geometry, std::shared_ptr<LayeredMateri
             break;
         }
     }
+    _version = 0;
     set_geometry(geometry);
     set_material(material);
     set_mapping(mapping);
@@ -40,18 +42,22 @@ Object::Object(std::shared_ptr<Geometry> geometry, std::shared_ptr<LayeredMateri
 void Object::set_geometry(std::shared_ptr<Geometry> geometry)
 {
     _geometry = geometry;
+    _version++;
 }
 void Object::set_material(std::shared_ptr<Material> material)
 {
     _material = std::make_shared<LayeredMaterial>(material);
+    _version++;
 }
 void Object::set_material(std::shared_ptr<LayeredMaterial> material)
 {
     _material = material;
+    _version++;
 }
 void Object::set_mapping(std::shared_ptr<Mapping> mapping)
 {
     _mapping = mapping;
+    _version++;
 }
 std::shared_ptr<Geometry>& Object::geometry()
 {
@@ -65,6 +71,10 @@ std::shared_ptr<Mapping>& Object::mapping()
 {
     return _mapping;
 }
+int Object::version()
+{
+    return _version;
+}
 void ObjectGroup::add(std::shared_ptr<Object> object)
 {
     _object_array.push_back(object);
@@ -13,6 +13,8 @@ private:
     std::shared_ptr<Geometry> _geometry;
     std::shared_ptr<LayeredMaterial> _material;
     std::shared_ptr<Mapping> _mapping;
+    // ジオメトリ、マテリアル、マッピングを差し替えるたびに増える
+    int _version;
 
 public:
     Object(std::shared_ptr<Geometry> geometry, std::shared_ptr<Material> material, std::shared_ptr<Mapping> mapping);
@@ -24,6 +26,7 @@ public:
     std::shared_ptr<Geometry>& geometry();
     std::shared_ptr<LayeredMaterial>& material();
     std::shared_ptr<Mapping>& mapping();
+    int version();
 };
 
 class ObjectGroup : public Shape {
@@ -1,6 +1,10 @@
 #include "scene.h"
+#include "../header/enum.h"
+#include "../mapping/solid_color.h"
+#include <stdexcept>
 
 namespace rtx {
+namespace py = pybind11;
 Scene::Scene(pybind11::tuple ambient_color)
 {
     _ambient_color = {
@@ -8,51 +12,74 @@ Scene::Scene(pybind11::tuple ambient_color)
         ambient_color[1].cast<float>(),
         ambient_color[2].cast<float>(),
     };
+    _version = 0;
 }
 void Scene::add(std::shared_ptr<Object> object)
 {
     _object_array.emplace_back(object);
-    _updated = true;
+    _version++;
 }
 void Scene::add(std::shared_ptr<ObjectGroup> group)
 {
     _object_group_array.emplace_back(group);
-    _updated = true;
+    _version++;
 }
-bool Scene::updated()
+void Scene::set_object_transforms(py::array_t<float, py::array::c_style> np_transforms)
 {
-    if (_updated) {
-        return true;
-    }
-    for (auto& object : _object_array) {
-        if (object->geometry()->updated()) {
-            return true;
+    int num_objects = _object_array.size();
+    if (np_transforms.ndim() == 2) {
+        if (np_transforms.shape(0) != num_objects || np_transforms.shape(1) != 3) {
+            throw std::runtime_error("transforms.shape != (num_objects, 3)");
         }
+        auto transforms = np_transforms.unchecked<2>();
+        for (int n = 0; n < num_objects; n++) {
+            float position[3] = { transforms(n, 0), transforms(n, 1), transforms(n, 2) };
+            _object_array[n]->geometry()->set_position(position);
+        }
+        return;
     }
-    for (auto& group : _object_group_array) {
-        for (auto& object : group->_object_array) {
-            if (object->geometry()->updated()) {
-                return true;
-            }
+    if (np_transforms.ndim() == 3) {
+        if (np_transforms.shape(0) != num_objects || np_transforms.shape(1) != 4 || np_transforms.shape(2) != 4) {
+            throw std::runtime_error("transforms.shape != (num_objects, 4, 4)");
         }
-        if (group->updated()) {
-            return true;
+        auto transforms = np_transforms.unchecked<3>();
+        for (int n = 0; n < num_objects; n++) {
+            // glmは列優先
+            glm::mat4f model_matrix;
+            for (int row = 0; row < 4; row++) {
+                for (int column = 0; column < 4; column++) {
+                    model_matrix[column][row] = transforms(n, row, column);
+                }
+            }
+            _object_array[n]->geometry()->set_model_matrix(model_matrix);
         }
+        return;
     }
-    return false;
+    throw std::runtime_error("transforms.ndim must be 2 or 3");
 }
-void Scene::set_updated(bool updated)
+void Scene::set_colors(py::array_t<float, py::array::c_style> np_colors)
 {
-    _updated = updated;
-    for (auto& object : _object_array) {
-        object->geometry()->set_updated(updated);
+    int num_objects = _object_array.size();
+    // SolidColorMappingはRGBのみを持つ
+    if (np_colors.ndim() != 2 || np_colors.shape(0) != num_objects || np_colors.shape(1) != 3) {
+        throw std::runtime_error("colors.shape != (num_objects, 3)");
     }
-    for (auto& group : _object_group_array) {
-        for (auto& object : group->_object_array) {
-            object->geometry()->set_updated(updated);
+    for (auto& object : _object_array) {
+        if (object->mapping()->type() != RTXMappingTypeSolidColor) {
+            throw std::runtime_error("set_colors requires SolidColorMapping");
         }
-        group->set_updated(updated);
     }
+    auto colors = np_colors.unchecked<2>();
+    for (int n = 0; n < num_objects; n++) {
+        // 他のオブジェクトと共有されている場合があるので作り直す
+        // set_mappingでオブジェクトのバージョンが上がり、色だけが再転送される
+        float color[3] = { colors(n, 0), colors(n, 1), colors(n, 2) };
+        _object_array[n]->set_mapping(std::make_shared<SolidColorMapping>(color));
+    }
+}
+int Scene::version()
+{
+    return _version;
 }
 int Scene::num_triangles()
 {
@@ -1,13 +1,15 @@
 #pragma once
 #include "object.h"
 #include <memory>
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <vector>
 
 namespace rtx {
 class Scene {
 private:
-    bool _updated;
+    // オブジェクトを追加するたびに増える
+    int _version;
 
 public:
     std::vector<std::shared_ptr<Object>> _object_array;
@@ -17,8 +19,12 @@ public:
     Scene(pybind11::tuple ambient_color);
     void add(std::shared_ptr<Object> object);
     void add(std::shared_ptr<ObjectGroup> object);
-    bool updated();
-    void set_updated(bool updated);
+    // 追加した順に_object_arrayのオブジェクトをまとめて更新する
+    // 位置 (N, 3) または変換行列 (N, 4, 4)
+    void set_object_transforms(pybind11::array_t<float, pybind11::array::c_style> transforms);
+    // RGB (N, 3)。SolidColorMappingはアルファを持たない
+    void set_colors(pybind11::array_t<float, pybind11::array::c_style> colors);
+    int version();
     int num_triangles();
 };
 }
\ No newline at end of file
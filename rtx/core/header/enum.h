@@ -31,4 +31,18 @@ enum RTXCameraType {
     RTXCameraTypeOrthographic,
 };
 
-#define BVH_DEFAULT_TRIANGLES_PER_NODE 25
\ No newline at end of file
+enum RTXBackend {
+    RTXBackendCUDA = 1,
+    RTXBackendCPU,
+};
+
+#define BVH_DEFAULT_TRIANGLES_PER_NODE 25
+#define BVH_NUM_SAH_BINS 16
+// uint8のバッファに書き込むときのsRGB変換とバイラテラルフィルタ
+// gqn.postprocess.to_imagesの既定値と同じ
+#define RTX_SRGB_GAMMA 2.2f
+#define RTX_DENOISE_DIAMETER 3
+#define RTX_DENOISE_SIGMA_COLOR 25.0f
+#define RTX_DENOISE_SIGMA_SPACE 25.0f
+// 適応的サンプリングで誤差を推定する前に全画素を描画するパスの数
+#define RTX_ADAPTIVE_SAMPLING_MIN_PASSES 2
\ No newline at end of file
@@ -112,6 +112,11 @@ typedef struct rtxMCRTKernelArguments {
     int uv_coordinate_array_size;
     int curand_seed;
     bool supersampling_enabled;
+    // Rows of the affine transform from camera space to the space the objects are serialized in
+    rtxVector4f ray_transform[3];
+    // Only these pixels are traced, or the first num_active_pixels pixels when the array is NULL
+    int num_active_pixels;
+    int* active_pixel_index_array;
 } rtxMCRTKernelArguments;
 
 typedef struct rtxNEEKernelArguments {
@@ -136,4 +141,9 @@ typedef struct rtxNEEKernelArguments {
     float total_light_face_area;
     int curand_seed;
     bool supersampling_enabled;
+    // Rows of the affine transform from camera space to the space the objects are serialized in
+    rtxVector4f ray_transform[3];
+    // Only these pixels are traced, or the first num_active_pixels pixels when the array is NULL
+    int num_active_pixels;
+    int* active_pixel_index_array;
 } rtxNEEKernelArguments;
\ No newline at end of file
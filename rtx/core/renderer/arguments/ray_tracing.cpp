@@ -7,6 +7,12 @@ RayTracingArguments::RayTracingArguments()
     _max_bounce = 0;
     _next_event_estimation_enabled = false;
     _supersampling_enabled = true;
+    _denoise_enabled = false;
+    _adaptive_sampling_enabled = false;
+    _pixel_error_tolerance = 0.01f;
+    _image_error_tolerance = 0.005f;
+    _max_passes = 8;
+    _seed = 0;
 }
 int RayTracingArguments::num_rays_per_pixel()
 {
@@ -41,4 +47,52 @@ void RayTracingArguments::set_supersampling_enabled(bool enabled)
 {
     _supersampling_enabled = enabled; 
 }
+bool RayTracingArguments::denoise_enabled()
+{
+    return _denoise_enabled;
+}
+void RayTracingArguments::set_denoise_enabled(bool enabled)
+{
+    _denoise_enabled = enabled;
+}
+bool RayTracingArguments::adaptive_sampling_enabled()
+{
+    return _adaptive_sampling_enabled;
+}
+void RayTracingArguments::set_adaptive_sampling_enabled(bool enabled)
+{
+    _adaptive_sampling_enabled = enabled;
+}
+float RayTracingArguments::pixel_error_tolerance()
+{
+    return _pixel_error_tolerance;
+}
+void RayTracingArguments::set_pixel_error_tolerance(float tolerance)
+{
+    _pixel_error_tolerance = tolerance;
+}
+float RayTracingArguments::image_error_tolerance()
+{
+    return _image_error_tolerance;
+}
+void RayTracingArguments::set_image_error_tolerance(float tolerance)
+{
+    _image_error_tolerance = tolerance;
+}
+int RayTracingArguments::max_passes()
+{
+    return _max_passes;
+}
+void RayTracingArguments::set_max_passes(int passes)
+{
+    _max_passes = passes;
+}
+int RayTracingArguments::seed()
+{
+    return _seed;
+}
+void RayTracingArguments::set_seed(int seed)
+{
+    _seed = seed;
+}
 }
\ No newline at end of file
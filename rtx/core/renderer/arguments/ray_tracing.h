@@ -7,6 +7,12 @@ private:
     int _max_bounce;
     bool _next_event_estimation_enabled;
     bool _supersampling_enabled;
+    bool _denoise_enabled;
+    bool _adaptive_sampling_enabled;
+    float _pixel_error_tolerance;
+    float _image_error_tolerance;
+    int _max_passes;
+    int _seed;
 
 public:
     RayTracingArguments();
@@ -18,5 +24,17 @@ public:
     void set_next_event_estimation_enabled(bool enabled);
     bool supersampling_enabled();
     void set_supersampling_enabled(bool enabled);
+    bool denoise_enabled();
+    void set_denoise_enabled(bool enabled);
+    bool adaptive_sampling_enabled();
+    void set_adaptive_sampling_enabled(bool enabled);
+    float pixel_error_tolerance();
+    void set_pixel_error_tolerance(float tolerance);
+    float image_error_tolerance();
+    void set_image_error_tolerance(float tolerance);
+    int max_passes();
+    void set_max_passes(int passes);
+    int seed();
+    void set_seed(int seed);
 };
 }
\ No newline at end of file
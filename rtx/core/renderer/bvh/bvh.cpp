@@ -1,14 +1,15 @@
 #include "bvh.h"
 #include "../../header/enum.h"
+#include "../header/bridge.h"
 #include <algorithm>
-#include <bitset>
 #include <cassert>
 #include <cfloat>
-#include <iostream>
+#include <cstring>
 #include <utility>
 
 namespace rtx {
-using namespace bvh;
+namespace py = pybind11;
+using bvh::Primitive;
 template <int L, typename T>
 void merge_aabb_max(const glm::vec3f& a, const glm::vec<L, T>& b, glm::vec3f& dest)
 {
@@ -31,397 +32,203 @@ float compute_surface_area(const glm::vec3f max, const glm::vec3f min)
     return 2 * (dx * dy + dx * dz + dy * dz);
 }
 
-int detect_longest_axis(const glm::vec3f& axis_length)
+int compute_bin_index(const glm::vec3f& centroid, const glm::vec3f& centroid_min, float scale, int axis)
 {
-    if (axis_length.x > axis_length.y) {
-        if (axis_length.x > axis_length.z) {
-            return RTXAxisX;
-        }
-        return RTXAxisZ;
-    }
-    if (axis_length.y > axis_length.x) {
-        if (axis_length.y > axis_length.z) {
-            return RTXAxisY;
-        }
-        return RTXAxisZ;
-    }
-    if (axis_length.x > axis_length.z) {
-        if (axis_length.y > axis_length.x) {
-            return RTXAxisY;
-        }
-        return RTXAxisX;
-    }
-    return RTXAxisZ;
+    int bin_index = int((centroid[axis] - centroid_min[axis]) * scale);
+    return bin_index < BVH_NUM_SAH_BINS - 1 ? bin_index : BVH_NUM_SAH_BINS - 1;
 }
-bool compare_position(const std::pair<int, float>& a, const std::pair<int, float>& b)
+void BVH::build_node(int begin, int end, int max_triangles_per_node)
 {
-    return a.second < b.second;
-}
-Node::Node(std::vector<int> assigned_face_indices,
-    std::shared_ptr<StandardGeometry>& geometry,
-    int& current_node_index,
-    int& current_assigned_face_index_offset)
-{
-    // std::cout << "===================================" << std::endl;
-    assert(assigned_face_indices.size() > 0);
-    _assigned_face_indices = assigned_face_indices;
-    _index = current_node_index;
-    _assigned_face_index_start = -1;
-    _assigned_face_index_end = -1;
-    _is_leaf = false;
-    // std::cout << "id: " << _index << std::endl;
-    current_node_index++;
-    _aabb_max = glm::vec3f(-FLT_MAX);
-    _aabb_min = glm::vec3f(FLT_MAX);
-
-    for (int face_index : assigned_face_indices) {
-        auto& face = geometry->_face_vertex_indices_array.at(face_index);
-        auto& va = geometry->_vertex_array[face[0]];
-        merge_aabb_max(_aabb_max, va, _aabb_max);
-        merge_aabb_min(_aabb_min, va, _aabb_min);
-
-        auto& vb = geometry->_vertex_array[face[1]];
-        merge_aabb_max(_aabb_max, vb, _aabb_max);
-        merge_aabb_min(_aabb_min, vb, _aabb_min);
-
-        auto& vc = geometry->_vertex_array[face[2]];
-        merge_aabb_max(_aabb_max, vc, _aabb_max);
-        merge_aabb_min(_aabb_min, vc, _aabb_min);
+    assert(end > begin);
+    // 子ノードの追加で再確保されうるので参照ではなく添字で保持する
+    const int node_index = _node_array.size();
+    _node_array.emplace_back();
+    glm::vec3f aabb_max = glm::vec3f(-FLT_MAX);
+    glm::vec3f aabb_min = glm::vec3f(FLT_MAX);
+    glm::vec3f centroid_max = glm::vec3f(-FLT_MAX);
+    glm::vec3f centroid_min = glm::vec3f(FLT_MAX);
+
+    for (int n = begin; n < end; n++) {
+        const Primitive& primitive = _primitive_array[_face_indices[n]];
+        merge_aabb_max(aabb_max, primitive.aabb_max, aabb_max);
+        merge_aabb_min(aabb_min, primitive.aabb_min, aabb_min);
+        merge_aabb_max(centroid_max, primitive.centroid, centroid_max);
+        merge_aabb_min(centroid_min, primitive.centroid, centroid_min);
     }
-
-    if ((int)assigned_face_indices.size() <= geometry->bvh_max_triangles_per_node()) {
-        _is_leaf = true;
-        _assigned_face_index_start = current_assigned_face_index_offset;
-        _assigned_face_index_end = current_assigned_face_index_offset + assigned_face_indices.size() - 1;
-        current_assigned_face_index_offset += (int)assigned_face_indices.size();
-        return;
+    {
+        rtxThreadedBVHNode& node = _node_array[node_index];
+        node.aabb_max = { aabb_max.x, aabb_max.y, aabb_max.z, 0.0f };
+        node.aabb_min = { aabb_min.x, aabb_min.y, aabb_min.z, 0.0f };
     }
-    const glm::vec3f axis_length = _aabb_max - _aabb_min;
-    int longest_axis = detect_longest_axis(axis_length);
-    // if (_index == 0) {
-    //     longest_axis = RTXAxisX;
-    // }
-
-    // std::cout << "longest: " << longest_axis << std::endl;
-    std::vector<std::pair<int, float>> object_center_array;
 
-    for (int face_index : assigned_face_indices) {
-        auto& face = geometry->_face_vertex_indices_array.at(face_index);
-        auto& va = geometry->_vertex_array[face[0]];
-        auto& vb = geometry->_vertex_array[face[1]];
-        auto& vc = geometry->_vertex_array[face[2]];
-        auto center = (va + vb + vc) / 3.0f;
-        if (longest_axis == RTXAxisX) {
-            object_center_array.emplace_back(face_index, center.x);
-        } else if (longest_axis == RTXAxisY) {
-            object_center_array.emplace_back(face_index, center.y);
-        } else {
-            object_center_array.emplace_back(face_index, center.z);
-        }
+    if (end - begin <= max_triangles_per_node) {
+        rtxThreadedBVHNode& node = _node_array[node_index];
+        node.hit_node_index = THREADED_BVH_TERMINAL_NODE;
+        node.assigned_face_index_start = begin;
+        node.assigned_face_index_end = end - 1;
+        // 行きがけ順なので部分木の直後のノードがmiss先になる
+        node.miss_node_index = _node_array.size();
+        return;
     }
 
-    std::sort(object_center_array.begin(), object_center_array.end(), compare_position);
-    // std::cout << "sort:" << std::endl;
-    // for (auto& pair : object_center_array) {
-    //     std::cout << pair.first << ": " << pair.second << std::endl;
-    // }
-
-    glm::vec3f volume_a_max(0);
-    glm::vec3f volume_a_min(0);
-    glm::vec3f volume_b_max(0);
-    glm::vec3f volume_b_min(0);
-    // std::cout << "==============================================================" << std::endl;
-
+    // 重心の範囲を等分したビンに面を振り分け、SAHのコストが最小になるビンの境界で分割する
+    const glm::vec3f centroid_extent = centroid_max - centroid_min;
     float min_cost = FLT_MAX;
-    int min_cost_split_index = 0;
-    if (true) {
-        min_cost_split_index = object_center_array.size() / 2;
-    } else {
-        for (unsigned int split_index = 1; split_index <= object_center_array.size() - 1; split_index++) {
-            int volume_a_num_faces = 0;
-            int volume_b_num_faces = 0;
-            for (unsigned int position = 0; position < split_index; position++) {
-                int face_index = object_center_array[position].first;
-                auto& face = geometry->_face_vertex_indices_array.at(face_index);
-
-                glm::vec3f max = glm::vec3f(-FLT_MAX);
-                glm::vec3f min = glm::vec3f(FLT_MAX);
-
-                auto& va = geometry->_vertex_array[face[0]];
-                merge_aabb_max(max, va, max);
-                merge_aabb_min(min, va, min);
-
-                auto& vb = geometry->_vertex_array[face[1]];
-                merge_aabb_max(max, vb, max);
-                merge_aabb_min(min, vb, min);
-
-                auto& vc = geometry->_vertex_array[face[2]];
-                merge_aabb_max(max, vc, max);
-                merge_aabb_min(min, vc, min);
+    int min_cost_axis = -1;
+    int min_cost_split_bin = 0;
+    for (int axis = 0; axis < 3; axis++) {
+        if (centroid_extent[axis] <= 0.0f) {
+            continue;
+        }
+        const float scale = BVH_NUM_SAH_BINS / centroid_extent[axis];
+        int bin_num_faces[BVH_NUM_SAH_BINS] = { 0 };
+        glm::vec3f bin_aabb_max[BVH_NUM_SAH_BINS];
+        glm::vec3f bin_aabb_min[BVH_NUM_SAH_BINS];
+        for (int bin_index = 0; bin_index < BVH_NUM_SAH_BINS; bin_index++) {
+            bin_aabb_max[bin_index] = glm::vec3f(-FLT_MAX);
+            bin_aabb_min[bin_index] = glm::vec3f(FLT_MAX);
+        }
+        for (int n = begin; n < end; n++) {
+            const Primitive& primitive = _primitive_array[_face_indices[n]];
+            int bin_index = compute_bin_index(primitive.centroid, centroid_min, scale, axis);
+            bin_num_faces[bin_index] += 1;
+            merge_aabb_max(bin_aabb_max[bin_index], primitive.aabb_max, bin_aabb_max[bin_index]);
+            merge_aabb_min(bin_aabb_min[bin_index], primitive.aabb_min, bin_aabb_min[bin_index]);
+        }
 
-                if (position == 0) {
-                    volume_a_max = max;
-                    volume_a_min = min;
-                } else {
-                    merge_aabb_max(volume_a_max, max, volume_a_max);
-                    merge_aabb_min(volume_a_min, min, volume_a_min);
-                }
-                volume_a_num_faces += 1;
+        // 右側のビンから累積したコスト
+        float right_cost[BVH_NUM_SAH_BINS] = { 0.0f };
+        int right_num_faces[BVH_NUM_SAH_BINS] = { 0 };
+        glm::vec3f volume_max = glm::vec3f(-FLT_MAX);
+        glm::vec3f volume_min = glm::vec3f(FLT_MAX);
+        int num_faces = 0;
+        for (int bin_index = BVH_NUM_SAH_BINS - 1; bin_index > 0; bin_index--) {
+            merge_aabb_max(volume_max, bin_aabb_max[bin_index], volume_max);
+            merge_aabb_min(volume_min, bin_aabb_min[bin_index], volume_min);
+            num_faces += bin_num_faces[bin_index];
+            right_num_faces[bin_index] = num_faces;
+            if (num_faces > 0) {
+                right_cost[bin_index] = compute_surface_area(volume_max, volume_min) * num_faces;
             }
-            for (unsigned int position = split_index; position < object_center_array.size(); position++) {
-                int face_index = object_center_array[position].first;
-                auto& face = geometry->_face_vertex_indices_array.at(face_index);
-
-                glm::vec3f max = glm::vec3f(-FLT_MAX);
-                glm::vec3f min = glm::vec3f(FLT_MAX);
-
-                auto& va = geometry->_vertex_array[face[0]];
-                merge_aabb_max(max, va, max);
-                merge_aabb_min(min, va, min);
-
-                auto& vb = geometry->_vertex_array[face[1]];
-                merge_aabb_max(max, vb, max);
-                merge_aabb_min(min, vb, min);
-
-                auto& vc = geometry->_vertex_array[face[2]];
-                merge_aabb_max(max, vc, max);
-                merge_aabb_min(min, vc, min);
+        }
 
-                if (position == split_index) {
-                    volume_b_max = max;
-                    volume_b_min = min;
-                } else {
-                    merge_aabb_max(volume_b_max, max, volume_b_max);
-                    merge_aabb_min(volume_b_min, min, volume_b_min);
-                }
-                volume_b_num_faces += 1;
+        volume_max = glm::vec3f(-FLT_MAX);
+        volume_min = glm::vec3f(FLT_MAX);
+        num_faces = 0;
+        for (int split_bin = 1; split_bin < BVH_NUM_SAH_BINS; split_bin++) {
+            merge_aabb_max(volume_max, bin_aabb_max[split_bin - 1], volume_max);
+            merge_aabb_min(volume_min, bin_aabb_min[split_bin - 1], volume_min);
+            num_faces += bin_num_faces[split_bin - 1];
+            if (num_faces == 0 || right_num_faces[split_bin] == 0) {
+                continue;
             }
-            float surface_a = compute_surface_area(volume_a_max, volume_a_min);
-            float surface_b = compute_surface_area(volume_b_max, volume_b_min);
-            float cost = surface_a * volume_a_num_faces + surface_b * volume_b_num_faces;
+            float cost = compute_surface_area(volume_max, volume_min) * num_faces + right_cost[split_bin];
             if (cost < min_cost) {
                 min_cost = cost;
-                min_cost_split_index = split_index;
+                min_cost_axis = axis;
+                min_cost_split_bin = split_bin;
             }
         }
     }
 
-    int split_index = min_cost_split_index;
-    // std::cout << "split: " << split_index << std::endl;
-    std::vector<int> left_assigned_indices;
-    std::vector<int> right_assigned_indices;
-    for (int n = 0; n < split_index; n++) {
-        auto& pair = object_center_array.at(n);
-        left_assigned_indices.push_back(pair.first);
-    }
-    for (int n = split_index; n < (int)assigned_face_indices.size(); n++) {
-        auto& pair = object_center_array.at(n);
-        right_assigned_indices.push_back(pair.first);
-    }
-    // std::cout << "left:" << std::endl;
-    // for (auto index : left_assigned_indices) {
-    //     std::cout << index << std::endl;
-    // }
-    // std::cout << "right:" << std::endl;
-    // for (auto index : right_assigned_indices) {
-    //     std::cout << index << std::endl;
-    // }
-    _left = std::make_shared<Node>(left_assigned_indices, geometry, current_node_index, current_assigned_face_index_offset);
-    _right = std::make_shared<Node>(right_assigned_indices, geometry, current_node_index, current_assigned_face_index_offset);
-}
-Node::Node(std::vector<int> assigned_face_indices,
-    std::shared_ptr<SphereGeometry>& geometry)
-{
-    assert(assigned_face_indices.size() > 0);
-    _assigned_face_indices = assigned_face_indices;
-    _index = 0;
-    _assigned_face_index_start = 0;
-    _assigned_face_index_end = 0;
-
-    // AABBは使わない
-    _aabb_max = glm::vec3f(0.0f);
-    _aabb_min = glm::vec3f(0.0f);
-
-    _is_leaf = true;
-}
-Node::Node(std::vector<int> assigned_face_indices,
-    std::shared_ptr<CylinderGeometry>& geometry)
-{
-    assert(assigned_face_indices.size() > 0);
-    _assigned_face_indices = assigned_face_indices;
-    _index = 0;
-    _assigned_face_index_start = 0;
-    _assigned_face_index_end = 0;
-
-    // AABBは使わない
-    _aabb_max = glm::vec3f(0.0f);
-    _aabb_min = glm::vec3f(0.0f);
-
-    _is_leaf = true;
-}
-Node::Node(std::vector<int> assigned_face_indices,
-    std::shared_ptr<ConeGeometry>& geometry)
-{
-    assert(assigned_face_indices.size() > 0);
-    _assigned_face_indices = assigned_face_indices;
-    _index = 0;
-    _assigned_face_index_start = 0;
-    _assigned_face_index_end = 0;
-
-    // AABBは使わない
-    _aabb_max = glm::vec3f(0.0f);
-    _aabb_min = glm::vec3f(0.0f);
-
-    _is_leaf = true;
-}
-void Node::set_hit_and_miss_links()
-{
-    if (_left) {
-        _hit = _left;
-        if (_right) {
-            _left->_miss = _right;
-        } else {
-            _left->_miss = _miss;
-        }
-        _left->set_hit_and_miss_links();
-    }
-    if (_right) {
-        _right->_miss = _miss;
-        _right->set_hit_and_miss_links();
+    int middle;
+    if (min_cost_axis == -1) {
+        // 全ての重心が一致している場合は面の数で等分する
+        middle = begin + (end - begin) / 2;
+    } else {
+        const float scale = BVH_NUM_SAH_BINS / centroid_extent[min_cost_axis];
+        auto iterator = std::partition(_face_indices.begin() + begin, _face_indices.begin() + end,
+            [&](int face_index) {
+                return compute_bin_index(_primitive_array[face_index].centroid, centroid_min, scale, min_cost_axis) < min_cost_split_bin;
+            });
+        middle = (int)(iterator - _face_indices.begin());
     }
+    assert(begin < middle && middle < end);
+    build_node(begin, middle, max_triangles_per_node);
+    build_node(middle, end, max_triangles_per_node);
+
+    rtxThreadedBVHNode& node = _node_array[node_index];
+    // 中間ノードのhit先は左の子
+    node.hit_node_index = node_index + 1;
+    node.assigned_face_index_start = -1;
+    node.assigned_face_index_end = -1;
+    node.miss_node_index = _node_array.size();
 }
-int Node::num_children()
+void BVH::build_leaf()
 {
-    int num_children = 0;
-    if (_left) {
-        num_children += _left->num_children() + 1;
-    }
-    if (_right) {
-        num_children += _right->num_children() + 1;
-    }
-    return num_children;
+    // Sphere, Cylinder, ConeはAABBを使わない葉ノード1つだけで表す
+    rtxThreadedBVHNode node;
+    node.hit_node_index = THREADED_BVH_TERMINAL_NODE;
+    node.miss_node_index = THREADED_BVH_TERMINAL_NODE;
+    node.assigned_face_index_start = 0;
+    node.assigned_face_index_end = 0;
+    node.aabb_max = { 0.0f, 0.0f, 0.0f, 0.0f };
+    node.aabb_min = { 0.0f, 0.0f, 0.0f, 0.0f };
+    _node_array.push_back(node);
 }
-void Node::collect_children(std::vector<std::shared_ptr<Node>>& children)
+BVH::BVH()
 {
-    if (_left) {
-        children.push_back(_left);
-        _left->collect_children(children);
-    }
-    if (_right) {
-        children.push_back(_right);
-        _right->collect_children(children);
-    }
 }
-void Node::collect_leaves(std::vector<std::shared_ptr<Node>>& leaves)
+BVH::BVH(std::shared_ptr<Geometry>& geometry)
 {
-    if (_left) {
-        if (_left->_is_leaf) {
-            leaves.push_back(_left);
-        } else {
-            _left->collect_leaves(leaves);
-        }
-    }
-    if (_right) {
-        if (_right->_is_leaf) {
-            leaves.push_back(_right);
-        } else {
-            _right->collect_leaves(leaves);
-        }
-    }
+    build(geometry);
 }
-BVH::BVH(std::shared_ptr<Geometry>& geometry)
+void BVH::build(std::shared_ptr<Geometry>& geometry)
 {
     _geometry = geometry;
-    std::vector<int> assigned_face_indices;
+    _node_array.clear();
+    _face_indices.clear();
     if (geometry->type() == RTXGeometryTypeStandard) {
         std::shared_ptr<StandardGeometry> standard = std::static_pointer_cast<StandardGeometry>(geometry);
-        for (int face_index = 0; face_index < (int)standard->_face_vertex_indices_array.size(); face_index++) {
-            assigned_face_indices.push_back(face_index);
-        }
-        _current_node_index = 0;
-        _current_assigned_face_index_offset = 0;
-        _root = std::make_shared<Node>(assigned_face_indices, standard, _current_node_index, _current_assigned_face_index_offset);
-        _root->set_hit_and_miss_links();
-
-        _num_nodes = _root->num_children() + 1;
-        return;
-    }
-    if (geometry->type() == RTXGeometryTypeSphere) {
-        std::shared_ptr<SphereGeometry> sphere = std::static_pointer_cast<SphereGeometry>(geometry);
-        std::vector<int> assigned_face_indices;
-        for (int face_index = 0; face_index < geometry->num_faces(); face_index++) {
-            assigned_face_indices.push_back(face_index);
+        int num_faces = standard->_face_vertex_indices_array.size();
+        _primitive_array.resize(num_faces);
+        _face_indices.resize(num_faces);
+        for (int face_index = 0; face_index < num_faces; face_index++) {
+            auto& face = standard->_face_vertex_indices_array[face_index];
+            auto& va = standard->_vertex_array[face[0]];
+            auto& vb = standard->_vertex_array[face[1]];
+            auto& vc = standard->_vertex_array[face[2]];
+            Primitive& primitive = _primitive_array[face_index];
+            primitive.aabb_max = glm::vec3f(-FLT_MAX);
+            primitive.aabb_min = glm::vec3f(FLT_MAX);
+            merge_aabb_max(primitive.aabb_max, va, primitive.aabb_max);
+            merge_aabb_min(primitive.aabb_min, va, primitive.aabb_min);
+            merge_aabb_max(primitive.aabb_max, vb, primitive.aabb_max);
+            merge_aabb_min(primitive.aabb_min, vb, primitive.aabb_min);
+            merge_aabb_max(primitive.aabb_max, vc, primitive.aabb_max);
+            merge_aabb_min(primitive.aabb_min, vc, primitive.aabb_min);
+            primitive.centroid = glm::vec3f((va + vb + vc) / 3.0f);
+            _face_indices[face_index] = face_index;
         }
-        _current_node_index = 0;
-        _current_assigned_face_index_offset = 0;
-        _root = std::make_shared<Node>(assigned_face_indices, sphere);
-        _root->set_hit_and_miss_links();
-
-        _num_nodes = _root->num_children() + 1;
-        return;
-    }
-    if (geometry->type() == RTXGeometryTypeCylinder) {
-        std::shared_ptr<CylinderGeometry> cylinder = std::static_pointer_cast<CylinderGeometry>(geometry);
-        std::vector<int> assigned_face_indices;
-        for (int face_index = 0; face_index < geometry->num_faces(); face_index++) {
-            assigned_face_indices.push_back(face_index);
+        // 葉ノードの面の数が1以上ならノード数は2 * num_faces - 1を超えない
+        _node_array.reserve(2 * num_faces);
+        build_node(0, num_faces, standard->bvh_max_triangles_per_node());
+
+        // 最後の部分木のmiss先は終端
+        const int num_nodes = _node_array.size();
+        for (auto& node : _node_array) {
+            if (node.miss_node_index == num_nodes) {
+                node.miss_node_index = THREADED_BVH_TERMINAL_NODE;
+            }
         }
-        _current_node_index = 0;
-        _current_assigned_face_index_offset = 0;
-        _root = std::make_shared<Node>(assigned_face_indices, cylinder);
-        _root->set_hit_and_miss_links();
-
-        _num_nodes = _root->num_children() + 1;
         return;
     }
-    if (geometry->type() == RTXGeometryTypeCone) {
-        std::shared_ptr<ConeGeometry> cone = std::static_pointer_cast<ConeGeometry>(geometry);
-        std::vector<int> assigned_face_indices;
-        for (int face_index = 0; face_index < geometry->num_faces(); face_index++) {
-            assigned_face_indices.push_back(face_index);
-        }
-        _current_node_index = 0;
-        _current_assigned_face_index_offset = 0;
-        _root = std::make_shared<Node>(assigned_face_indices, cone);
-        _root->set_hit_and_miss_links();
-
-        _num_nodes = _root->num_children() + 1;
+    if (geometry->type() == RTXGeometryTypeSphere || geometry->type() == RTXGeometryTypeCylinder || geometry->type() == RTXGeometryTypeCone) {
+        build_leaf();
         return;
     }
 }
 int BVH::num_nodes()
 {
-    return _num_nodes;
+    return _node_array.size();
 }
 void BVH::serialize_nodes(rtx::array<rtxThreadedBVHNode>& node_array, int serialization_offset)
 {
-    std::vector<std::shared_ptr<Node>> children = { _root };
-    _root->collect_children(children);
-    for (auto& node : children) {
-        int pos = node->_index + serialization_offset;
-
-        rtxThreadedBVHNode cuda_node;
-        cuda_node.hit_node_index = node->_hit ? node->_hit->_index : -1;
-        cuda_node.miss_node_index = node->_miss ? node->_miss->_index : -1;
-        cuda_node.assigned_face_index_start = node->_assigned_face_index_start;
-        cuda_node.assigned_face_index_end = node->_assigned_face_index_end;
-        cuda_node.aabb_max.x = node->_aabb_max.x;
-        cuda_node.aabb_max.y = node->_aabb_max.y;
-        cuda_node.aabb_max.z = node->_aabb_max.z;
-        cuda_node.aabb_min.x = node->_aabb_min.x;
-        cuda_node.aabb_min.y = node->_aabb_min.y;
-        cuda_node.aabb_min.z = node->_aabb_min.z;
-
-        node_array[pos] = cuda_node;
-
-        // printf("node: %d face_start: %d face_end: %d max: (%f, %f, %f) min: (%f, %f, %f)\n", node->_index, node->_assigned_face_index_start, node->_assigned_face_index_end, node->_aabb_max.x, node->_aabb_max.y, node->_aabb_max.z, node->_aabb_min.x, node->_aabb_min.y, node->_aabb_min.z);
-        // printf("    hit: %d miss: %d left: %d right: %d\n", (node->_hit ? node->_hit->_index : -1), (node->_miss ? node->_miss->_index : -1), (node->_left ? node->_left->_index : -1), (node->_right ? node->_right->_index : -1));
-    }
+    assert(serialization_offset + num_nodes() <= node_array.size());
+    std::memcpy(node_array.data() + serialization_offset, _node_array.data(), sizeof(rtxThreadedBVHNode) * _node_array.size());
 }
 void BVH::serialize_faces(rtx::array<rtxFaceVertexIndex>& buffer, int serialization_offset)
 {
-    std::vector<std::shared_ptr<bvh::Node>> leaves;
-    collect_leaves(leaves);
     assert(_geometry.expired() == false);
 
     auto geometry = _geometry.lock();
@@ -435,14 +242,10 @@ void BVH::serialize_faces(rtx::array<rtxFaceVertexIndex>& buffer, int serializat
         //     auto& face = face_vertex_indices_array[face_index];
         //     // printf("[%d] (%d, %d, %d)\n", face_index, face[0], face[1], face[2]);
         // }
-        for (auto& node : leaves) {
-            int pos = node->_assigned_face_index_start + serialization_offset;
-            for (int face_index : node->_assigned_face_indices) {
-                glm::vec3i face = face_vertex_indices_array[face_index];
-                buffer[pos] = { face[0], face[1], face[2], -1 };
-                pos++;
-                // printf("[%d] (%d, %d, %d)\n", face_index, face[0], face[1], face[2]);
-            }
+        // 葉ノードの面は_face_indicesの連続した区間に割り当てられている
+        for (int n = 0; n < (int)_face_indices.size(); n++) {
+            glm::vec3i face = face_vertex_indices_array[_face_indices[n]];
+            buffer[serialization_offset + n] = { face[0], face[1], face[2], -1 };
         }
         return;
     }
@@ -474,12 +277,55 @@ void BVH::serialize_faces(rtx::array<rtxFaceVertexIndex>& buffer, int serializat
         return;
     }
 }
-void BVH::collect_leaves(std::vector<std::shared_ptr<bvh::Node>>& leaves)
+py::array_t<int> BVH::count_traversal_steps(py::array_t<float, py::array::c_style> np_ray_origins,
+    py::array_t<float, py::array::c_style> np_ray_directions)
 {
-    if (_root->_is_leaf) {
-        leaves.push_back(_root);
-        return;
+    if (np_ray_origins.ndim() != 2 || np_ray_origins.shape(1) != 3) {
+        throw std::runtime_error("ray_origins.shape != (num_rays, 3)");
+    }
+    if (np_ray_directions.ndim() != 2 || np_ray_directions.shape(1) != 3) {
+        throw std::runtime_error("ray_directions.shape != (num_rays, 3)");
+    }
+    if (np_ray_origins.shape(0) != np_ray_directions.shape(0)) {
+        throw std::runtime_error("ray_origins.shape[0] != ray_directions.shape[0]");
+    }
+    int num_rays = np_ray_origins.shape(0);
+    auto ray_origins = np_ray_origins.unchecked<2>();
+    auto ray_directions = np_ray_directions.unchecked<2>();
+    py::array_t<int> np_num_steps(num_rays);
+    auto num_steps = np_num_steps.mutable_unchecked<1>();
+
+    // カーネルと同じ手順でThreaded BVHを遷移し、訪れたノードの数を数える
+    for (int ray_index = 0; ray_index < num_rays; ray_index++) {
+        const glm::vec3f ray_origin = glm::vec3f(ray_origins(ray_index, 0), ray_origins(ray_index, 1), ray_origins(ray_index, 2));
+        const glm::vec3f ray_direction_inv = 1.0f / glm::vec3f(ray_directions(ray_index, 0), ray_directions(ray_index, 1), ray_directions(ray_index, 2));
+        num_steps(ray_index) = 0;
+        int node_index = 0;
+        while (node_index != THREADED_BVH_TERMINAL_NODE) {
+            const rtxThreadedBVHNode& node = _node_array[node_index];
+            num_steps(ray_index) += 1;
+            if (node.assigned_face_index_start == -1) {
+                float tmin = -FLT_MAX;
+                float tmax = FLT_MAX;
+                const float aabb_min[3] = { node.aabb_min.x, node.aabb_min.y, node.aabb_min.z };
+                const float aabb_max[3] = { node.aabb_max.x, node.aabb_max.y, node.aabb_max.z };
+                for (int axis = 0; axis < 3; axis++) {
+                    float t0 = (aabb_min[axis] - ray_origin[axis]) * ray_direction_inv[axis];
+                    float t1 = (aabb_max[axis] - ray_origin[axis]) * ray_direction_inv[axis];
+                    if (ray_direction_inv[axis] < 0) {
+                        std::swap(t0, t1);
+                    }
+                    tmin = t0 > tmin ? t0 : tmin;
+                    tmax = t1 < tmax ? t1 : tmax;
+                }
+                if (tmin > tmax || tmax < 0.001) {
+                    node_index = node.miss_node_index;
+                    continue;
+                }
+            }
+            node_index = node.hit_node_index == THREADED_BVH_TERMINAL_NODE ? node.miss_node_index : node.hit_node_index;
+        }
     }
-    _root->collect_leaves(leaves);
+    return np_num_steps;
 }
 }
\ No newline at end of file
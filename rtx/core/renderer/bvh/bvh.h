@@ -5,53 +5,41 @@
 #include "../../geometry/standard.h"
 #include "../../header/array.h"
 #include "../../header/glm.h"
+#include "../../header/struct.h"
 #include <memory>
+#include <pybind11/numpy.h>
 #include <vector>
 
 namespace rtx {
 namespace bvh {
-    class Node {
-    public:
-        bool _is_leaf;
-        unsigned int _index;
-        std::vector<int> _assigned_face_indices;
-        glm::vec3f _aabb_min;
-        glm::vec3f _aabb_max;
-        int _assigned_face_index_start;
-        int _assigned_face_index_end;
-        Node(std::vector<int> assigned_face_indices,
-            std::shared_ptr<StandardGeometry>& geometry,
-            int& current_node_index,
-            int& current_assigned_face_index_offset);
-        Node(std::vector<int> assigned_face_indices,
-            std::shared_ptr<SphereGeometry>& geometry);
-        Node(std::vector<int> assigned_face_indices,
-            std::shared_ptr<CylinderGeometry>& geometry);
-        Node(std::vector<int> assigned_face_indices,
-            std::shared_ptr<ConeGeometry>& geometry);
-        std::shared_ptr<Node> _left;
-        std::shared_ptr<Node> _right;
-        std::shared_ptr<Node> _miss;
-        std::shared_ptr<Node> _hit;
-        int num_children();
-        void set_hit_and_miss_links();
-        void collect_children(std::vector<std::shared_ptr<Node>>& children);
-        void collect_leaves(std::vector<std::shared_ptr<bvh::Node>>& leaves);
+    // 分割の評価に使う各面のAABBと重心
+    struct Primitive {
+        glm::vec3f aabb_min;
+        glm::vec3f aabb_max;
+        glm::vec3f centroid;
     };
 }
+// ノードは行きがけ順にThreaded BVHの形式で_node_arrayへ直接書き込まれる
+// 再構築しても配列の領域は再利用される
 class BVH {
 private:
-    int _current_node_index;
-    int _current_assigned_face_index_offset;
-    int _num_nodes;
     std::weak_ptr<Geometry> _geometry;
+    // Threaded BVHのノード
+    std::vector<rtxThreadedBVHNode> _node_array;
+    // 葉ノードの順に並んだ面のインデックス
+    std::vector<int> _face_indices;
+    std::vector<bvh::Primitive> _primitive_array;
+    void build_node(int begin, int end, int max_triangles_per_node);
+    void build_leaf();
 
 public:
+    BVH();
     BVH(std::shared_ptr<Geometry>& geometry);
-    std::shared_ptr<bvh::Node> _root;
+    void build(std::shared_ptr<Geometry>& geometry);
     int num_nodes();
     void serialize_nodes(rtx::array<rtxThreadedBVHNode>& node_array, int serialization_offset);
     void serialize_faces(rtx::array<rtxFaceVertexIndex>& buffer, int serialization_offset);
-    void collect_leaves(std::vector<std::shared_ptr<bvh::Node>>& leaves);
+    pybind11::array_t<int> count_traversal_steps(pybind11::array_t<float, pybind11::array::c_style> ray_origins,
+        pybind11::array_t<float, pybind11::array::c_style> ray_directions);
 };
-}
\ No newline at end of file
+}
@@ -64,4 +64,64 @@ rtx_define_cuda_mcrt_kernel_launcher_function(global_memory)
 
 rtx_define_cuda_nee_kernel_launcher_function(texture_memory)
 rtx_define_cuda_nee_kernel_launcher_function(shared_memory)
-rtx_define_cuda_nee_kernel_launcher_function(global_memory)
\ No newline at end of file
+rtx_define_cuda_nee_kernel_launcher_function(global_memory)
+
+// 各画素を担当するスレッドの結果を足し合わせてaccumulation_arrayに蓄積し、
+// total_frames枚の平均をRGBでoutput_arrayに書き込む
+// total_frames == 1のとき蓄積をやり直す
+void rtx_cuda_accumulate_render_array(
+    rtxRGBAPixel* gpu_render_array,
+    rtxRGBAPixel* gpu_accumulation_array,
+    float* gpu_output_array,
+    int num_pixels,
+    int num_threads_per_pixel,
+    int num_rays_per_pixel,
+    int total_frames);
+// 線形の値をガンマ補正して0-255に切り捨てる
+void rtx_cuda_encode_srgb(float* gpu_linear_array, unsigned char* gpu_srgb_array, int size);
+
+// CPU
+typedef struct rtxCPUTexture {
+    rtxRGBAPixel* data;
+    int width;
+    int height;
+} rtxCPUTexture;
+
+void rtx_cpu_launch_mcrt_kernel(
+    rtxFaceVertexIndex* cpu_face_vertex_index_array,
+    rtxVertex* cpu_vertex_array,
+    rtxObject* cpu_object_array,
+    rtxMaterialAttributeByte* cpu_material_attribute_byte_array,
+    rtxThreadedBVH* cpu_threaded_bvh_array,
+    rtxThreadedBVHNode* cpu_threaded_bvh_node_array,
+    rtxRGBAColor* cpu_color_mapping_array,
+    rtxUVCoordinate* cpu_serialized_uv_coordinate_array,
+    rtxCPUTexture* cpu_texture_array,
+    rtxRGBAPixel* cpu_render_array,
+    rtxMCRTKernelArguments& args);
+
+void rtx_cpu_launch_nee_kernel(
+    rtxFaceVertexIndex* cpu_face_vertex_index_array,
+    rtxVertex* cpu_vertex_array,
+    rtxObject* cpu_object_array,
+    rtxMaterialAttributeByte* cpu_material_attribute_byte_array,
+    rtxThreadedBVH* cpu_threaded_bvh_array,
+    rtxThreadedBVHNode* cpu_threaded_bvh_node_array,
+    rtxRGBAColor* cpu_color_mapping_array,
+    rtxUVCoordinate* cpu_serialized_uv_coordinate_array,
+    int* cpu_light_sampling_table,
+    rtxCPUTexture* cpu_texture_array,
+    rtxRGBAPixel* cpu_render_array,
+    rtxNEEKernelArguments& args);
+
+void rtx_cpu_accumulate_render_array(
+    rtxRGBAPixel* cpu_render_array,
+    rtxRGBAPixel* cpu_accumulation_array,
+    float* output_array,
+    int num_pixels,
+    int num_threads_per_pixel,
+    int num_rays_per_pixel,
+    int total_frames);
+void rtx_cpu_encode_srgb(float* linear_array, unsigned char* srgb_array, int size);
+// cv2.bilateralFilterと同じ重みで(height, width, 3)の画像を平滑化する
+void rtx_cpu_bilateral_filter(unsigned char* source_array, unsigned char* destination_array, int height, int width);
@@ -0,0 +1,104 @@
+#pragma once
+#include "../../header/struct.h"
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <random>
+
+// cuda_functions.hのマクロをCPUでそのまま使うためにCUDAの型と関数を置き換える
+namespace rtx {
+namespace cpu {
+using std::max;
+using std::min;
+
+typedef struct float2 {
+    float x;
+    float y;
+} float2;
+
+typedef struct float3 {
+    float x;
+    float y;
+    float z;
+} float3;
+
+typedef struct float4 {
+    float x;
+    float y;
+    float z;
+    float w;
+} float4;
+
+typedef struct rtxCPURay {
+    float4 direction;
+    float4 origin;
+} rtxCPURay;
+
+// curandの代わり
+// 画素とスレッド番号から初期化するのでOpenMPのスレッド数によらず同じ結果になる
+class RandomState {
+public:
+    std::mt19937 engine;
+    std::normal_distribution<float> normal;
+    std::uniform_real_distribution<float> uniform;
+    RandomState(int seed, int sequence)
+    {
+        // splitmix64
+        uint64_t z = ((uint64_t)(uint32_t)seed << 32 | (uint32_t)sequence) + 0x9E3779B97F4A7C15ULL;
+        z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+        z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+        z = z ^ (z >> 31);
+        engine.seed((uint32_t)(z ^ (z >> 32)));
+    }
+};
+inline float4 curand_normal4(RandomState* state)
+{
+    float4 ret;
+    ret.x = state->normal(state->engine);
+    ret.y = state->normal(state->engine);
+    ret.z = state->normal(state->engine);
+    ret.w = state->normal(state->engine);
+    return ret;
+}
+inline float4 curand_uniform4(RandomState* state)
+{
+    float4 ret;
+    ret.x = state->uniform(state->engine);
+    ret.y = state->uniform(state->engine);
+    ret.z = state->uniform(state->engine);
+    ret.w = state->uniform(state->engine);
+    return ret;
+}
+
+// cudaFilterModeLinear, cudaAddressModeWrap, 正規化座標のテクスチャと同じサンプリング
+inline float4 texel(const rtxCPUTexture& texture, int x, int y)
+{
+    x = ((x % texture.width) + texture.width) % texture.width;
+    y = ((y % texture.height) + texture.height) % texture.height;
+    rtxRGBAPixel pixel = texture.data[y * texture.width + x];
+    return { pixel.r, pixel.g, pixel.b, pixel.a };
+}
+template <typename T>
+T tex2D(const rtxCPUTexture& texture, float u, float v);
+template <>
+inline float4 tex2D<float4>(const rtxCPUTexture& texture, float u, float v)
+{
+    const float x = u * texture.width - 0.5f;
+    const float y = v * texture.height - 0.5f;
+    const int x0 = int(floorf(x));
+    const int y0 = int(floorf(y));
+    const float alpha = x - x0;
+    const float beta = y - y0;
+    const float4 t00 = texel(texture, x0, y0);
+    const float4 t10 = texel(texture, x0 + 1, y0);
+    const float4 t01 = texel(texture, x0, y0 + 1);
+    const float4 t11 = texel(texture, x0 + 1, y0 + 1);
+    float4 ret;
+    ret.x = (1.0f - alpha) * (1.0f - beta) * t00.x + alpha * (1.0f - beta) * t10.x + (1.0f - alpha) * beta * t01.x + alpha * beta * t11.x;
+    ret.y = (1.0f - alpha) * (1.0f - beta) * t00.y + alpha * (1.0f - beta) * t10.y + (1.0f - alpha) * beta * t01.y + alpha * beta * t11.y;
+    ret.z = (1.0f - alpha) * (1.0f - beta) * t00.z + alpha * (1.0f - beta) * t10.z + (1.0f - alpha) * beta * t01.z + alpha * beta * t11.z;
+    ret.w = (1.0f - alpha) * (1.0f - beta) * t00.w + alpha * (1.0f - beta) * t10.w + (1.0f - alpha) * beta * t01.w + alpha * beta * t11.w;
+    return ret;
+}
+}
+}
@@ -0,0 +1,210 @@
+#pragma once
+#include "../../header/enum.h"
+#include "../../header/struct.h"
+#include "bridge.h"
+#include "cpu_common.h"
+#include "cuda_functions.h"
+#include <float.h>
+
+namespace rtx {
+namespace cpu {
+
+// GPUのカーネルと同じ順序で全オブジェクトのBVHを遷移し、最も近い衝突点を求める
+inline bool intersect_objects(
+    const rtxCPURay& ray,
+    const rtxFaceVertexIndex* serialized_face_vertex_indices_array,
+    const rtxVertex* serialized_vertex_array,
+    const rtxObject* serialized_object_array, int object_array_size,
+    const rtxThreadedBVH* serialized_threaded_bvh_array,
+    const rtxThreadedBVHNode* serialized_threaded_bvh_node_array,
+    float3& hit_point,
+    float3& unit_hit_face_normal,
+    rtxVertex& hit_va,
+    rtxVertex& hit_vb,
+    rtxVertex& hit_vc,
+    rtxFaceVertexIndex& hit_face,
+    rtxObject& hit_object)
+{
+    float min_distance = FLT_MAX;
+    bool did_hit_object = false;
+
+    // BVHのAABBとの衝突判定で使う
+    float3 ray_direction_inv = {
+        1.0f / ray.direction.x,
+        1.0f / ray.direction.y,
+        1.0f / ray.direction.z,
+    };
+
+    // シーン上の全オブジェクトについて
+    for (int object_index = 0; object_index < object_array_size; object_index++) {
+        const rtxObject object = serialized_object_array[object_index];
+
+        // 各ジオメトリのThreaded BVH
+        const rtxThreadedBVH bvh = serialized_threaded_bvh_array[object_index];
+
+        // BVHの各ノードを遷移していく
+        int bvh_current_node_index = 0;
+        for (int traversal = 0; traversal < bvh.num_nodes; traversal++) {
+            if (bvh_current_node_index == THREADED_BVH_TERMINAL_NODE) {
+                // 終端ノードならこのオブジェクトにはヒットしていない
+                break;
+            }
+            int serialized_node_index = bvh.serial_node_index_offset + bvh_current_node_index;
+            const rtxThreadedBVHNode node = serialized_threaded_bvh_node_array[serialized_node_index];
+
+            bool is_inner_node = node.assigned_face_index_start == -1;
+            if (is_inner_node) {
+                // 中間ノードの場合AABBとの衝突判定を行う
+                __rtx_bvh_traversal_one_step_or_continue(ray, node, ray_direction_inv, bvh_current_node_index);
+            } else {
+                // 葉ノード
+                // 割り当てられたジオメトリの各面との衝突判定を行う
+                int num_assigned_faces = node.assigned_face_index_end - node.assigned_face_index_start + 1;
+                if (object.geometry_type == RTXGeometryTypeStandard) {
+
+                    for (int m = 0; m < num_assigned_faces; m++) {
+                        int serialized_face_index = node.assigned_face_index_start + m + object.serialized_face_index_offset;
+                        const rtxFaceVertexIndex face = serialized_face_vertex_indices_array[serialized_face_index];
+
+                        const rtxVertex va = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                        const rtxVertex vb = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+                        const rtxVertex vc = serialized_vertex_array[face.c + object.serialized_vertex_index_offset];
+
+                        float3 face_normal;
+                        float distance;
+                        __rtx_intersect_triangle_or_continue(ray, va, vb, vc, face_normal, distance, min_distance);
+
+                        min_distance = distance;
+                        hit_point.x = ray.origin.x + distance * ray.direction.x;
+                        hit_point.y = ray.origin.y + distance * ray.direction.y;
+                        hit_point.z = ray.origin.z + distance * ray.direction.z;
+
+                        unit_hit_face_normal = face_normal;
+
+                        hit_va = va;
+                        hit_vb = vb;
+                        hit_vc = vc;
+                        hit_face = face;
+
+                        did_hit_object = true;
+                        hit_object = object;
+                    }
+                } else if (object.geometry_type == RTXGeometryTypeSphere) {
+                    int serialized_array_index = node.assigned_face_index_start + object.serialized_face_index_offset;
+                    const rtxFaceVertexIndex face = serialized_face_vertex_indices_array[serialized_array_index];
+
+                    const rtxVertex center = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const rtxVertex radius = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+
+                    float distance;
+                    __rtx_intersect_sphere_or_continue(ray, center, radius, distance, min_distance);
+
+                    min_distance = distance;
+                    hit_point.x = ray.origin.x + distance * ray.direction.x;
+                    hit_point.y = ray.origin.y + distance * ray.direction.y;
+                    hit_point.z = ray.origin.z + distance * ray.direction.z;
+
+                    const float3 normal = {
+                        hit_point.x - center.x,
+                        hit_point.y - center.y,
+                        hit_point.z - center.z,
+                    };
+                    const float norm = sqrtf(normal.x * normal.x + normal.y * normal.y + normal.z * normal.z);
+
+                    unit_hit_face_normal.x = normal.x / norm;
+                    unit_hit_face_normal.y = normal.y / norm;
+                    unit_hit_face_normal.z = normal.z / norm;
+
+                    did_hit_object = true;
+                    hit_object = object;
+                } else if (object.geometry_type == RTXGeometryTypeCylinder) {
+                    rtxFaceVertexIndex face;
+                    int offset = node.assigned_face_index_start + object.serialized_face_index_offset;
+
+                    // Load cylinder parameters
+                    face = serialized_face_vertex_indices_array[offset + 0];
+                    const rtxVertex params = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const float radius = params.x;
+                    const float y_max = params.y;
+                    const float y_min = params.z;
+
+                    // Load transformation matrix
+                    face = serialized_face_vertex_indices_array[offset + 1];
+                    const rtxVertex trans_a = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const rtxVertex trans_b = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+                    const rtxVertex trans_c = serialized_vertex_array[face.c + object.serialized_vertex_index_offset];
+
+                    // Load inverse transformation matrix
+                    face = serialized_face_vertex_indices_array[offset + 2];
+                    const rtxVertex inv_trans_a = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const rtxVertex inv_trans_b = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+                    const rtxVertex inv_trans_c = serialized_vertex_array[face.c + object.serialized_vertex_index_offset];
+
+                    float distance;
+                    __rtx_intersect_cylinder_or_continue(
+                        ray,
+                        trans_a, trans_b, trans_c,
+                        inv_trans_a, inv_trans_b, inv_trans_c,
+                        unit_hit_face_normal,
+                        distance,
+                        min_distance);
+                    min_distance = distance;
+
+                    hit_point.x = ray.origin.x + distance * ray.direction.x;
+                    hit_point.y = ray.origin.y + distance * ray.direction.y;
+                    hit_point.z = ray.origin.z + distance * ray.direction.z;
+
+                    did_hit_object = true;
+                    hit_object = object;
+                } else if (object.geometry_type == RTXGeometryTypeCone) {
+                    rtxFaceVertexIndex face;
+                    int offset = node.assigned_face_index_start + object.serialized_face_index_offset;
+
+                    // Load cone parameters
+                    face = serialized_face_vertex_indices_array[offset + 0];
+                    const rtxVertex params = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const float radius = params.x;
+                    const float height = params.y;
+
+                    // Load transformation matrix
+                    face = serialized_face_vertex_indices_array[offset + 1];
+                    const rtxVertex trans_a = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const rtxVertex trans_b = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+                    const rtxVertex trans_c = serialized_vertex_array[face.c + object.serialized_vertex_index_offset];
+
+                    // Load inverse transformation matrix
+                    face = serialized_face_vertex_indices_array[offset + 2];
+                    const rtxVertex inv_trans_a = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const rtxVertex inv_trans_b = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+                    const rtxVertex inv_trans_c = serialized_vertex_array[face.c + object.serialized_vertex_index_offset];
+
+                    float distance;
+                    __rtx_intersect_cone_or_continue(
+                        ray,
+                        trans_a, trans_b, trans_c,
+                        inv_trans_a, inv_trans_b, inv_trans_c,
+                        unit_hit_face_normal,
+                        distance,
+                        min_distance);
+                    min_distance = distance;
+
+                    hit_point.x = ray.origin.x + distance * ray.direction.x;
+                    hit_point.y = ray.origin.y + distance * ray.direction.y;
+                    hit_point.z = ray.origin.z + distance * ray.direction.z;
+
+                    did_hit_object = true;
+                    hit_object = object;
+                }
+            }
+
+            if (node.hit_node_index == THREADED_BVH_TERMINAL_NODE) {
+                bvh_current_node_index = node.miss_node_index;
+            } else {
+                bvh_current_node_index = node.hit_node_index;
+            }
+        }
+    }
+    return did_hit_object;
+}
+}
+}
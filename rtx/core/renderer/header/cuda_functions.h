@@ -583,6 +583,23 @@
         ray.direction.x = 0.0f;                                                                                    \
         ray.direction.y = 0.0f;                                                                                    \
         ray.direction.z = -1.0f;                                                                                   \
+    }                                                                                                              \
+    /* カメラ座標系からシーンの座標系へ */                                                                \
+    {                                                                                                              \
+        float4 camera_origin = ray.origin;                                                                         \
+        float4 camera_direction = ray.direction;                                                                   \
+        ray.origin.x = args.ray_transform[0].x * camera_origin.x + args.ray_transform[0].y * camera_origin.y       \
+            + args.ray_transform[0].z * camera_origin.z + args.ray_transform[0].w;                                 \
+        ray.origin.y = args.ray_transform[1].x * camera_origin.x + args.ray_transform[1].y * camera_origin.y       \
+            + args.ray_transform[1].z * camera_origin.z + args.ray_transform[1].w;                                 \
+        ray.origin.z = args.ray_transform[2].x * camera_origin.x + args.ray_transform[2].y * camera_origin.y       \
+            + args.ray_transform[2].z * camera_origin.z + args.ray_transform[2].w;                                 \
+        ray.direction.x = args.ray_transform[0].x * camera_direction.x + args.ray_transform[0].y * camera_direction.y \
+            + args.ray_transform[0].z * camera_direction.z;                                                        \
+        ray.direction.y = args.ray_transform[1].x * camera_direction.x + args.ray_transform[1].y * camera_direction.y \
+            + args.ray_transform[1].z * camera_direction.z;                                                        \
+        ray.direction.z = args.ray_transform[2].x * camera_direction.x + args.ray_transform[2].y * camera_direction.y \
+            + args.ray_transform[2].z * camera_direction.z;                                                        \
     }
 
 #define __rtx_normalize_vector(vec)                                        \
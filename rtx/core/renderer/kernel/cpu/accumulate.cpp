@@ -0,0 +1,34 @@
+#include "../../header/bridge.h"
+
+// rtx_cuda_accumulate_render_arrayのCPU版
+void rtx_cpu_accumulate_render_array(
+    rtxRGBAPixel* cpu_render_array,
+    rtxRGBAPixel* cpu_accumulation_array,
+    float* output_array,
+    int num_pixels,
+    int num_threads_per_pixel,
+    int num_rays_per_pixel,
+    int total_frames)
+{
+#pragma omp parallel for schedule(static)
+    for (int pixel_index = 0; pixel_index < num_pixels; pixel_index++) {
+        rtxRGBAPixel sum = { 0.0f, 0.0f, 0.0f, 0.0f };
+        for (int m = 0; m < num_threads_per_pixel; m++) {
+            rtxRGBAPixel pixel = cpu_render_array[pixel_index * num_threads_per_pixel + m];
+            sum.r += pixel.r;
+            sum.g += pixel.g;
+            sum.b += pixel.b;
+        }
+        rtxRGBAPixel accumulation = { 0.0f, 0.0f, 0.0f, 0.0f };
+        if (total_frames > 1) {
+            accumulation = cpu_accumulation_array[pixel_index];
+        }
+        accumulation.r += sum.r / float(num_rays_per_pixel);
+        accumulation.g += sum.g / float(num_rays_per_pixel);
+        accumulation.b += sum.b / float(num_rays_per_pixel);
+        cpu_accumulation_array[pixel_index] = accumulation;
+        output_array[pixel_index * 3 + 0] = accumulation.r / float(total_frames);
+        output_array[pixel_index * 3 + 1] = accumulation.g / float(total_frames);
+        output_array[pixel_index * 3 + 2] = accumulation.b / float(total_frames);
+    }
+}
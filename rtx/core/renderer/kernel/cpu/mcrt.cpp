@@ -0,0 +1,188 @@
+#include "../../../header/enum.h"
+#include "../../../header/struct.h"
+#include "../../header/bridge.h"
+#include "../../header/cpu_functions.h"
+#include <assert.h>
+
+namespace rtx {
+namespace cpu {
+// GPUの1スレッドが担当するレイをまとめて追跡する
+static rtxRGBAPixel mcrt_trace_rays(
+    int render_buffer_index,
+    rtxFaceVertexIndex* serialized_face_vertex_indices_array,
+    rtxVertex* serialized_vertex_array,
+    rtxObject* serialized_object_array,
+    rtxMaterialAttributeByte* serialized_material_attribute_byte_array,
+    rtxThreadedBVH* serialized_threaded_bvh_array,
+    rtxThreadedBVHNode* serialized_threaded_bvh_node_array,
+    rtxRGBAColor* serialized_color_mapping_array,
+    rtxUVCoordinate* serialized_uv_coordinate_array,
+    rtxCPUTexture* texture_array,
+    rtxMCRTKernelArguments& args)
+{
+    RandomState curand_state(args.curand_seed, render_buffer_index);
+    __xorshift_init(args.curand_seed);
+
+    int num_threads_per_pixel = int(ceilf(float(args.num_rays_per_pixel) / float(args.num_rays_per_thread)));
+    int target_pixel_index = render_buffer_index / num_threads_per_pixel;
+    if (args.active_pixel_index_array != NULL) {
+        target_pixel_index = args.active_pixel_index_array[target_pixel_index];
+    }
+    int target_pixel_x = target_pixel_index % args.screen_width;
+    int target_pixel_y = target_pixel_index / args.screen_width;
+    float aspect_ratio = float(args.screen_width) / float(args.screen_height);
+    int ray_index_offset = (render_buffer_index % num_threads_per_pixel) * args.num_rays_per_thread;
+
+    // 出力する画素
+    rtxRGBAPixel pixel = { 0.0f, 0.0f, 0.0f, 0.0f };
+
+    for (int n = 0; n < args.num_rays_per_thread; n++) {
+        if (ray_index_offset + n >= args.num_rays_per_pixel) {
+            break;
+        }
+        // レイの生成
+        rtxCPURay ray;
+        __rtx_generate_ray(ray, args, aspect_ratio);
+
+        float3 hit_point;
+        float3 unit_hit_face_normal;
+        rtxVertex hit_va;
+        rtxVertex hit_vb;
+        rtxVertex hit_vc;
+        rtxFaceVertexIndex hit_face;
+        rtxObject hit_object;
+
+        // 光輸送経路のウェイト
+        rtxRGBAColor path_weight = { 1.0f, 1.0f, 1.0f };
+
+        for (int bounce = 0; bounce < args.max_bounce; bounce++) {
+            bool did_hit_object = intersect_objects(
+                ray,
+                serialized_face_vertex_indices_array,
+                serialized_vertex_array,
+                serialized_object_array, args.object_array_size,
+                serialized_threaded_bvh_array,
+                serialized_threaded_bvh_node_array,
+                hit_point,
+                unit_hit_face_normal,
+                hit_va, hit_vb, hit_vc,
+                hit_face,
+                hit_object);
+
+            if (did_hit_object == false) {
+                if (bounce == 0) {
+                    pixel.r += args.ambient_color.r;
+                    pixel.g += args.ambient_color.g;
+                    pixel.b += args.ambient_color.b;
+                }
+                break;
+            }
+
+            //  衝突点の色を検出
+            rtxRGBAColor hit_color = { 0.0f, 0.0f, 0.0f, 0.0f };
+            __rtx_fetch_color_in_linear_memory(
+                hit_point,
+                hit_object,
+                hit_face,
+                hit_color,
+                serialized_material_attribute_byte_array,
+                serialized_color_mapping_array,
+                texture_array,
+                serialized_uv_coordinate_array);
+
+            int material_type = hit_object.layerd_material_types.outside;
+            bool did_hit_light = material_type == RTXMaterialTypeEmissive;
+
+            // 光源に当たった場合トレースを打ち切り
+            if (did_hit_light) {
+                rtxEmissiveMaterialAttribute attr = ((rtxEmissiveMaterialAttribute*)&serialized_material_attribute_byte_array[hit_object.material_attribute_byte_array_offset])[0];
+                if (bounce == 0 && attr.visible == false) {
+                    pixel.r += args.ambient_color.r;
+                    pixel.g += args.ambient_color.g;
+                    pixel.b += args.ambient_color.b;
+                } else {
+                    pixel.r += hit_color.r * path_weight.r * attr.intensity;
+                    pixel.g += hit_color.g * path_weight.g * attr.intensity;
+                    pixel.b += hit_color.b * path_weight.b * attr.intensity;
+                }
+                break;
+            }
+
+            // 反射方向のサンプリング
+            float3 unit_next_path_direction;
+            float cosine_term;
+            __rtx_sample_ray_direction(
+                unit_hit_face_normal,
+                unit_next_path_direction,
+                cosine_term,
+                curand_state);
+
+            float brdf = 0.0f;
+            __rtx_compute_brdf(
+                unit_hit_face_normal,
+                hit_object,
+                hit_face,
+                ray.direction,
+                unit_next_path_direction,
+                serialized_material_attribute_byte_array,
+                brdf);
+
+            ray.origin.x = hit_point.x;
+            ray.origin.y = hit_point.y;
+            ray.origin.z = hit_point.z;
+            ray.direction.x = unit_next_path_direction.x;
+            ray.direction.y = unit_next_path_direction.y;
+            ray.direction.z = unit_next_path_direction.z;
+
+            // 経路のウェイトを更新
+            float inv_pdf = 2.0f * M_PI;
+            path_weight.r *= hit_color.r * brdf * cosine_term * inv_pdf;
+            path_weight.g *= hit_color.g * brdf * cosine_term * inv_pdf;
+            path_weight.b *= hit_color.b * brdf * cosine_term * inv_pdf;
+        }
+    }
+    return pixel;
+}
+}
+}
+
+void rtx_cpu_launch_mcrt_kernel(
+    rtxFaceVertexIndex* cpu_serialized_face_vertex_index_array,
+    rtxVertex* cpu_serialized_vertex_array,
+    rtxObject* cpu_serialized_object_array,
+    rtxMaterialAttributeByte* cpu_serialized_material_attribute_byte_array,
+    rtxThreadedBVH* cpu_serialized_threaded_bvh_array,
+    rtxThreadedBVHNode* cpu_serialized_threaded_bvh_node_array,
+    rtxRGBAColor* cpu_serialized_color_mapping_array,
+    rtxUVCoordinate* cpu_serialized_uv_coordinate_array,
+    rtxCPUTexture* cpu_texture_array,
+    rtxRGBAPixel* cpu_serialized_render_array,
+    rtxMCRTKernelArguments& args)
+{
+    assert(cpu_serialized_face_vertex_index_array != NULL);
+    assert(cpu_serialized_vertex_array != NULL);
+    assert(cpu_serialized_object_array != NULL);
+    assert(cpu_serialized_threaded_bvh_array != NULL);
+    assert(cpu_serialized_threaded_bvh_node_array != NULL);
+    assert(cpu_serialized_render_array != NULL);
+
+    // GPUのスレッドと同じ単位で分割し、各画素をOpenMPで並列に処理する
+    int num_threads_per_pixel = int(ceilf(float(args.num_rays_per_pixel) / float(args.num_rays_per_thread)));
+    int render_array_size = args.num_active_pixels * num_threads_per_pixel;
+
+#pragma omp parallel for schedule(dynamic, 16)
+    for (int render_buffer_index = 0; render_buffer_index < render_array_size; render_buffer_index++) {
+        cpu_serialized_render_array[render_buffer_index] = rtx::cpu::mcrt_trace_rays(
+            render_buffer_index,
+            cpu_serialized_face_vertex_index_array,
+            cpu_serialized_vertex_array,
+            cpu_serialized_object_array,
+            cpu_serialized_material_attribute_byte_array,
+            cpu_serialized_threaded_bvh_array,
+            cpu_serialized_threaded_bvh_node_array,
+            cpu_serialized_color_mapping_array,
+            cpu_serialized_uv_coordinate_array,
+            cpu_texture_array,
+            args);
+    }
+}
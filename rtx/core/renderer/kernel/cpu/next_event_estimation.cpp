@@ -0,0 +1,305 @@
+#include "../../../header/enum.h"
+#include "../../../header/struct.h"
+#include "../../header/bridge.h"
+#include "../../header/cpu_functions.h"
+#include <assert.h>
+
+namespace rtx {
+namespace cpu {
+// GPUの1スレッドが担当するレイをまとめて追跡する
+static rtxRGBAPixel nee_trace_rays(
+    int render_buffer_index,
+    rtxFaceVertexIndex* serialized_face_vertex_indices_array,
+    rtxVertex* serialized_vertex_array,
+    rtxObject* serialized_object_array,
+    rtxMaterialAttributeByte* serialized_material_attribute_byte_array,
+    rtxThreadedBVH* serialized_threaded_bvh_array,
+    rtxThreadedBVHNode* serialized_threaded_bvh_node_array,
+    rtxRGBAColor* serialized_color_mapping_array,
+    rtxUVCoordinate* serialized_uv_coordinate_array,
+    int* light_sampling_table,
+    rtxCPUTexture* texture_array,
+    rtxNEEKernelArguments& args)
+{
+    RandomState curand_state(args.curand_seed, render_buffer_index);
+    __xorshift_init(args.curand_seed);
+
+    int num_threads_per_pixel = int(ceilf(float(args.num_rays_per_pixel) / float(args.num_rays_per_thread)));
+    int target_pixel_index = render_buffer_index / num_threads_per_pixel;
+    if (args.active_pixel_index_array != NULL) {
+        target_pixel_index = args.active_pixel_index_array[target_pixel_index];
+    }
+    int target_pixel_x = target_pixel_index % args.screen_width;
+    int target_pixel_y = target_pixel_index / args.screen_width;
+    float aspect_ratio = float(args.screen_width) / float(args.screen_height);
+    int ray_index_offset = (render_buffer_index % num_threads_per_pixel) * args.num_rays_per_thread;
+
+    // 出力する画素
+    rtxRGBAPixel pixel = { 0.0f, 0.0f, 0.0f, 0.0f };
+
+    for (int n = 0; n < args.num_rays_per_thread; n++) {
+        if (ray_index_offset + n >= args.num_rays_per_pixel) {
+            break;
+        }
+
+        rtxCPURay* ray;
+        rtxCPURay shadow_ray;
+        rtxCPURay primary_ray;
+        float3 hit_point;
+        float3 unit_hit_face_normal;
+        rtxVertex hit_va;
+        rtxVertex hit_vb;
+        rtxVertex hit_vc;
+        rtxFaceVertexIndex hit_face;
+        rtxObject hit_object;
+        rtxRGBAColor hit_object_color = { 0.0f, 0.0f, 0.0f, 0.0f };
+        float g_term = 0.0f;
+        float shadow_ray_brdf = 0.0f;
+
+        // レイの生成
+        __rtx_generate_ray(primary_ray, args, aspect_ratio);
+
+        ray = &primary_ray;
+
+        // 光輸送経路のウェイト
+        rtxRGBAColor path_weight = { 1.0f, 1.0f, 1.0f };
+        rtxRGBAColor next_path_weight = { 0.0f, 0.0f, 0.0f, 0.0f };
+
+        // レイが当たるたびにシャドウレイを飛ばすので2倍ループが必要
+        int total_rays = args.max_bounce * 2;
+
+        for (int iter = 0; iter < total_rays; iter++) {
+            bool is_shadow_ray = (iter & 1) == 1; // iter % 2
+
+            bool did_hit_object = intersect_objects(
+                *ray,
+                serialized_face_vertex_indices_array,
+                serialized_vertex_array,
+                serialized_object_array, args.object_array_size,
+                serialized_threaded_bvh_array,
+                serialized_threaded_bvh_node_array,
+                hit_point,
+                unit_hit_face_normal,
+                hit_va, hit_vb, hit_vc,
+                hit_face,
+                hit_object);
+
+            if (did_hit_object == false) {
+                if (iter == 0) {
+                    pixel.r += args.ambient_color.r;
+                    pixel.g += args.ambient_color.g;
+                    pixel.b += args.ambient_color.b;
+                }
+                break;
+            }
+
+            if (is_shadow_ray) {
+                // 光源に当たった場合寄与を加算
+                rtxRGBAColor hit_light_color = { 0.0f, 0.0f, 0.0f, 0.0f };
+                int material_type = hit_object.layerd_material_types.outside;
+                if (material_type == RTXMaterialTypeEmissive) {
+                    __rtx_fetch_color_in_linear_memory(
+                        hit_point,
+                        hit_object,
+                        hit_face,
+                        hit_light_color,
+                        serialized_material_attribute_byte_array,
+                        serialized_color_mapping_array,
+                        texture_array,
+                        serialized_uv_coordinate_array);
+
+                    rtxEmissiveMaterialAttribute attr = ((rtxEmissiveMaterialAttribute*)&serialized_material_attribute_byte_array[hit_object.material_attribute_byte_array_offset])[0];
+                    float emission = attr.intensity;
+                    float inv_pdf = args.total_light_face_area;
+                    pixel.r += path_weight.r * emission * shadow_ray_brdf * hit_light_color.r * hit_object_color.r * inv_pdf * g_term;
+                    pixel.g += path_weight.g * emission * shadow_ray_brdf * hit_light_color.g * hit_object_color.g * inv_pdf * g_term;
+                    pixel.b += path_weight.b * emission * shadow_ray_brdf * hit_light_color.b * hit_object_color.b * inv_pdf * g_term;
+                }
+
+                path_weight.r = next_path_weight.r;
+                path_weight.g = next_path_weight.g;
+                path_weight.b = next_path_weight.b;
+
+                ray = &primary_ray;
+            } else {
+                int material_type = hit_object.layerd_material_types.outside;
+                bool did_hit_light = material_type == RTXMaterialTypeEmissive;
+
+                __rtx_fetch_color_in_linear_memory(
+                    hit_point,
+                    hit_object,
+                    hit_face,
+                    hit_object_color,
+                    serialized_material_attribute_byte_array,
+                    serialized_color_mapping_array,
+                    texture_array,
+                    serialized_uv_coordinate_array);
+
+                // 光源に当たった場合トレースを打ち切り
+                if (did_hit_light) {
+                    if (iter > 0) {
+                        break;
+                    }
+                    // 最初のパスで光源に当たった場合のみ寄与を加算
+                    rtxEmissiveMaterialAttribute attr = ((rtxEmissiveMaterialAttribute*)&serialized_material_attribute_byte_array[hit_object.material_attribute_byte_array_offset])[0];
+                    if (attr.visible) {
+                        pixel.r += hit_object_color.r * path_weight.r * attr.intensity;
+                        pixel.g += hit_object_color.g * path_weight.g * attr.intensity;
+                        pixel.b += hit_object_color.b * path_weight.b * attr.intensity;
+                    } else {
+                        pixel.r += args.ambient_color.r;
+                        pixel.g += args.ambient_color.g;
+                        pixel.b += args.ambient_color.b;
+                    }
+                    break;
+                }
+
+                // 反射方向のサンプリング
+                float3 unit_next_path_direction;
+                float cosine_term;
+                __rtx_sample_ray_direction(
+                    unit_hit_face_normal,
+                    unit_next_path_direction,
+                    cosine_term,
+                    curand_state);
+
+                float input_ray_brdf = 0.0f;
+                __rtx_compute_brdf(
+                    unit_hit_face_normal,
+                    hit_object,
+                    hit_face,
+                    ray->direction,
+                    unit_next_path_direction,
+                    serialized_material_attribute_byte_array,
+                    input_ray_brdf);
+
+                // 入射方向のサンプリング
+                ray->origin.x = hit_point.x;
+                ray->origin.y = hit_point.y;
+                ray->origin.z = hit_point.z;
+                ray->direction.x = unit_next_path_direction.x;
+                ray->direction.y = unit_next_path_direction.y;
+                ray->direction.z = unit_next_path_direction.z;
+
+                float inv_pdf = 2.0f * M_PI;
+                next_path_weight.r = path_weight.r * input_ray_brdf * hit_object_color.r * cosine_term * inv_pdf;
+                next_path_weight.g = path_weight.g * input_ray_brdf * hit_object_color.g * cosine_term * inv_pdf;
+                next_path_weight.b = path_weight.b * input_ray_brdf * hit_object_color.b * cosine_term * inv_pdf;
+
+                float4 random_uniform4 = curand_uniform4(&curand_state);
+
+                // 光源のサンプリング
+                const int table_index = min(int(floorf(random_uniform4.x * float(args.light_sampling_table_size))), args.light_sampling_table_size - 1);
+                const int object_index = light_sampling_table[table_index];
+                rtxObject object = serialized_object_array[object_index];
+
+                float light_distance = 0.0f;
+                float3 unit_light_normal = { 0.0f, 0.0f, 0.0f };
+                if (object.geometry_type == RTXGeometryTypeStandard) {
+                    const int face_index = min(int(floorf(random_uniform4.y * float(object.num_faces))), object.num_faces - 1);
+                    const int serialized_face_index = face_index + object.serialized_face_index_offset;
+                    const rtxFaceVertexIndex face = serialized_face_vertex_indices_array[serialized_face_index];
+                    const rtxVertex va = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const rtxVertex vb = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+                    const rtxVertex vc = serialized_vertex_array[face.c + object.serialized_vertex_index_offset];
+                    __rtx_nee_sample_point_in_triangle(random_uniform4, va, vb, vc, shadow_ray, light_distance, unit_light_normal);
+                } else if (object.geometry_type == RTXGeometryTypeSphere) {
+                    const int serialized_array_index = object.serialized_face_index_offset;
+                    const rtxFaceVertexIndex face = serialized_face_vertex_indices_array[serialized_array_index];
+                    const rtxVertex center = serialized_vertex_array[face.a + object.serialized_vertex_index_offset];
+                    const rtxVertex radius = serialized_vertex_array[face.b + object.serialized_vertex_index_offset];
+                    __rtx_nee_sample_point_in_sphere(curand_state, unit_light_normal, shadow_ray, light_distance);
+                }
+
+                const float dot_ray_face = shadow_ray.direction.x * unit_hit_face_normal.x
+                    + shadow_ray.direction.y * unit_hit_face_normal.y
+                    + shadow_ray.direction.z * unit_hit_face_normal.z;
+
+                if (dot_ray_face <= 0.0f) {
+                    ray = &primary_ray;
+                    iter += 1;
+                    path_weight.r = next_path_weight.r;
+                    path_weight.g = next_path_weight.g;
+                    path_weight.b = next_path_weight.b;
+                    continue;
+                }
+
+                shadow_ray.origin.x = hit_point.x;
+                shadow_ray.origin.y = hit_point.y;
+                shadow_ray.origin.z = hit_point.z;
+
+                shadow_ray_brdf = 0.0f;
+                __rtx_compute_brdf(
+                    unit_hit_face_normal,
+                    hit_object,
+                    hit_face,
+                    primary_ray.direction,
+                    shadow_ray.direction,
+                    serialized_material_attribute_byte_array,
+                    shadow_ray_brdf);
+
+                // 次のパス
+                primary_ray.origin.x = hit_point.x;
+                primary_ray.origin.y = hit_point.y;
+                primary_ray.origin.z = hit_point.z;
+                primary_ray.direction.x = unit_next_path_direction.x;
+                primary_ray.direction.y = unit_next_path_direction.y;
+                primary_ray.direction.z = unit_next_path_direction.z;
+
+                const float dot_ray_light = fabsf(shadow_ray.direction.x * unit_light_normal.x + shadow_ray.direction.y * unit_light_normal.y + shadow_ray.direction.z * unit_light_normal.z);
+
+                // ハック
+                const float r = max(light_distance, 0.5f);
+                g_term = dot_ray_face * dot_ray_light / (r * r);
+
+                ray = &shadow_ray;
+            }
+        }
+    }
+    return pixel;
+}
+}
+}
+
+void rtx_cpu_launch_nee_kernel(
+    rtxFaceVertexIndex* cpu_serialized_face_vertex_index_array,
+    rtxVertex* cpu_serialized_vertex_array,
+    rtxObject* cpu_serialized_object_array,
+    rtxMaterialAttributeByte* cpu_serialized_material_attribute_byte_array,
+    rtxThreadedBVH* cpu_serialized_threaded_bvh_array,
+    rtxThreadedBVHNode* cpu_serialized_threaded_bvh_node_array,
+    rtxRGBAColor* cpu_serialized_color_mapping_array,
+    rtxUVCoordinate* cpu_serialized_uv_coordinate_array,
+    int* cpu_light_sampling_table,
+    rtxCPUTexture* cpu_texture_array,
+    rtxRGBAPixel* cpu_serialized_render_array,
+    rtxNEEKernelArguments& args)
+{
+    assert(cpu_serialized_face_vertex_index_array != NULL);
+    assert(cpu_serialized_vertex_array != NULL);
+    assert(cpu_serialized_object_array != NULL);
+    assert(cpu_serialized_threaded_bvh_array != NULL);
+    assert(cpu_serialized_threaded_bvh_node_array != NULL);
+    assert(cpu_serialized_render_array != NULL);
+
+    // GPUのスレッドと同じ単位で分割し、各画素をOpenMPで並列に処理する
+    int num_threads_per_pixel = int(ceilf(float(args.num_rays_per_pixel) / float(args.num_rays_per_thread)));
+    int render_array_size = args.num_active_pixels * num_threads_per_pixel;
+
+#pragma omp parallel for schedule(dynamic, 16)
+    for (int render_buffer_index = 0; render_buffer_index < render_array_size; render_buffer_index++) {
+        cpu_serialized_render_array[render_buffer_index] = rtx::cpu::nee_trace_rays(
+            render_buffer_index,
+            cpu_serialized_face_vertex_index_array,
+            cpu_serialized_vertex_array,
+            cpu_serialized_object_array,
+            cpu_serialized_material_attribute_byte_array,
+            cpu_serialized_threaded_bvh_array,
+            cpu_serialized_threaded_bvh_node_array,
+            cpu_serialized_color_mapping_array,
+            cpu_serialized_uv_coordinate_array,
+            cpu_light_sampling_table,
+            cpu_texture_array,
+            args);
+    }
+}
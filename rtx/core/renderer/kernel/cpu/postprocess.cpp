@@ -0,0 +1,84 @@
+#include "../../../header/enum.h"
+#include "../../header/bridge.h"
+#include <cmath>
+#include <cstdlib>
+#include <vector>
+
+void rtx_cpu_encode_srgb(float* linear_array, unsigned char* srgb_array, int size)
+{
+#pragma omp parallel for schedule(static)
+    for (int index = 0; index < size; index++) {
+        float value = fminf(fmaxf(linear_array[index], 0.0f), 1.0f);
+        srgb_array[index] = (unsigned char)(powf(value, 1.0f / RTX_SRGB_GAMMA) * 255.0f);
+    }
+}
+
+// 境界はcv2.BORDER_REFLECT_101
+static inline int reflect_101(int index, int size)
+{
+    if (size == 1) {
+        return 0;
+    }
+    if (index < 0) {
+        return -index;
+    }
+    if (index >= size) {
+        return 2 * size - 2 - index;
+    }
+    return index;
+}
+
+void rtx_cpu_bilateral_filter(unsigned char* source_array, unsigned char* destination_array, int height, int width)
+{
+    int radius = RTX_DENOISE_DIAMETER / 2;
+    float gauss_color_coeff = -0.5f / (RTX_DENOISE_SIGMA_COLOR * RTX_DENOISE_SIGMA_COLOR);
+    float gauss_space_coeff = -0.5f / (RTX_DENOISE_SIGMA_SPACE * RTX_DENOISE_SIGMA_SPACE);
+
+    // 色の差はRGBの差の絶対値の和
+    std::vector<float> color_weights(256 * 3);
+    for (int diff = 0; diff < 256 * 3; diff++) {
+        color_weights[diff] = expf(diff * diff * gauss_color_coeff);
+    }
+    // cv2と同様に半径の円の内側だけを使う
+    std::vector<int> offset_y_array;
+    std::vector<int> offset_x_array;
+    std::vector<float> space_weights;
+    for (int offset_y = -radius; offset_y <= radius; offset_y++) {
+        for (int offset_x = -radius; offset_x <= radius; offset_x++) {
+            float distance = sqrtf(float(offset_y * offset_y + offset_x * offset_x));
+            if (distance > radius) {
+                continue;
+            }
+            offset_y_array.push_back(offset_y);
+            offset_x_array.push_back(offset_x);
+            space_weights.push_back(expf(distance * distance * gauss_space_coeff));
+        }
+    }
+    int num_neighbors = space_weights.size();
+
+#pragma omp parallel for schedule(static)
+    for (int y = 0; y < height; y++) {
+        for (int x = 0; x < width; x++) {
+            unsigned char* center = source_array + (y * width + x) * 3;
+            float sum_r = 0.0f;
+            float sum_g = 0.0f;
+            float sum_b = 0.0f;
+            float sum_weight = 0.0f;
+            for (int k = 0; k < num_neighbors; k++) {
+                int neighbor_y = reflect_101(y + offset_y_array[k], height);
+                int neighbor_x = reflect_101(x + offset_x_array[k], width);
+                unsigned char* neighbor = source_array + (neighbor_y * width + neighbor_x) * 3;
+                int diff = abs(neighbor[0] - center[0]) + abs(neighbor[1] - center[1]) + abs(neighbor[2] - center[2]);
+                float weight = space_weights[k] * color_weights[diff];
+                sum_r += neighbor[0] * weight;
+                sum_g += neighbor[1] * weight;
+                sum_b += neighbor[2] * weight;
+                sum_weight += weight;
+            }
+            unsigned char* destination = destination_array + (y * width + x) * 3;
+            destination[0] = (unsigned char)lrintf(sum_r / sum_weight);
+            destination[1] = (unsigned char)lrintf(sum_g / sum_weight);
+            destination[2] = (unsigned char)lrintf(sum_b / sum_weight);
+        }
+    }
+}
@@ -121,4 +121,73 @@ void rtx_print_device_properties(int device)
     printf("totalConstMem:	%zu\n", dev.totalConstMem);
     printf("regsPerBlock:	%d\n", dev.regsPerBlock);
     printf("warpSize:	%d\n", dev.warpSize);
-}
\ No newline at end of file
+}
+__global__ void accumulate_render_array_kernel(
+    rtxRGBAPixel* gpu_render_array,
+    rtxRGBAPixel* gpu_accumulation_array,
+    float* gpu_output_array,
+    int num_pixels,
+    int num_threads_per_pixel,
+    int num_rays_per_pixel,
+    int total_frames)
+{
+    int pixel_index = blockIdx.x * blockDim.x + threadIdx.x;
+    if (pixel_index >= num_pixels) {
+        return;
+    }
+    rtxRGBAPixel sum = { 0.0f, 0.0f, 0.0f, 0.0f };
+    for (int m = 0; m < num_threads_per_pixel; m++) {
+        rtxRGBAPixel pixel = gpu_render_array[pixel_index * num_threads_per_pixel + m];
+        sum.r += pixel.r;
+        sum.g += pixel.g;
+        sum.b += pixel.b;
+    }
+    rtxRGBAPixel accumulation = { 0.0f, 0.0f, 0.0f, 0.0f };
+    if (total_frames > 1) {
+        accumulation = gpu_accumulation_array[pixel_index];
+    }
+    accumulation.r += sum.r / float(num_rays_per_pixel);
+    accumulation.g += sum.g / float(num_rays_per_pixel);
+    accumulation.b += sum.b / float(num_rays_per_pixel);
+    gpu_accumulation_array[pixel_index] = accumulation;
+    gpu_output_array[pixel_index * 3 + 0] = accumulation.r / float(total_frames);
+    gpu_output_array[pixel_index * 3 + 1] = accumulation.g / float(total_frames);
+    gpu_output_array[pixel_index * 3 + 2] = accumulation.b / float(total_frames);
+}
+void rtx_cuda_accumulate_render_array(
+    rtxRGBAPixel* gpu_render_array,
+    rtxRGBAPixel* gpu_accumulation_array,
+    float* gpu_output_array,
+    int num_pixels,
+    int num_threads_per_pixel,
+    int num_rays_per_pixel,
+    int total_frames)
+{
+    int num_threads = 256;
+    int num_blocks = (num_pixels + num_threads - 1) / num_threads;
+    accumulate_render_array_kernel<<<num_blocks, num_threads>>>(
+        gpu_render_array,
+        gpu_accumulation_array,
+        gpu_output_array,
+        num_pixels,
+        num_threads_per_pixel,
+        num_rays_per_pixel,
+        total_frames);
+    cudaCheckError(cudaGetLastError());
+}
+__global__ void encode_srgb_kernel(float* gpu_linear_array, unsigned char* gpu_srgb_array, int size)
+{
+    int index = blockIdx.x * blockDim.x + threadIdx.x;
+    if (index >= size) {
+        return;
+    }
+    float value = fminf(fmaxf(gpu_linear_array[index], 0.0f), 1.0f);
+    gpu_srgb_array[index] = (unsigned char)(powf(value, 1.0f / RTX_SRGB_GAMMA) * 255.0f);
+}
+void rtx_cuda_encode_srgb(float* gpu_linear_array, unsigned char* gpu_srgb_array, int size)
+{
+    int num_threads = 256;
+    int num_blocks = (size + num_threads - 1) / num_threads;
+    encode_srgb_kernel<<<num_blocks, num_threads>>>(gpu_linear_array, gpu_srgb_array, size);
+    cudaCheckError(cudaGetLastError());
+}
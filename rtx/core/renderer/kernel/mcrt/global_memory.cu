@@ -72,9 +72,12 @@ __global__ void mcrt_global_memory_kernel(
     int num_generated_rays_per_pixel = args.num_rays_per_thread * int(ceilf(float(args.num_rays_per_pixel) / float(args.num_rays_per_thread)));
 
     int target_pixel_index = ray_index_offset / num_generated_rays_per_pixel;
-    if (target_pixel_index >= args.screen_width * args.screen_height) {
+    if (target_pixel_index >= args.num_active_pixels) {
         return;
     }
+    if (args.active_pixel_index_array != NULL) {
+        target_pixel_index = args.active_pixel_index_array[target_pixel_index];
+    }
     int target_pixel_x = target_pixel_index % args.screen_width;
     int target_pixel_y = target_pixel_index / args.screen_width;
     float aspect_ratio = float(args.screen_width) / float(args.screen_height);
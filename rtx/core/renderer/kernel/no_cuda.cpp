@@ -0,0 +1,142 @@
+#include "../header/bridge.h"
+#include <cstdio>
+#include <stdexcept>
+
+// Replaces kernel/cuda.cu when rtx is built without CUDA (make cpu).
+// Only Renderer(backend="cpu") can render in that build.
+
+static void rtx_cuda_unavailable()
+{
+    throw std::runtime_error("rtx was built without CUDA. Use rtx.Renderer(backend=\"cpu\")");
+}
+
+void rtx_cuda_malloc(void** gpu_array, size_t size)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_malloc_pointer(void**& gpu_array, size_t size)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_memcpy_host_to_device(void* gpu_array, void* cpu_array, size_t size)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_memcpy_device_to_host(void* cpu_array, void* gpu_array, size_t size)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_free(void** array_ref)
+{
+    // Nothing is ever allocated
+    *array_ref = NULL;
+}
+void rtx_cuda_device_reset()
+{
+}
+void rtx_cuda_malloc_texture_objects()
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_free_texture_objects()
+{
+}
+void rtx_cuda_malloc_texture(int unit_index, int width, int height)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_memcpy_to_texture(int unit_index, int width_offset, int height_offset, void* data, size_t bytes)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_bind_texture(int unit_index)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_transfer_all_texture_objects()
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_free_texture(int unit_index)
+{
+}
+size_t rtx_cuda_get_available_shared_memory_bytes()
+{
+    rtx_cuda_unavailable();
+    return 0;
+}
+size_t rtx_cuda_get_cudaTextureObject_t_bytes()
+{
+    return sizeof(unsigned long long);
+}
+int rtx_get_device_count()
+{
+    return 0;
+}
+void rtx_set_device(int device)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_print_device_properties(int device)
+{
+    printf("rtx was built without CUDA\n");
+}
+
+#define rtx_define_cuda_mcrt_kernel_launcher_stub(memory_type)      \
+    void rtx_cuda_launch_mcrt_##memory_type##_kernel(                \
+        rtxFaceVertexIndex* gpu_face_vertex_index_array,             \
+        rtxVertex* gpu_vertex_array,                                 \
+        rtxObject* gpu_object_array,                                 \
+        rtxMaterialAttributeByte* gpu_material_attribute_byte_array, \
+        rtxThreadedBVH* gpu_threaded_bvh_array,                      \
+        rtxThreadedBVHNode* gpu_threaded_bvh_node_array,             \
+        rtxRGBAColor* gpu_color_mapping_array,                       \
+        rtxUVCoordinate* gpu_serialized_uv_coordinate_array,         \
+        rtxRGBAPixel* gpu_render_array,                              \
+        rtxMCRTKernelArguments& args,                                \
+        int num_threads, int num_blocks, size_t shared_memory_bytes) \
+    {                                                                \
+        rtx_cuda_unavailable();                                      \
+    }
+
+rtx_define_cuda_mcrt_kernel_launcher_stub(texture_memory)
+rtx_define_cuda_mcrt_kernel_launcher_stub(shared_memory)
+rtx_define_cuda_mcrt_kernel_launcher_stub(global_memory)
+
+#define rtx_define_cuda_nee_kernel_launcher_stub(memory_type)       \
+    void rtx_cuda_launch_nee_##memory_type##_kernel(                 \
+        rtxFaceVertexIndex* gpu_face_vertex_index_array,             \
+        rtxVertex* gpu_vertex_array,                                 \
+        rtxObject* gpu_object_array,                                 \
+        rtxMaterialAttributeByte* gpu_material_attribute_byte_array, \
+        rtxThreadedBVH* gpu_threaded_bvh_array,                      \
+        rtxThreadedBVHNode* gpu_threaded_bvh_node_array,             \
+        rtxRGBAColor* gpu_color_mapping_array,                       \
+        rtxUVCoordinate* gpu_serialized_uv_coordinate_array,         \
+        int* gpu_light_sampling_table,                               \
+        rtxRGBAPixel* gpu_render_array,                              \
+        rtxNEEKernelArguments& args,                                 \
+        int num_threads, int num_blocks, size_t shared_memory_bytes) \
+    {                                                                \
+        rtx_cuda_unavailable();                                      \
+    }
+
+rtx_define_cuda_nee_kernel_launcher_stub(texture_memory)
+rtx_define_cuda_nee_kernel_launcher_stub(shared_memory)
+rtx_define_cuda_nee_kernel_launcher_stub(global_memory)
+
+void rtx_cuda_accumulate_render_array(
+    rtxRGBAPixel* gpu_render_array,
+    rtxRGBAPixel* gpu_accumulation_array,
+    float* gpu_output_array,
+    int num_pixels,
+    int num_threads_per_pixel,
+    int num_rays_per_pixel,
+    int total_frames)
+{
+    rtx_cuda_unavailable();
+}
+void rtx_cuda_encode_srgb(float* gpu_linear_array, unsigned char* gpu_srgb_array, int size)
+{
+    rtx_cuda_unavailable();
+}
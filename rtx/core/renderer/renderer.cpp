@@ -16,8 +16,46 @@ namespace rtx {
 
 namespace py = pybind11;
 
+// 容量が足りない場合だけ倍に拡張して確保し直す
+// Grow a device array by doubling its capacity; the contents are not kept
+static void reserve_device_array(void** gpu_array, size_t& capacity, size_t bytes)
+{
+    if (bytes == 0 || (*gpu_array != NULL && bytes <= capacity)) {
+        return;
+    }
+    size_t new_capacity = std::max(bytes, capacity * 2);
+    rtx_cuda_free(gpu_array);
+    rtx_cuda_malloc(gpu_array, new_capacity);
+    capacity = new_capacity;
+}
+// 同じseedとフレームからは常に同じ乱数列になる
+// seedが0のときはフレーム番号そのもの
+// seed_offsetはseedに足される（オーバーフローは2^32で折り返す）
+static int curand_seed(int seed, int seed_offset, int frame)
+{
+    return (int)((uint32_t)frame ^ (((uint32_t)seed + (uint32_t)seed_offset) * 0x9E3779B9u));
+}
+static void set_ray_transform(rtxVector4f (&rows)[3], const glm::mat4& matrix)
+{
+    // glm matrices are column major
+    for (int row = 0; row < 3; row++) {
+        rows[row] = { matrix[0][row], matrix[1][row], matrix[2][row], matrix[3][row] };
+    }
+}
+
 Renderer::Renderer()
+    : Renderer("cuda")
+{
+}
+Renderer::Renderer(std::string backend)
 {
+    if (backend == "cuda") {
+        _backend = RTXBackendCUDA;
+    } else if (backend == "cpu") {
+        _backend = RTXBackendCPU;
+    } else {
+        throw std::runtime_error("backend must be 'cuda' or 'cpu'");
+    }
     _gpu_face_vertex_indices_array = NULL;
     _gpu_vertex_array = NULL;
     _gpu_object_array = NULL;
@@ -28,8 +66,37 @@ Renderer::Renderer()
     _gpu_color_mapping_array = NULL;
     _gpu_serialized_uv_coordinate_array = NULL;
     _gpu_render_array = NULL;
+    _gpu_render_buffer_array = NULL;
+    _gpu_output_array = NULL;
+    _gpu_srgb_array = NULL;
+    _gpu_active_pixel_index_array = NULL;
+    _gpu_face_vertex_indices_array_capacity = 0;
+    _gpu_vertex_array_capacity = 0;
+    _gpu_object_array_capacity = 0;
+    _gpu_material_attribute_byte_array_capacity = 0;
+    _gpu_threaded_bvh_array_capacity = 0;
+    _gpu_threaded_bvh_node_array_capacity = 0;
+    _gpu_light_sampling_table_capacity = 0;
+    _gpu_color_mapping_array_capacity = 0;
+    _gpu_serialized_uv_coordinate_array_capacity = 0;
+    _gpu_active_pixel_index_array_capacity = 0;
     _total_frames = 0;
-    rtx_cuda_malloc_texture_objects();
+    _seed = 0;
+    _seed_offset = 0;
+    _render_array_size = 0;
+    _num_active_pixels = -1;
+    _accumulation_milliseconds = 0;
+    _screen_height = 0;
+    _screen_width = 0;
+    _ray_transform = glm::mat4(1.0f);
+    _objects_in_world_space = false;
+    _serialized_scene_version = -1;
+    _num_scene_rebuilds = 0;
+    _num_skipped_scene_rebuilds = 0;
+    _num_updated_objects = 0;
+    if (_backend == RTXBackendCUDA) {
+        rtx_cuda_malloc_texture_objects();
+    }
 }
 Renderer::~Renderer()
 {
@@ -42,10 +109,23 @@ Renderer::~Renderer()
     rtx_cuda_free((void**)&_gpu_color_mapping_array);
     rtx_cuda_free((void**)&_gpu_serialized_uv_coordinate_array);
     rtx_cuda_free((void**)&_gpu_render_array);
-    rtx_cuda_free_texture_objects();
+    rtx_cuda_free((void**)&_gpu_render_buffer_array);
+    rtx_cuda_free((void**)&_gpu_output_array);
+    rtx_cuda_free((void**)&_gpu_srgb_array);
+    rtx_cuda_free((void**)&_gpu_active_pixel_index_array);
+    if (_backend == RTXBackendCUDA) {
+        rtx_cuda_free_texture_objects();
+    }
 }
-void Renderer::transform_objects_to_view_space()
+std::shared_ptr<Object> Renderer::transform_object(std::shared_ptr<Object>& object, glm::mat4 transformation_matrix)
 {
+    auto& geometry = object->geometry();
+    auto transformed_geometry = geometry->transoform(transformation_matrix);
+    return std::make_shared<Object>(transformed_geometry, object->material(), object->mapping());
+}
+void Renderer::transform_objects(glm::mat4 view_matrix)
+{
+    // The renderer keeps the objects in world space, so view_matrix is the identity
     int num_objects = _scene->_object_array.size();
     for (auto& group : _scene->_object_group_array) {
         num_objects += group->_object_array.size();
@@ -57,21 +137,17 @@ void Renderer::transform_objects_to_view_space()
 
     for (unsigned int n = 0; n < _scene->_object_array.size(); n++) {
         auto& object = _scene->_object_array[n];
-        auto& geometry = object->geometry();
-        glm::mat4 transformation_matrix = _camera->_view_matrix * geometry->_model_matrix;
-        auto transformed_geometry = geometry->transoform(transformation_matrix);
-        _transformed_object_array.at(n) = std::make_shared<Object>(transformed_geometry, object->material(), object->mapping());
+        glm::mat4 transformation_matrix = view_matrix * object->geometry()->_model_matrix;
+        _transformed_object_array.at(n) = transform_object(object, transformation_matrix);
     }
     int offset = _scene->_object_array.size();
     for (unsigned int group_index = 0; group_index < _scene->_object_group_array.size(); group_index++) {
         auto& group = _scene->_object_group_array[group_index];
-        glm::mat4 view_matrix = _camera->_view_matrix * group->_model_matrix;
+        glm::mat4 group_matrix = view_matrix * group->_model_matrix;
         for (unsigned int n = 0; n < group->_object_array.size(); n++) {
             auto& object = group->_object_array[n];
-            auto& geometry = object->geometry();
-            glm::mat4 transformation_matrix = view_matrix * geometry->_model_matrix;
-            auto transformed_geometry = geometry->transoform(transformation_matrix);
-            _transformed_object_array.at(n + offset) = std::make_shared<Object>(transformed_geometry, object->material(), object->mapping());
+            glm::mat4 transformation_matrix = group_matrix * object->geometry()->_model_matrix;
+            _transformed_object_array.at(n + offset) = transform_object(object, transformation_matrix);
         }
         offset += group->_object_array.size();
     }
@@ -275,23 +351,34 @@ void Renderer::construct_bvh()
 {
     int num_objects = _transformed_object_array.size();
     assert(num_objects > 0);
-    _geometry_bvh_array = std::vector<std::shared_ptr<BVH>>(num_objects);
-    int total_nodes = 0;
+    // BVHの配列は再構築しても使い回す
+    while ((int)_geometry_bvh_array.size() < num_objects) {
+        _geometry_bvh_array.push_back(std::make_shared<BVH>());
+    }
+    _geometry_bvh_array.resize(num_objects);
 
     for (int object_index = 0; object_index < (int)_transformed_object_array.size(); object_index++) {
         auto& object = _transformed_object_array[object_index];
         auto& geometry = object->geometry();
         assert(geometry->bvh_max_triangles_per_node() > 0);
-        std::shared_ptr<BVH> bvh = std::make_shared<BVH>(geometry);
-        _geometry_bvh_array[object_index] = bvh;
+        _geometry_bvh_array[object_index]->build(geometry);
     }
-
+    serialize_bvh_nodes();
+}
+void Renderer::serialize_bvh_nodes()
+{
+    int num_objects = _geometry_bvh_array.size();
+    int total_nodes = 0;
     for (auto& bvh : _geometry_bvh_array) {
         total_nodes += bvh->num_nodes();
     }
 
-    _cpu_threaded_bvh_array = rtx::array<rtxThreadedBVH>(num_objects);
-    _cpu_threaded_bvh_node_array = rtx::array<rtxThreadedBVHNode>(total_nodes);
+    if (_cpu_threaded_bvh_array.size() != num_objects) {
+        _cpu_threaded_bvh_array = rtx::array<rtxThreadedBVH>(num_objects);
+    }
+    if (_cpu_threaded_bvh_node_array.size() != total_nodes) {
+        _cpu_threaded_bvh_node_array = rtx::array<rtxThreadedBVHNode>(total_nodes);
+    }
 
     int node_index_offset = 0;
     for (int object_index = 0; object_index < num_objects; object_index++) {
@@ -344,19 +431,8 @@ void Renderer::free_prev_textures()
     }
     _prev_active_texture_units = std::vector<int>();
 }
-void Renderer::launch_mcrt_kernel()
+rtxMCRTKernelArguments Renderer::mcrt_kernel_arguments()
 {
-    size_t available_shared_memory_bytes = rtx_cuda_get_available_shared_memory_bytes();
-
-    // 必要なブロック数を計算
-    int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
-    int num_threads = _cuda_args->num_threads();
-    int num_rays_per_thread = _cuda_args->num_rays_per_thread();
-    int num_threads_per_pixel = int(ceilf(float(num_rays_per_pixel) / float(num_rays_per_thread)));
-    int num_required_blocks = int(ceilf(float(num_threads_per_pixel * _screen_width * _screen_height) / float(num_threads)));
-
-    int num_active_texture_units = _texture_mapping_ptr_array.size();
-
     float ray_origin_z = 0.0f;
     if (_camera->type() == RTXCameraTypePerspective) {
         PerspectiveCamera* perspective = static_cast<PerspectiveCamera*>(_camera.get());
@@ -383,8 +459,31 @@ void Renderer::launch_mcrt_kernel()
     args.color_mapping_array_size = _cpu_color_mapping_array.size();
     args.threaded_bvh_node_array_size = _cpu_threaded_bvh_node_array.size();
     args.uv_coordinate_array_size = _cpu_serialized_uv_coordinate_array.size();
-    args.curand_seed = _total_frames;
+    args.curand_seed = curand_seed(_rt_args->seed(), _seed_offset, _total_frames);
     args.supersampling_enabled = _rt_args->supersampling_enabled();
+    set_ray_transform(args.ray_transform, _ray_transform);
+    args.num_active_pixels = _screen_width * _screen_height;
+    args.active_pixel_index_array = NULL;
+    if (_num_active_pixels >= 0) {
+        args.num_active_pixels = _num_active_pixels;
+        args.active_pixel_index_array = _backend == RTXBackendCPU ? _cpu_active_pixel_index_array.data() : _gpu_active_pixel_index_array;
+    }
+    return args;
+}
+void Renderer::launch_mcrt_kernel()
+{
+    size_t available_shared_memory_bytes = rtx_cuda_get_available_shared_memory_bytes();
+
+    // 必要なブロック数を計算
+    int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
+    int num_threads = _cuda_args->num_threads();
+    int num_rays_per_thread = _cuda_args->num_rays_per_thread();
+    int num_threads_per_pixel = int(ceilf(float(num_rays_per_pixel) / float(num_rays_per_thread)));
+
+    int num_active_texture_units = _texture_mapping_ptr_array.size();
+
+    rtxMCRTKernelArguments args = mcrt_kernel_arguments();
+    int num_required_blocks = int(ceilf(float(num_threads_per_pixel * args.num_active_pixels) / float(num_threads)));
 
     // アライメントに気をつける
     size_t required_shared_memory_bytes = 0;
@@ -463,19 +562,8 @@ void Renderer::launch_mcrt_kernel()
 
     throw std::runtime_error("Error: Not implemented");
 }
-void Renderer::launch_nee_kernel()
+rtxNEEKernelArguments Renderer::nee_kernel_arguments()
 {
-    size_t available_shared_memory_bytes = rtx_cuda_get_available_shared_memory_bytes();
-
-    // 必要なブロック数を計算
-    int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
-    int num_threads = _cuda_args->num_threads();
-    int num_rays_per_thread = _cuda_args->num_rays_per_thread();
-    int num_threads_per_pixel = int(ceilf(float(num_rays_per_pixel) / float(num_rays_per_thread)));
-    int num_required_blocks = int(ceilf(float(num_threads_per_pixel * _screen_width * _screen_height) / float(num_threads)));
-
-    int num_active_texture_units = _texture_mapping_ptr_array.size();
-
     float ray_origin_z = 0.0f;
     if (_camera->type() == RTXCameraTypePerspective) {
         PerspectiveCamera* perspective = static_cast<PerspectiveCamera*>(_camera.get());
@@ -504,8 +592,31 @@ void Renderer::launch_nee_kernel()
     args.uv_coordinate_array_size = _cpu_serialized_uv_coordinate_array.size();
     args.light_sampling_table_size = _cpu_light_sampling_table.size();
     args.total_light_face_area = _total_light_face_area;
-    args.curand_seed = _total_frames;
+    args.curand_seed = curand_seed(_rt_args->seed(), _seed_offset, _total_frames);
     args.supersampling_enabled = _rt_args->supersampling_enabled();
+    set_ray_transform(args.ray_transform, _ray_transform);
+    args.num_active_pixels = _screen_width * _screen_height;
+    args.active_pixel_index_array = NULL;
+    if (_num_active_pixels >= 0) {
+        args.num_active_pixels = _num_active_pixels;
+        args.active_pixel_index_array = _backend == RTXBackendCPU ? _cpu_active_pixel_index_array.data() : _gpu_active_pixel_index_array;
+    }
+    return args;
+}
+void Renderer::launch_nee_kernel()
+{
+    size_t available_shared_memory_bytes = rtx_cuda_get_available_shared_memory_bytes();
+
+    // 必要なブロック数を計算
+    int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
+    int num_threads = _cuda_args->num_threads();
+    int num_rays_per_thread = _cuda_args->num_rays_per_thread();
+    int num_threads_per_pixel = int(ceilf(float(num_rays_per_pixel) / float(num_rays_per_thread)));
+
+    int num_active_texture_units = _texture_mapping_ptr_array.size();
+
+    rtxNEEKernelArguments args = nee_kernel_arguments();
+    int num_required_blocks = int(ceilf(float(num_threads_per_pixel * args.num_active_pixels) / float(num_threads)));
 
     // アライメントに気をつける
     size_t required_shared_memory_bytes = 0;
@@ -589,179 +700,487 @@ void Renderer::launch_nee_kernel()
 
     throw std::runtime_error("Error: Not implemented");
 }
-void Renderer::render_objects(int height, int width)
+void Renderer::launch_cpu_kernel()
 {
-    // auto start = std::chrono::system_clock::now();
-
-    bool geometry_updated = false;
-    bool should_update_render_buffer = false;
-    bool geometry_size_changed = false;
-    bool should_transfer_to_gpu = false;
-    bool should_reset_total_frames = false;
-    if (_scene->updated()) {
-        geometry_updated = true;
-        geometry_size_changed = true;
-        should_transfer_to_gpu = true;
-        should_reset_total_frames = true;
-    } else {
-        if (_camera->updated()) {
-            geometry_updated = true;
-            should_transfer_to_gpu = true;
-            should_reset_total_frames = true;
-        }
-    }
-    if (_screen_height != height || _screen_width != width) {
-        should_update_render_buffer = true;
-    }
-
-    if (geometry_updated) {
-        transform_objects_to_view_space();
-    }
-
-    // 現在のカメラ座標系でのBVHを構築
-    // Construct BVH in current camera coordinate system
-    if (geometry_updated) {
-        construct_bvh();
-        rtx_cuda_free((void**)&_gpu_threaded_bvh_array);
-        rtx_cuda_free((void**)&_gpu_threaded_bvh_node_array);
-        rtx_cuda_malloc((void**)&_gpu_threaded_bvh_array, _cpu_threaded_bvh_array.bytes());
-        rtx_cuda_malloc((void**)&_gpu_threaded_bvh_node_array, _cpu_threaded_bvh_node_array.bytes());
-        rtx_cuda_memcpy_host_to_device((void*)_gpu_threaded_bvh_array, (void*)_cpu_threaded_bvh_array.data(), _cpu_threaded_bvh_array.bytes());
-        rtx_cuda_memcpy_host_to_device((void*)_gpu_threaded_bvh_node_array, (void*)_cpu_threaded_bvh_node_array.data(), _cpu_threaded_bvh_node_array.bytes());
-    }
-
-    if (geometry_updated) {
-        serialize_objects();
-        compute_face_area_of_lights();
-    }
-
-    if (geometry_size_changed) {
-        assert(_cpu_face_vertex_indices_array.size() > 0);
-        assert(_cpu_vertex_array.size() > 0);
-        assert(_cpu_object_array.size() > 0);
-        assert(_cpu_material_attribute_byte_array.size() > 0);
-        free_prev_textures();
-        rtx_cuda_free((void**)&_gpu_face_vertex_indices_array);
-        rtx_cuda_free((void**)&_gpu_vertex_array);
-        rtx_cuda_free((void**)&_gpu_object_array);
-        rtx_cuda_free((void**)&_gpu_material_attribute_byte_array);
-        rtx_cuda_malloc((void**)&_gpu_face_vertex_indices_array, _cpu_face_vertex_indices_array.bytes());
-        rtx_cuda_malloc((void**)&_gpu_vertex_array, _cpu_vertex_array.bytes());
-        rtx_cuda_malloc((void**)&_gpu_object_array, _cpu_object_array.bytes());
-        rtx_cuda_malloc((void**)&_gpu_material_attribute_byte_array, _cpu_material_attribute_byte_array.bytes());
-        if (_cpu_light_sampling_table.size() > 0) {
-            rtx_cuda_free((void**)&_gpu_light_sampling_table);
-            rtx_cuda_malloc((void**)&_gpu_light_sampling_table, _cpu_light_sampling_table.bytes());
-        }
-        if (_cpu_color_mapping_array.size() > 0) {
-            rtx_cuda_free((void**)&_gpu_color_mapping_array);
-            rtx_cuda_malloc((void**)&_gpu_color_mapping_array, _cpu_color_mapping_array.bytes());
-        }
-        if (_texture_mapping_ptr_array.size() > 0) {
-            for (int texture_unit = 0; texture_unit < (int)_texture_mapping_ptr_array.size(); texture_unit++) {
-                TextureMapping* mapping = _texture_mapping_ptr_array[texture_unit];
-                rtx_cuda_malloc_texture(texture_unit, mapping->width(), mapping->height());
-                rtx_cuda_memcpy_to_texture(texture_unit, 0, mapping->width(), mapping->data(), mapping->bytes());
-                rtx_cuda_bind_texture(texture_unit);
-                _prev_active_texture_units.push_back(texture_unit);
-            }
-            rtx_cuda_transfer_all_texture_objects();
-        }
-        if (_cpu_serialized_uv_coordinate_array.size() > 0) {
-            rtx_cuda_free((void**)&_gpu_serialized_uv_coordinate_array);
-            rtx_cuda_malloc((void**)&_gpu_serialized_uv_coordinate_array, _cpu_serialized_uv_coordinate_array.bytes());
-        }
+    // ホストの直列データをそのまま使う
+    std::vector<rtxCPUTexture> texture_array;
+    for (TextureMapping* mapping : _texture_mapping_ptr_array) {
+        texture_array.push_back({ mapping->data(), mapping->width(), mapping->height() });
     }
 
-    if (should_transfer_to_gpu) {
-        rtx_cuda_memcpy_host_to_device((void*)_gpu_face_vertex_indices_array, (void*)_cpu_face_vertex_indices_array.data(), _cpu_face_vertex_indices_array.bytes());
-        rtx_cuda_memcpy_host_to_device((void*)_gpu_vertex_array, (void*)_cpu_vertex_array.data(), _cpu_vertex_array.bytes());
-        rtx_cuda_memcpy_host_to_device((void*)_gpu_object_array, (void*)_cpu_object_array.data(), _cpu_object_array.bytes());
-        rtx_cuda_memcpy_host_to_device((void*)_gpu_material_attribute_byte_array, (void*)_cpu_material_attribute_byte_array.data(), _cpu_material_attribute_byte_array.bytes());
-        if (_cpu_light_sampling_table.size() > 0) {
-            rtx_cuda_memcpy_host_to_device((void*)_gpu_light_sampling_table, (void*)_cpu_light_sampling_table.data(), _cpu_light_sampling_table.bytes());
-        }
-        if (_cpu_color_mapping_array.size() > 0) {
-            rtx_cuda_memcpy_host_to_device((void*)_gpu_color_mapping_array, (void*)_cpu_color_mapping_array.data(), _cpu_color_mapping_array.bytes());
+    if (_rt_args->next_event_estimation_enabled()) {
+        if (_cpu_light_sampling_table.size() == 0) {
+            throw std::runtime_error("Next event estimation requires at least one light");
         }
-        if (_cpu_serialized_uv_coordinate_array.size() > 0) {
-            rtx_cuda_memcpy_host_to_device((void*)_gpu_serialized_uv_coordinate_array, (void*)_cpu_serialized_uv_coordinate_array.data(), _cpu_serialized_uv_coordinate_array.bytes());
+        rtxNEEKernelArguments args = nee_kernel_arguments();
+        rtx_cpu_launch_nee_kernel(
+            _cpu_face_vertex_indices_array.data(),
+            _cpu_vertex_array.data(),
+            _cpu_object_array.data(),
+            _cpu_material_attribute_byte_array.data(),
+            _cpu_threaded_bvh_array.data(),
+            _cpu_threaded_bvh_node_array.data(),
+            _cpu_color_mapping_array.data(),
+            _cpu_serialized_uv_coordinate_array.data(),
+            _cpu_light_sampling_table.data(),
+            texture_array.data(),
+            _cpu_render_array.data(),
+            args);
+        return;
+    }
+
+    rtxMCRTKernelArguments args = mcrt_kernel_arguments();
+    rtx_cpu_launch_mcrt_kernel(
+        _cpu_face_vertex_indices_array.data(),
+        _cpu_vertex_array.data(),
+        _cpu_object_array.data(),
+        _cpu_material_attribute_byte_array.data(),
+        _cpu_threaded_bvh_array.data(),
+        _cpu_threaded_bvh_node_array.data(),
+        _cpu_color_mapping_array.data(),
+        _cpu_serialized_uv_coordinate_array.data(),
+        texture_array.data(),
+        _cpu_render_array.data(),
+        args);
+}
+void Renderer::transfer_objects_to_device()
+{
+    if (_backend == RTXBackendCPU) {
+        // The CPU kernels read the host arrays directly
+        return;
+    }
+    assert(_cpu_face_vertex_indices_array.size() > 0);
+    assert(_cpu_vertex_array.size() > 0);
+    assert(_cpu_object_array.size() > 0);
+    assert(_cpu_material_attribute_byte_array.size() > 0);
+    reserve_device_array((void**)&_gpu_face_vertex_indices_array, _gpu_face_vertex_indices_array_capacity, _cpu_face_vertex_indices_array.bytes());
+    reserve_device_array((void**)&_gpu_vertex_array, _gpu_vertex_array_capacity, _cpu_vertex_array.bytes());
+    reserve_device_array((void**)&_gpu_object_array, _gpu_object_array_capacity, _cpu_object_array.bytes());
+    reserve_device_array((void**)&_gpu_material_attribute_byte_array, _gpu_material_attribute_byte_array_capacity, _cpu_material_attribute_byte_array.bytes());
+    reserve_device_array((void**)&_gpu_threaded_bvh_array, _gpu_threaded_bvh_array_capacity, _cpu_threaded_bvh_array.bytes());
+    reserve_device_array((void**)&_gpu_threaded_bvh_node_array, _gpu_threaded_bvh_node_array_capacity, _cpu_threaded_bvh_node_array.bytes());
+    reserve_device_array((void**)&_gpu_light_sampling_table, _gpu_light_sampling_table_capacity, _cpu_light_sampling_table.bytes());
+    reserve_device_array((void**)&_gpu_color_mapping_array, _gpu_color_mapping_array_capacity, _cpu_color_mapping_array.bytes());
+    reserve_device_array((void**)&_gpu_serialized_uv_coordinate_array, _gpu_serialized_uv_coordinate_array_capacity, _cpu_serialized_uv_coordinate_array.bytes());
+
+    free_prev_textures();
+    if (_texture_mapping_ptr_array.size() > 0) {
+        for (int texture_unit = 0; texture_unit < (int)_texture_mapping_ptr_array.size(); texture_unit++) {
+            TextureMapping* mapping = _texture_mapping_ptr_array[texture_unit];
+            rtx_cuda_malloc_texture(texture_unit, mapping->width(), mapping->height());
+            rtx_cuda_memcpy_to_texture(texture_unit, 0, mapping->width(), mapping->data(), mapping->bytes());
+            rtx_cuda_bind_texture(texture_unit);
+            _prev_active_texture_units.push_back(texture_unit);
         }
+        rtx_cuda_transfer_all_texture_objects();
     }
 
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_face_vertex_indices_array, (void*)_cpu_face_vertex_indices_array.data(), _cpu_face_vertex_indices_array.bytes());
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_vertex_array, (void*)_cpu_vertex_array.data(), _cpu_vertex_array.bytes());
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_object_array, (void*)_cpu_object_array.data(), _cpu_object_array.bytes());
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_material_attribute_byte_array, (void*)_cpu_material_attribute_byte_array.data(), _cpu_material_attribute_byte_array.bytes());
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_threaded_bvh_array, (void*)_cpu_threaded_bvh_array.data(), _cpu_threaded_bvh_array.bytes());
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_threaded_bvh_node_array, (void*)_cpu_threaded_bvh_node_array.data(), _cpu_threaded_bvh_node_array.bytes());
+    if (_cpu_light_sampling_table.size() > 0) {
+        rtx_cuda_memcpy_host_to_device((void*)_gpu_light_sampling_table, (void*)_cpu_light_sampling_table.data(), _cpu_light_sampling_table.bytes());
+    }
+    if (_cpu_color_mapping_array.size() > 0) {
+        rtx_cuda_memcpy_host_to_device((void*)_gpu_color_mapping_array, (void*)_cpu_color_mapping_array.data(), _cpu_color_mapping_array.bytes());
+    }
+    if (_cpu_serialized_uv_coordinate_array.size() > 0) {
+        rtx_cuda_memcpy_host_to_device((void*)_gpu_serialized_uv_coordinate_array, (void*)_cpu_serialized_uv_coordinate_array.data(), _cpu_serialized_uv_coordinate_array.bytes());
+    }
+}
+void Renderer::transfer_updated_objects_to_device()
+{
+    if (_backend == RTXBackendCPU) {
+        return;
+    }
+    // 更新されたオブジェクトの領域だけを転送する
+    for (int object_index : _updated_object_indices) {
+        const rtxObject& cuda_object = _cpu_object_array[object_index];
+        int vertex_offset = cuda_object.serialized_vertex_index_offset;
+        int face_offset = cuda_object.serialized_face_index_offset;
+        int material_offset = cuda_object.material_attribute_byte_array_offset;
+        size_t material_bytes = _transformed_object_array[object_index]->material()->attribute_bytes();
+        rtx_cuda_memcpy_host_to_device((void*)(_gpu_vertex_array + vertex_offset), (void*)(_cpu_vertex_array.data() + vertex_offset), sizeof(rtxVertex) * cuda_object.num_vertices);
+        rtx_cuda_memcpy_host_to_device((void*)(_gpu_face_vertex_indices_array + face_offset), (void*)(_cpu_face_vertex_indices_array.data() + face_offset), sizeof(rtxFaceVertexIndex) * cuda_object.num_faces);
+        rtx_cuda_memcpy_host_to_device((void*)(_gpu_material_attribute_byte_array + material_offset), (void*)(_cpu_material_attribute_byte_array.data() + material_offset), material_bytes);
+        rtx_cuda_memcpy_host_to_device((void*)(_gpu_object_array + object_index), (void*)(_cpu_object_array.data() + object_index), sizeof(rtxObject));
+        if (cuda_object.mapping_type == RTXMappingTypeSolidColor) {
+            int mapping_index = cuda_object.mapping_index;
+            rtx_cuda_memcpy_host_to_device((void*)(_gpu_color_mapping_array + mapping_index), (void*)(_cpu_color_mapping_array.data() + mapping_index), sizeof(rtxRGBAColor));
+        }
+    }
+    // 葉の数が変わるとノードの位置がずれるのでBVHは全体を転送する
+    reserve_device_array((void**)&_gpu_threaded_bvh_node_array, _gpu_threaded_bvh_node_array_capacity, _cpu_threaded_bvh_node_array.bytes());
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_threaded_bvh_array, (void*)_cpu_threaded_bvh_array.data(), _cpu_threaded_bvh_array.bytes());
+    rtx_cuda_memcpy_host_to_device((void*)_gpu_threaded_bvh_node_array, (void*)_cpu_threaded_bvh_node_array.data(), _cpu_threaded_bvh_node_array.bytes());
+}
+bool Renderer::update_render_array(int height, int width)
+{
     int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
-
-    if (should_update_render_buffer) {
-        int num_rays_per_thread = _cuda_args->num_rays_per_thread();
-        int n = int(ceil(float(num_rays_per_pixel) / float(num_rays_per_thread)));
-        int render_buffer_size = height * width * n;
-        _cpu_render_array = rtx::array<rtxRGBAPixel>(render_buffer_size);
-        _cpu_render_buffer_array = rtx::array<rtxRGBAPixel>(height * width * 3);
+    int num_rays_per_thread = _cuda_args->num_rays_per_thread();
+    int n = int(ceil(float(num_rays_per_pixel) / float(num_rays_per_thread)));
+    int render_array_size = height * width * n;
+    if (_screen_height == height && _screen_width == width && _render_array_size == render_array_size) {
+        return false;
+    }
+    int num_pixels = height * width;
+    _cpu_output_array = rtx::array<float>(num_pixels * 3);
+    _cpu_srgb_array = rtx::array<unsigned char>(num_pixels * 3);
+    _cpu_pixel_sum_array = rtx::array<rtxRGBAPixel>(num_pixels);
+    _cpu_pixel_squared_luminance_sum_array = rtx::array<float>(num_pixels);
+    _cpu_pixel_num_passes_array = rtx::array<int>(num_pixels);
+    _cpu_active_pixel_index_array = rtx::array<int>(num_pixels);
+    if (_backend == RTXBackendCPU) {
+        _cpu_render_array = rtx::array<rtxRGBAPixel>(render_array_size);
+        _cpu_render_buffer_array = rtx::array<rtxRGBAPixel>(num_pixels);
+    } else {
+        // 画素ごとの足し合わせもデバイスで行い、ホストには出力だけを転送する
         rtx_cuda_free((void**)&_gpu_render_array);
-        rtx_cuda_malloc((void**)&_gpu_render_array, _cpu_render_array.bytes());
-        _screen_height = height;
-        _screen_width = width;
+        rtx_cuda_free((void**)&_gpu_render_buffer_array);
+        rtx_cuda_free((void**)&_gpu_output_array);
+        rtx_cuda_free((void**)&_gpu_srgb_array);
+        rtx_cuda_malloc((void**)&_gpu_render_array, sizeof(rtxRGBAPixel) * render_array_size);
+        rtx_cuda_malloc((void**)&_gpu_render_buffer_array, sizeof(rtxRGBAPixel) * num_pixels);
+        rtx_cuda_malloc((void**)&_gpu_output_array, sizeof(float) * num_pixels * 3);
+        rtx_cuda_malloc((void**)&_gpu_srgb_array, sizeof(unsigned char) * num_pixels * 3);
+    }
+    _render_array_size = render_array_size;
+    _screen_height = height;
+    _screen_width = width;
+    return true;
+}
+void Renderer::launch_kernel()
+{
+    if (_backend == RTXBackendCPU) {
+        launch_cpu_kernel();
+        return;
     }
-
-    // auto end = std::chrono::system_clock::now();
-    // double elapsed = std::chrono::duration_cast<std::chrono::milliseconds>(end - start).count();
-    // printf("preprocessing: %lf msec\n", elapsed);
-
-    // start = std::chrono::system_clock::now();
     if (_rt_args->next_event_estimation_enabled()) {
         launch_nee_kernel();
     } else {
         launch_mcrt_kernel();
     }
-    // end = std::chrono::system_clock::now();
-    // elapsed = std::chrono::duration_cast<std::chrono::milliseconds>(end - start).count();
-    // printf("kernel: %lf msec\n", elapsed);
+}
+// CPUではcpu_output_arrayに、CUDAでは_gpu_output_arrayに平均を書き込む
+void Renderer::reduce_render_array(int total_frames, float* cpu_output_array)
+{
+    int num_pixels = _screen_height * _screen_width;
+    int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
+    int num_rays_per_thread = _cuda_args->num_rays_per_thread();
+    int num_threads_per_pixel = int(ceilf(float(num_rays_per_pixel) / float(num_rays_per_thread)));
+    if (_backend == RTXBackendCPU) {
+        rtx_cpu_accumulate_render_array(
+            _cpu_render_array.data(),
+            _cpu_render_buffer_array.data(),
+            cpu_output_array,
+            num_pixels,
+            num_threads_per_pixel,
+            num_rays_per_pixel,
+            total_frames);
+    } else {
+        rtx_cuda_accumulate_render_array(
+            _gpu_render_array,
+            _gpu_render_buffer_array,
+            _gpu_output_array,
+            num_pixels,
+            num_threads_per_pixel,
+            num_rays_per_pixel,
+            total_frames);
+    }
+}
+void Renderer::accumulate_render_array(int total_frames, float* render_buffer)
+{
+    auto start = std::chrono::high_resolution_clock::now();
+    int num_pixels = _screen_height * _screen_width;
+    reduce_render_array(total_frames, render_buffer);
+    if (_backend == RTXBackendCUDA) {
+        rtx_cuda_memcpy_device_to_host((void*)render_buffer, (void*)_gpu_output_array, sizeof(float) * num_pixels * 3);
+    }
+    auto end = std::chrono::high_resolution_clock::now();
+    _accumulation_milliseconds = std::chrono::duration<double, std::milli>(end - start).count();
+}
+void Renderer::accumulate_render_array(int total_frames, unsigned char* render_buffer)
+{
+    auto start = std::chrono::high_resolution_clock::now();
+    int num_pixels = _screen_height * _screen_width;
+    bool denoise_enabled = _rt_args->denoise_enabled();
+    // フィルタの入力と出力は別の領域にする
+    unsigned char* srgb_buffer = denoise_enabled ? _cpu_srgb_array.data() : render_buffer;
+    if (_backend == RTXBackendCPU) {
+        reduce_render_array(total_frames, _cpu_output_array.data());
+        rtx_cpu_encode_srgb(_cpu_output_array.data(), srgb_buffer, num_pixels * 3);
+    } else {
+        // floatの4分の1の大きさで転送する
+        reduce_render_array(total_frames, NULL);
+        rtx_cuda_encode_srgb(_gpu_output_array, _gpu_srgb_array, num_pixels * 3);
+        rtx_cuda_memcpy_device_to_host((void*)srgb_buffer, (void*)_gpu_srgb_array, sizeof(unsigned char) * num_pixels * 3);
+    }
+    if (denoise_enabled) {
+        rtx_cpu_bilateral_filter(srgb_buffer, render_buffer, _screen_height, _screen_width);
+    }
+    auto end = std::chrono::high_resolution_clock::now();
+    _accumulation_milliseconds = std::chrono::duration<double, std::milli>(end - start).count();
+}
+void Renderer::collect_object_versions()
+{
+    // 直列化と同じ順序でオブジェクトを並べる
+    _object_versions.clear();
+    for (auto& object : _scene->_object_array) {
+        _object_versions.push_back({ object, nullptr, object->version(), object->geometry()->version(), -1 });
+    }
+    for (auto& group : _scene->_object_group_array) {
+        for (auto& object : group->_object_array) {
+            _object_versions.push_back({ object, group, object->version(), object->geometry()->version(), group->version() });
+        }
+    }
+}
+void Renderer::collect_updated_objects()
+{
+    assert(_object_versions.size() == _serialized_object_versions.size());
+    _updated_object_indices.clear();
+    for (int object_index = 0; object_index < (int)_object_versions.size(); object_index++) {
+        const ObjectVersion& version = _object_versions[object_index];
+        const ObjectVersion& prev_version = _serialized_object_versions[object_index];
+        if (version.object_version != prev_version.object_version
+            || version.geometry_version != prev_version.geometry_version
+            || version.group_version != prev_version.group_version) {
+            _updated_object_indices.push_back(object_index);
+        }
+    }
+}
+bool Renderer::update_objects_in_place()
+{
+    for (int object_index : _updated_object_indices) {
+        ObjectVersion& version = _object_versions[object_index];
+        glm::mat4 transformation_matrix = version.object->geometry()->_model_matrix;
+        if (version.group) {
+            transformation_matrix = version.group->_model_matrix * transformation_matrix;
+        }
+        std::shared_ptr<Object> transformed_object = transform_object(version.object, transformation_matrix);
+        std::shared_ptr<Object>& prev_object = _transformed_object_array[object_index];
+
+        // 直列化したデータの大きさや光源の構成が変わる場合はその場で書き換えられない
+        auto& geometry = transformed_object->geometry();
+        auto& material = transformed_object->material();
+        auto& mapping = transformed_object->mapping();
+        rtxObject& cuda_object = _cpu_object_array[object_index];
+        if (geometry->type() != cuda_object.geometry_type
+            || geometry->num_faces() != cuda_object.num_faces
+            || geometry->num_vertices() != cuda_object.num_vertices) {
+            return false;
+        }
+        if (material->attribute_bytes() != prev_object->material()->attribute_bytes()
+            || material->is_emissive() != prev_object->material()->is_emissive()) {
+            return false;
+        }
+        if (mapping->type() != RTXMappingTypeSolidColor || prev_object->mapping()->type() != RTXMappingTypeSolidColor) {
+            if (mapping != prev_object->mapping()) {
+                return false;
+            }
+        }
+
+        prev_object = transformed_object;
+        auto& bvh = _geometry_bvh_array[object_index];
+        bvh->build(geometry);
+        geometry->serialize_vertices(_cpu_vertex_array, cuda_object.serialized_vertex_index_offset);
+        bvh->serialize_faces(_cpu_face_vertex_indices_array, cuda_object.serialized_face_index_offset);
+        material->serialize_attributes(_cpu_material_attribute_byte_array, cuda_object.material_attribute_byte_array_offset);
+        cuda_object.num_material_layers = material->num_layers();
+        cuda_object.layerd_material_types = material->types();
+        if (mapping->type() == RTXMappingTypeSolidColor) {
+            SolidColorMapping* m = static_cast<SolidColorMapping*>(mapping.get());
+            auto color = m->color();
+            _cpu_color_mapping_array[cuda_object.mapping_index] = rtxRGBAColor({ color.r, color.g, color.b, color.a });
+        }
+    }
+    serialize_bvh_nodes();
+    compute_face_area_of_lights();
+    transfer_updated_objects_to_device();
+    return true;
+}
+bool Renderer::update_objects_in_world_space()
+{
+    // カメラだけが変わった場合はワールド座標系のBVHと直列データをそのまま使う
+    // Camera-only changes reuse the world space BVHs and serialized objects,
+    // and only the updated objects are serialized again when their sizes are unchanged
+    collect_object_versions();
+    bool same_objects = _objects_in_world_space
+        && _scene->version() == _serialized_scene_version
+        && _object_versions.size() == _serialized_object_versions.size();
+    if (same_objects) {
+        collect_updated_objects();
+        if (_updated_object_indices.size() == 0) {
+            _num_skipped_scene_rebuilds++;
+            return false;
+        }
+        if (update_objects_in_place()) {
+            _num_updated_objects += _updated_object_indices.size();
+            _serialized_object_versions.swap(_object_versions);
+            return true;
+        }
+    }
+    transform_objects(glm::mat4(1.0f));
+    construct_bvh();
+    serialize_objects();
+    compute_face_area_of_lights();
+    transfer_objects_to_device();
+    _objects_in_world_space = true;
+    _serialized_scene_version = _scene->version();
+    _serialized_object_versions.swap(_object_versions);
+    _num_scene_rebuilds++;
+    return true;
+}
+void Renderer::render_objects(int height, int width)
+{
+    bool should_reset_total_frames = update_objects_in_world_space();
 
-    // start = std::chrono::system_clock::now();
-    rtx_cuda_memcpy_device_to_host((void*)_cpu_render_array.data(), (void*)_gpu_render_array, _cpu_render_array.bytes());
-    // end = std::chrono::system_clock::now();
-    // elapsed = std::chrono::duration_cast<std::chrono::milliseconds>(end - start).count();
-    // printf("memcpy: %lf msec\n", elapsed);
+    // The camera only changes the transform applied to the rays
+    glm::mat4 ray_transform = glm::inverse(_camera->_view_matrix);
+    if (_camera->updated() || ray_transform != _ray_transform) {
+        should_reset_total_frames = true;
+    }
+    _ray_transform = ray_transform;
 
-    _scene->set_updated(false);
-    _camera->set_updated(false);
+    // Frames drawn with another seed are not accumulated, so the result
+    // only depends on the seed and the number of frames
+    if (_rt_args->seed() != _seed) {
+        should_reset_total_frames = true;
+    }
+    _seed = _rt_args->seed();
 
+    // The accumulated frames are lost when the render arrays are reallocated
+    if (update_render_array(height, width)) {
+        should_reset_total_frames = true;
+    }
+    // The frame number is counted before the kernel draws with it, so the
+    // n-th frame of an accumulation always uses the same random numbers
     if (should_reset_total_frames) {
         _total_frames = 0;
     }
     _total_frames++;
+    launch_kernel();
 
+    _camera->set_updated(false);
+}
+void Renderer::check_arguments()
+{
+    if (_rt_args->num_rays_per_pixel() < _cuda_args->num_rays_per_thread()) {
+        throw std::runtime_error("rt_args.num_rays_per_pixel must be grater than cuda_args.num_rays_per_thread");
+    }
+}
+// 収束していない画素だけをパスごとに追跡し直し、追跡したレイの数を返す
+long long Renderer::render_adaptive(int seed_offset, float* float_render_buffer, unsigned char* byte_render_buffer)
+{
+    int num_pixels = _screen_height * _screen_width;
+    int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
     int num_rays_per_thread = _cuda_args->num_rays_per_thread();
     int num_threads_per_pixel = int(ceilf(float(num_rays_per_pixel) / float(num_rays_per_thread)));
+    float pixel_error_tolerance = _rt_args->pixel_error_tolerance();
+    float image_error_tolerance = _rt_args->image_error_tolerance();
+    int max_passes = std::max(_rt_args->max_passes(), 1);
+
+    _cpu_pixel_sum_array.fill({ 0.0f, 0.0f, 0.0f, 0.0f });
+    _cpu_pixel_squared_luminance_sum_array.fill(0.0f);
+    _cpu_pixel_num_passes_array.fill(0);
+    for (int pixel_index = 0; pixel_index < num_pixels; pixel_index++) {
+        _cpu_active_pixel_index_array[pixel_index] = pixel_index;
+    }
+    _num_active_pixels = num_pixels;
+    long long num_rays_spent = 0;
 
-    // start = std::chrono::system_clock::now();
-    for (int y = 0; y < height; y++) {
-        for (int x = 0; x < width; x++) {
-            rtxRGBAPixel pixel_buffer = _cpu_render_buffer_array[y * width * 3 + x * 3];
-            if (_total_frames == 1) {
-                pixel_buffer.r = 0.0;
-                pixel_buffer.g = 0.0;
-                pixel_buffer.b = 0.0;
-            }
-            for (int m = 0; m < num_threads_per_pixel; m++) {
-                int index = y * width * num_threads_per_pixel + x * num_threads_per_pixel + m;
-                rtxRGBAPixel pixel = _cpu_render_array[index];
-                pixel_buffer.r += pixel.r / float(num_rays_per_pixel);
-                pixel_buffer.g += pixel.g / float(num_rays_per_pixel);
-                pixel_buffer.b += pixel.b / float(num_rays_per_pixel);
+    for (int pass = 0; pass < max_passes; pass++) {
+        if (_backend == RTXBackendCUDA) {
+            reserve_device_array((void**)&_gpu_active_pixel_index_array, _gpu_active_pixel_index_array_capacity, sizeof(int) * _num_active_pixels);
+            rtx_cuda_memcpy_host_to_device((void*)_gpu_active_pixel_index_array, (void*)_cpu_active_pixel_index_array.data(), sizeof(int) * _num_active_pixels);
+        }
+        // Pass n is seeded like the n-th frame of a progressive render
+        _seed_offset = seed_offset;
+        _total_frames = pass + 1;
+        launch_kernel();
+        num_rays_spent += (long long)_num_active_pixels * num_rays_per_pixel;
+
+        // このパスの各画素の平均が追跡した画素の順に並ぶ
+        if (_backend == RTXBackendCPU) {
+            rtx_cpu_accumulate_render_array(
+                _cpu_render_array.data(),
+                _cpu_render_buffer_array.data(),
+                _cpu_output_array.data(),
+                _num_active_pixels,
+                num_threads_per_pixel,
+                num_rays_per_pixel,
+                1);
+        } else {
+            rtx_cuda_accumulate_render_array(
+                _gpu_render_array,
+                _gpu_render_buffer_array,
+                _gpu_output_array,
+                _num_active_pixels,
+                num_threads_per_pixel,
+                num_rays_per_pixel,
+                1);
+            rtx_cuda_memcpy_device_to_host((void*)_cpu_output_array.data(), (void*)_gpu_output_array, sizeof(float) * _num_active_pixels * 3);
+        }
+        for (int n = 0; n < _num_active_pixels; n++) {
+            int pixel_index = _cpu_active_pixel_index_array[n];
+            float r = _cpu_output_array[n * 3 + 0];
+            float g = _cpu_output_array[n * 3 + 1];
+            float b = _cpu_output_array[n * 3 + 2];
+            float luminance = 0.2126f * r + 0.7152f * g + 0.0722f * b;
+            rtxRGBAPixel& sum = _cpu_pixel_sum_array[pixel_index];
+            sum.r += r;
+            sum.g += g;
+            sum.b += b;
+            sum.a += luminance;
+            _cpu_pixel_squared_luminance_sum_array[pixel_index] += luminance * luminance;
+            _cpu_pixel_num_passes_array[pixel_index]++;
+        }
+        if (pass + 1 < RTX_ADAPTIVE_SAMPLING_MIN_PASSES) {
+            continue;
+        }
+
+        // パスごとの平均のばらつきから各画素の推定値の標準誤差を求め、
+        // 許容値を超える画素だけを次のパスで追跡する
+        double squared_error_sum = 0.0;
+        int num_active_pixels = 0;
+        for (int pixel_index = 0; pixel_index < num_pixels; pixel_index++) {
+            float n = _cpu_pixel_num_passes_array[pixel_index];
+            float mean = _cpu_pixel_sum_array[pixel_index].a / n;
+            float variance = std::max(_cpu_pixel_squared_luminance_sum_array[pixel_index] / n - mean * mean, 0.0f) * n / (n - 1.0f);
+            float squared_error = variance / n;
+            squared_error_sum += squared_error;
+            if (squared_error > pixel_error_tolerance * pixel_error_tolerance) {
+                _cpu_active_pixel_index_array[num_active_pixels] = pixel_index;
+                num_active_pixels++;
             }
-            _cpu_render_buffer_array[y * width * 3 + x * 3] = pixel_buffer;
+        }
+        _num_active_pixels = num_active_pixels;
+        float image_error = sqrtf(squared_error_sum / num_pixels);
+        if (image_error <= image_error_tolerance || num_active_pixels == 0) {
+            break;
         }
     }
-    // end = std::chrono::system_clock::now();
-    // elapsed = std::chrono::duration_cast<std::chrono::milliseconds>(end - start).count();
-    // printf("reduce_sum: %lf msec\n", elapsed);
-}
-void Renderer::check_arguments()
-{
-    if (_rt_args->num_rays_per_pixel() < _cuda_args->num_rays_per_thread()) {
-        throw std::runtime_error("rt_args.num_rays_per_pixel must be grater than cuda_args.num_rays_per_thread");
+    _num_active_pixels = -1;
+
+    float* linear_buffer = float_render_buffer != NULL ? float_render_buffer : _cpu_output_array.data();
+    for (int pixel_index = 0; pixel_index < num_pixels; pixel_index++) {
+        const rtxRGBAPixel& sum = _cpu_pixel_sum_array[pixel_index];
+        float n = _cpu_pixel_num_passes_array[pixel_index];
+        linear_buffer[pixel_index * 3 + 0] = sum.r / n;
+        linear_buffer[pixel_index * 3 + 1] = sum.g / n;
+        linear_buffer[pixel_index * 3 + 2] = sum.b / n;
     }
+    if (byte_render_buffer != NULL) {
+        bool denoise_enabled = _rt_args->denoise_enabled();
+        unsigned char* srgb_buffer = denoise_enabled ? _cpu_srgb_array.data() : byte_render_buffer;
+        rtx_cpu_encode_srgb(linear_buffer, srgb_buffer, num_pixels * 3);
+        if (denoise_enabled) {
+            rtx_cpu_bilateral_filter(srgb_buffer, byte_render_buffer, _screen_height, _screen_width);
+        }
+    }
+    return num_rays_spent;
 }
 void Renderer::render(
     std::shared_ptr<Scene> scene,
@@ -770,65 +1189,168 @@ void Renderer::render(
     std::shared_ptr<CUDAKernelLaunchArguments> cuda_args,
     py::array_t<float, py::array::c_style> np_render_buffer)
 {
+    render_image_objects(scene, camera, rt_args, cuda_args, np_render_buffer, np_render_buffer.mutable_data(), NULL);
+}
+void Renderer::render(
+    std::shared_ptr<Scene> scene,
+    std::shared_ptr<Camera> camera,
+    std::shared_ptr<RayTracingArguments> rt_args,
+    std::shared_ptr<CUDAKernelLaunchArguments> cuda_args,
+    py::array_t<unsigned char, py::array::c_style> np_render_buffer)
+{
+    render_image_objects(scene, camera, rt_args, cuda_args, np_render_buffer, NULL, np_render_buffer.mutable_data());
+}
+// float_render_bufferとbyte_render_bufferのどちらか一方に書き込む
+void Renderer::render_image_objects(
+    std::shared_ptr<Scene>& scene,
+    std::shared_ptr<Camera>& camera,
+    std::shared_ptr<RayTracingArguments>& rt_args,
+    std::shared_ptr<CUDAKernelLaunchArguments>& cuda_args,
+    py::array& np_render_buffer,
+    float* float_render_buffer,
+    unsigned char* byte_render_buffer)
+{
+    if (scene != _scene) {
+        _objects_in_world_space = false;
+    }
     _scene = scene;
     _camera = camera;
     _rt_args = rt_args;
     _cuda_args = cuda_args;
     check_arguments();
+    _seed_offset = 0;
 
+    if (np_render_buffer.ndim() != 3 || np_render_buffer.shape(2) != 3) {
+        throw std::runtime_error("render_buffer must be (height, width, 3)");
+    }
     int height = np_render_buffer.shape(0);
     int width = np_render_buffer.shape(1);
-    render_objects(height, width);
+    _num_rays_spent.clear();
+
+    if (_rt_args->adaptive_sampling_enabled()) {
+        update_objects_in_world_space();
+        _ray_transform = glm::inverse(_camera->_view_matrix);
+        update_render_array(height, width);
+        _num_rays_spent.push_back(render_adaptive(0, float_render_buffer, byte_render_buffer));
+        _camera->set_updated(false);
+        // The next progressive render starts a new accumulation
+        _seed_offset = 0;
+        _total_frames = 0;
+        return;
+    }
 
-    auto pixel = np_render_buffer.mutable_unchecked<3>();
-    for (int y = 0; y < height; y++) {
-        for (int x = 0; x < width; x++) {
-            rtxRGBAPixel pixel_buffer = _cpu_render_buffer_array[y * width * 3 + x * 3];
-            pixel(y, x, 0) = pixel_buffer.r / _total_frames;
-            pixel(y, x, 1) = pixel_buffer.g / _total_frames;
-            pixel(y, x, 2) = pixel_buffer.b / _total_frames;
-        }
+    render_objects(height, width);
+    _num_rays_spent.push_back((long long)height * width * _rt_args->num_rays_per_pixel());
+    if (float_render_buffer != NULL) {
+        accumulate_render_array(_total_frames, float_render_buffer);
+    } else {
+        accumulate_render_array(_total_frames, byte_render_buffer);
     }
 }
-void Renderer::render(
+void Renderer::render_views(
     std::shared_ptr<Scene> scene,
-    std::shared_ptr<Camera> camera,
+    std::vector<std::shared_ptr<Camera>> cameras,
+    std::shared_ptr<RayTracingArguments> rt_args,
+    std::shared_ptr<CUDAKernelLaunchArguments> cuda_args,
+    py::array_t<float, py::array::c_style> np_render_buffer)
+{
+    render_views_objects(scene, cameras, rt_args, cuda_args, np_render_buffer, np_render_buffer.mutable_data(), NULL);
+}
+void Renderer::render_views(
+    std::shared_ptr<Scene> scene,
+    std::vector<std::shared_ptr<Camera>> cameras,
     std::shared_ptr<RayTracingArguments> rt_args,
     std::shared_ptr<CUDAKernelLaunchArguments> cuda_args,
-    unsigned char* render_buffer,
-    int height,
-    int width,
-    int channels,
-    int num_blocks,
-    int num_threads)
+    py::array_t<unsigned char, py::array::c_style> np_render_buffer)
+{
+    render_views_objects(scene, cameras, rt_args, cuda_args, np_render_buffer, NULL, np_render_buffer.mutable_data());
+}
+// float_render_bufferとbyte_render_bufferのどちらか一方に書き込む
+void Renderer::render_views_objects(
+    std::shared_ptr<Scene>& scene,
+    std::vector<std::shared_ptr<Camera>>& cameras,
+    std::shared_ptr<RayTracingArguments>& rt_args,
+    std::shared_ptr<CUDAKernelLaunchArguments>& cuda_args,
+    py::array& np_render_buffer,
+    float* float_render_buffer,
+    unsigned char* byte_render_buffer)
 {
+    if (scene != _scene) {
+        _objects_in_world_space = false;
+    }
     _scene = scene;
-    _camera = camera;
     _rt_args = rt_args;
     _cuda_args = cuda_args;
+    check_arguments();
 
-    if (channels != 3) {
-        throw std::runtime_error("channels != 3");
+    if (np_render_buffer.ndim() != 4 || np_render_buffer.shape(3) != 3) {
+        throw std::runtime_error("render_buffer must be (num_views, height, width, 3)");
+    }
+    if (np_render_buffer.shape(0) != (int)cameras.size()) {
+        throw std::runtime_error("render_buffer.shape[0] must be equal to len(cameras)");
+    }
+    int num_views = cameras.size();
+    int height = np_render_buffer.shape(1);
+    int width = np_render_buffer.shape(2);
+    if (num_views == 0) {
+        return;
     }
 
-    render_objects(height, width);
-
-    int num_rays_per_pixel = _rt_args->num_rays_per_pixel();
-    for (int y = 0; y < height; y++) {
-        for (int x = 0; x < width; x++) {
-            rtxRGBAPixel sum = { 0.0f, 0.0f, 0.0f };
-            for (int m = 0; m < num_rays_per_pixel; m++) {
-                int index = y * width * num_rays_per_pixel + x * num_rays_per_pixel + m;
-                rtxRGBAPixel pixel = _cpu_render_array[index];
-                sum.r += pixel.r;
-                sum.g += pixel.g;
-                sum.b += pixel.b;
-            }
-            int index = y * width * channels + x * channels;
-            render_buffer[index + 0] = std::min(std::max((int)(sum.r / float(num_rays_per_pixel) * 255.0f), 0), 255);
-            render_buffer[index + 1] = std::min(std::max((int)(sum.g / float(num_rays_per_pixel) * 255.0f), 0), 255);
-            render_buffer[index + 2] = std::min(std::max((int)(sum.b / float(num_rays_per_pixel) * 255.0f), 0), 255);
+    // The objects, BVHs and device buffers are kept in world space and
+    // every camera only changes the transform applied to its rays
+    update_objects_in_world_space();
+    _num_skipped_scene_rebuilds += num_views - 1;
+
+    update_render_array(height, width);
+    _num_rays_spent.clear();
+
+    for (int view_index = 0; view_index < num_views; view_index++) {
+        _camera = cameras[view_index];
+        _ray_transform = glm::inverse(_camera->_view_matrix);
+        // Every view is written into its own slice
+        int offset = view_index * height * width * 3;
+        float* float_view_buffer = float_render_buffer != NULL ? float_render_buffer + offset : NULL;
+        unsigned char* byte_view_buffer = byte_render_buffer != NULL ? byte_render_buffer + offset : NULL;
+        if (_rt_args->adaptive_sampling_enabled()) {
+            _num_rays_spent.push_back(render_adaptive(view_index, float_view_buffer, byte_view_buffer));
+            _camera->set_updated(false);
+            continue;
+        }
+        // Every view is the first frame of its own accumulation, drawn like
+        // a fresh render() with rt_args.seed + view_index
+        _seed_offset = view_index;
+        _total_frames = 1;
+        launch_kernel();
+        _camera->set_updated(false);
+        _num_rays_spent.push_back((long long)height * width * _rt_args->num_rays_per_pixel());
+        if (float_view_buffer != NULL) {
+            accumulate_render_array(1, float_view_buffer);
+        } else {
+            accumulate_render_array(1, byte_view_buffer);
         }
     }
+    // The next call to render starts a new accumulation
+    _seed_offset = 0;
+    _total_frames = 0;
+}
+int Renderer::num_scene_rebuilds()
+{
+    return _num_scene_rebuilds;
+}
+int Renderer::num_skipped_scene_rebuilds()
+{
+    return _num_skipped_scene_rebuilds;
+}
+int Renderer::num_updated_objects()
+{
+    return _num_updated_objects;
+}
+double Renderer::accumulation_milliseconds()
+{
+    return _accumulation_milliseconds;
+}
+std::vector<long long> Renderer::num_rays_spent()
+{
+    return _num_rays_spent;
+}
 }
-}
\ No newline at end of file
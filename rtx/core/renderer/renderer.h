@@ -13,10 +13,20 @@
 #include <memory>
 #include <pybind11/numpy.h>
 #include <random>
+#include <string>
 
 namespace rtx {
 class Renderer {
 private:
+    // Versions of the object in one slot of the serialized arrays
+    struct ObjectVersion {
+        std::shared_ptr<Object> object;
+        std::shared_ptr<ObjectGroup> group;
+        int object_version;
+        int geometry_version;
+        int group_version;
+    };
+
     // Host
     rtx::array<rtxFaceVertexIndex> _cpu_face_vertex_indices_array;
     rtx::array<rtxVertex> _cpu_vertex_array;
@@ -25,7 +35,17 @@ private:
     rtx::array<rtxThreadedBVH> _cpu_threaded_bvh_array;
     rtx::array<rtxThreadedBVHNode> _cpu_threaded_bvh_node_array;
     rtx::array<rtxRGBAPixel> _cpu_render_array;
+    // Sum of the per-pixel means of the accumulated frames
     rtx::array<rtxRGBAPixel> _cpu_render_buffer_array;
+    // Linear output of the CPU backend before it is encoded to sRGB
+    rtx::array<float> _cpu_output_array;
+    // sRGB image before the denoise
+    rtx::array<unsigned char> _cpu_srgb_array;
+    // Adaptive sampling: per-pixel sums over the passes and the pixels traced in the next pass
+    rtx::array<rtxRGBAPixel> _cpu_pixel_sum_array;
+    rtx::array<float> _cpu_pixel_squared_luminance_sum_array;
+    rtx::array<int> _cpu_pixel_num_passes_array;
+    rtx::array<int> _cpu_active_pixel_index_array;
     rtx::array<int> _cpu_light_sampling_table;
     rtx::array<rtxRGBAColor> _cpu_color_mapping_array;
     rtx::array<rtxUVCoordinate> _cpu_serialized_uv_coordinate_array;
@@ -38,9 +58,25 @@ private:
     rtxThreadedBVH* _gpu_threaded_bvh_array;
     rtxThreadedBVHNode* _gpu_threaded_bvh_node_array;
     rtxRGBAPixel* _gpu_render_array;
+    rtxRGBAPixel* _gpu_render_buffer_array;
+    // (height, width, 3) copied straight into the caller's buffer
+    float* _gpu_output_array;
+    unsigned char* _gpu_srgb_array;
+    int* _gpu_active_pixel_index_array;
     int* _gpu_light_sampling_table;
     rtxRGBAColor* _gpu_color_mapping_array;
     rtxUVCoordinate* _gpu_serialized_uv_coordinate_array;
+    // Allocated bytes of each device array, which only grow by doubling
+    size_t _gpu_face_vertex_indices_array_capacity;
+    size_t _gpu_vertex_array_capacity;
+    size_t _gpu_object_array_capacity;
+    size_t _gpu_material_attribute_byte_array_capacity;
+    size_t _gpu_threaded_bvh_array_capacity;
+    size_t _gpu_threaded_bvh_node_array_capacity;
+    size_t _gpu_light_sampling_table_capacity;
+    size_t _gpu_color_mapping_array_capacity;
+    size_t _gpu_serialized_uv_coordinate_array_capacity;
+    size_t _gpu_active_pixel_index_array_capacity;
 
     std::shared_ptr<Scene> _scene;
     std::shared_ptr<Camera> _camera;
@@ -50,32 +86,85 @@ private:
     std::vector<std::shared_ptr<BVH>> _geometry_bvh_array;
     std::vector<TextureMapping*> _texture_mapping_ptr_array;
 
+    // Camera space to world space, where the objects are serialized
+    glm::mat4 _ray_transform;
+    // The host and device arrays hold _scene in world space
+    bool _objects_in_world_space;
+    int _serialized_scene_version;
+    std::vector<ObjectVersion> _serialized_object_versions;
+    std::vector<ObjectVersion> _object_versions;
+    std::vector<int> _updated_object_indices;
+    int _num_scene_rebuilds;
+    int _num_skipped_scene_rebuilds;
+    int _num_updated_objects;
+    // RTXBackendCUDA or RTXBackendCPU
+    int _backend;
+
     float _total_light_face_area;
     int _screen_height;
     int _screen_width;
     int _total_frames;
+    // 前回のフレームを描いた乱数のseed
+    int _seed;
+    // render_viewsのk番目の視点はseed + kで描く
+    int _seed_offset;
+    int _render_array_size;
+    // -1 while every pixel is traced
+    int _num_active_pixels;
+    std::vector<long long> _num_rays_spent;
+    // Time spent reducing the last frame into the caller's buffer
+    double _accumulation_milliseconds;
     std::vector<int> _prev_active_texture_units;
 
     void check_arguments();
     void construct_bvh();
-    void transform_objects_to_view_space();
-    void transform_geometries_to_view_space();
-    void transform_lights_to_view_space();
+    void serialize_bvh_nodes();
+    std::shared_ptr<Object> transform_object(std::shared_ptr<Object>& object, glm::mat4 transformation_matrix);
+    void transform_objects(glm::mat4 view_matrix);
     void serialize_geometries();
     void serialize_textures();
     void serialize_materials();
     void serialize_color_mappings();
     void serialize_light_sampling_table();
     void serialize_objects();
-    void serialize_rays(int height, int width);
     void compute_face_area_of_lights();
+    bool update_objects_in_world_space();
     void render_objects(int height, int width);
+    void collect_object_versions();
+    void collect_updated_objects();
+    bool update_objects_in_place();
+    void transfer_objects_to_device();
+    void transfer_updated_objects_to_device();
+    bool update_render_array(int height, int width);
+    void launch_kernel();
+    void reduce_render_array(int total_frames, float* cpu_output_array);
+    void accumulate_render_array(int total_frames, float* render_buffer);
+    void accumulate_render_array(int total_frames, unsigned char* render_buffer);
+    long long render_adaptive(int seed_offset, float* float_render_buffer, unsigned char* byte_render_buffer);
+    void render_image_objects(std::shared_ptr<Scene>& scene,
+        std::shared_ptr<Camera>& camera,
+        std::shared_ptr<RayTracingArguments>& rt_args,
+        std::shared_ptr<CUDAKernelLaunchArguments>& cuda_args,
+        pybind11::array& np_render_buffer,
+        float* float_render_buffer,
+        unsigned char* byte_render_buffer);
+    void render_views_objects(std::shared_ptr<Scene>& scene,
+        std::vector<std::shared_ptr<Camera>>& cameras,
+        std::shared_ptr<RayTracingArguments>& rt_args,
+        std::shared_ptr<CUDAKernelLaunchArguments>& cuda_args,
+        pybind11::array& np_render_buffer,
+        float* float_render_buffer,
+        unsigned char* byte_render_buffer);
+    rtxMCRTKernelArguments mcrt_kernel_arguments();
+    rtxNEEKernelArguments nee_kernel_arguments();
     void launch_mcrt_kernel();
     void launch_nee_kernel();
+    void launch_cpu_kernel();
     void free_prev_textures();
 
 public:
     Renderer();
+    Renderer(std::string backend);
     ~Renderer();
     void render(std::shared_ptr<Scene> scene,
         std::shared_ptr<Camera> camera,
@@ -86,11 +175,21 @@ public:
         std::shared_ptr<Camera> camera,
         std::shared_ptr<RayTracingArguments> rt_args,
         std::shared_ptr<CUDAKernelLaunchArguments> cuda_args,
-        unsigned char* array,
-        int height,
-        int width,
-        int channels,
-        int num_blocks,
-        int num_threads);
+        pybind11::array_t<unsigned char, pybind11::array::c_style> array);
+    void render_views(std::shared_ptr<Scene> scene,
+        std::vector<std::shared_ptr<Camera>> cameras,
+        std::shared_ptr<RayTracingArguments> rt_args,
+        std::shared_ptr<CUDAKernelLaunchArguments> cuda_args,
+        pybind11::array_t<float, pybind11::array::c_style> array);
+    void render_views(std::shared_ptr<Scene> scene,
+        std::vector<std::shared_ptr<Camera>> cameras,
+        std::shared_ptr<RayTracingArguments> rt_args,
+        std::shared_ptr<CUDAKernelLaunchArguments> cuda_args,
+        pybind11::array_t<unsigned char, pybind11::array::c_style> array);
+    int num_scene_rebuilds();
+    int num_skipped_scene_rebuilds();
+    int num_updated_objects();
+    double accumulation_milliseconds();
+    std::vector<long long> num_rays_spent();
 };
 }
\ No newline at end of file
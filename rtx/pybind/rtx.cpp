@@ -19,9 +19,11 @@
 #include "../core/material/oren_nayar.h"
 #include "../core/renderer/arguments/cuda_kernel.h"
 #include "../core/renderer/arguments/ray_tracing.h"
+#include "../core/renderer/bvh/bvh.h"
 #include "../core/renderer/header/bridge.h"
 #include "../core/renderer/renderer.h"
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
 
 namespace py = pybind11;
 using namespace rtx;
@@ -52,6 +54,8 @@ PYBIND11_MODULE(rtx, module)
         .def(py::init<py::tuple>(), py::arg("ambient_color"))
         .def("add", (void (Scene::*)(std::shared_ptr<Object>)) & Scene::add, py::arg("add"))
         .def("add", (void (Scene::*)(std::shared_ptr<ObjectGroup>)) & Scene::add, py::arg("add"))
+        .def("set_object_transforms", &Scene::set_object_transforms, py::arg("transforms"))
+        .def("set_colors", &Scene::set_colors, py::arg("colors"))
         .def("num_triangles", &Scene::num_triangles);
 
     // Geometries
@@ -94,6 +98,12 @@ PYBIND11_MODULE(rtx, module)
         .def_property("num_rays_per_pixel", &RayTracingArguments::num_rays_per_pixel, &RayTracingArguments::set_num_rays_per_pixel)
         .def_property("next_event_estimation_enabled", &RayTracingArguments::next_event_estimation_enabled, &RayTracingArguments::set_next_event_estimation_enabled)
         .def_property("supersampling_enabled", &RayTracingArguments::supersampling_enabled, &RayTracingArguments::set_supersampling_enabled)
+        .def_property("denoise_enabled", &RayTracingArguments::denoise_enabled, &RayTracingArguments::set_denoise_enabled)
+        .def_property("adaptive_sampling_enabled", &RayTracingArguments::adaptive_sampling_enabled, &RayTracingArguments::set_adaptive_sampling_enabled)
+        .def_property("pixel_error_tolerance", &RayTracingArguments::pixel_error_tolerance, &RayTracingArguments::set_pixel_error_tolerance)
+        .def_property("image_error_tolerance", &RayTracingArguments::image_error_tolerance, &RayTracingArguments::set_image_error_tolerance)
+        .def_property("max_passes", &RayTracingArguments::max_passes, &RayTracingArguments::set_max_passes)
+        .def_property("seed", &RayTracingArguments::seed, &RayTracingArguments::set_seed)
         .def_property("max_bounce", &RayTracingArguments::max_bounce, &RayTracingArguments::set_max_bounce);
     py::class_<CUDAKernelLaunchArguments, std::shared_ptr<CUDAKernelLaunchArguments>>(module, "CUDAKernelLaunchArguments")
         .def(py::init<>())
@@ -114,7 +124,22 @@ PYBIND11_MODULE(rtx, module)
 
     py::class_<Renderer, std::shared_ptr<Renderer>>(module, "Renderer")
         .def(py::init<>())
-        .def("render", (void (Renderer::*)(std::shared_ptr<Scene>, std::shared_ptr<Camera>, std::shared_ptr<RayTracingArguments>, std::shared_ptr<CUDAKernelLaunchArguments>, py::array_t<float, py::array::c_style>)) & Renderer::render, py::arg("scene"), py::arg("camera"), py::arg("rt_args"), py::arg("cuda_args"), py::arg("render_buffer"));
+        .def(py::init<std::string>(), py::arg("backend"))
+        .def("render", (void (Renderer::*)(std::shared_ptr<Scene>, std::shared_ptr<Camera>, std::shared_ptr<RayTracingArguments>, std::shared_ptr<CUDAKernelLaunchArguments>, py::array_t<float, py::array::c_style>)) & Renderer::render, py::arg("scene"), py::arg("camera"), py::arg("rt_args"), py::arg("cuda_args"), py::arg("render_buffer"))
+        .def("render", (void (Renderer::*)(std::shared_ptr<Scene>, std::shared_ptr<Camera>, std::shared_ptr<RayTracingArguments>, std::shared_ptr<CUDAKernelLaunchArguments>, py::array_t<unsigned char, py::array::c_style>)) & Renderer::render, py::arg("scene"), py::arg("camera"), py::arg("rt_args"), py::arg("cuda_args"), py::arg("render_buffer"))
+        .def("render_views", (void (Renderer::*)(std::shared_ptr<Scene>, std::vector<std::shared_ptr<Camera>>, std::shared_ptr<RayTracingArguments>, std::shared_ptr<CUDAKernelLaunchArguments>, py::array_t<float, py::array::c_style>)) & Renderer::render_views, py::arg("scene"), py::arg("cameras"), py::arg("rt_args"), py::arg("cuda_args"), py::arg("render_buffer"))
+        .def("render_views", (void (Renderer::*)(std::shared_ptr<Scene>, std::vector<std::shared_ptr<Camera>>, std::shared_ptr<RayTracingArguments>, std::shared_ptr<CUDAKernelLaunchArguments>, py::array_t<unsigned char, py::array::c_style>)) & Renderer::render_views, py::arg("scene"), py::arg("cameras"), py::arg("rt_args"), py::arg("cuda_args"), py::arg("render_buffer"))
+        .def_property_readonly("num_scene_rebuilds", &Renderer::num_scene_rebuilds)
+        .def_property_readonly("num_skipped_scene_rebuilds", &Renderer::num_skipped_scene_rebuilds)
+        .def_property_readonly("num_updated_objects", &Renderer::num_updated_objects)
+        .def_property_readonly("accumulation_milliseconds", &Renderer::accumulation_milliseconds)
+        .def_property_readonly("num_rays_spent", &Renderer::num_rays_spent);
+
+    // BVH
+    py::class_<BVH, std::shared_ptr<BVH>>(module, "BVH")
+        .def(py::init([](std::shared_ptr<Geometry> geometry) { return std::make_shared<BVH>(geometry); }), py::arg("geometry"))
+        .def("num_nodes", &BVH::num_nodes)
+        .def("count_traversal_steps", &BVH::count_traversal_steps, py::arg("ray_origins"), py::arg("ray_directions"));
 
     // Utils
     module.def("get_device_count", &rtx_get_device_count);
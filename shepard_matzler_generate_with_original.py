@@ -1,8 +1,9 @@
 import argparse
 import colorsys
 import math
-import random
+import multiprocessing
 import time
+import traceback
 import cv2
 
 import matplotlib.pyplot as plt
@@ -10,7 +11,14 @@ import numpy as np
 from tqdm import tqdm
 
 import gqn
-import rtx
+from gqn.data import index as dataset_index
+
+# Path tracing settings of RTXRenderer; adaptive sampling spends up to the
+# same number of rays per pixel in passes
+NUM_RAYS_PER_PIXEL = 512
+MAX_BOUNCE = 2
+ADAPTIVE_NUM_RAYS_PER_PASS = 64
+ADAPTIVE_MAX_PASSES = 8
 
 def rotate_viewpoint(angle_rad):
     view_radius = 3
@@ -43,7 +51,7 @@ def get_available_axis_and_direction(space, pos):
     return ret
 
 
-def generate_block_positions(num_cubes):
+def generate_block_positions(num_cubes, random_state):
     assert num_cubes > 0
 
     current_relative_pos = (0, 0, 0)
@@ -57,7 +65,8 @@ def generate_block_positions(num_cubes):
     for _ in range(num_cubes - 1):
         available_axis_and_direction = get_available_axis_and_direction(
             block_abs_locations, current_absolute_pos)
-        axis, direction = random.choice(available_axis_and_direction)
+        axis, direction = available_axis_and_direction[random_state.randint(
+            len(available_axis_and_direction))]
         offset = [0, 0, 0]
         offset[axis] = direction
         new_relative_pos = (offset[0] + current_relative_pos[0],
@@ -93,22 +102,34 @@ def generate_block_positions(num_cubes):
     return position_array, center_of_gravity
 
 
-def build_scene(color_array):
+def generate_scene_description(num_cubes, color_array, random_state):
     # Generate positions of each cube
-    cube_position_array, shift = generate_block_positions(args.num_cubes)
-    assert len(cube_position_array) == args.num_cubes
+    cube_position_array, shift = generate_block_positions(
+        num_cubes, random_state)
+    assert len(cube_position_array) == num_cubes
 
-    # Place block
-    scene = rtx.Scene(ambient_color=(0, 0, 0))
+    cubes = []
     for position in cube_position_array:
-        geometry = rtx.BoxGeometry(1, 1, 1)
-        geometry.set_position((
+        position = (
             position[0] - shift[0],
             position[1] - shift[1],
             position[2] - shift[2],
-        ))
+        )
+        color = color_array[random_state.randint(len(color_array))]
+        cubes.append((position, color))
+    return cubes
+
+
+def build_scene(cubes):
+    import rtx
+
+    # Place block
+    scene = rtx.Scene(ambient_color=(0, 0, 0))
+    for position, color in cubes:
+        geometry = rtx.BoxGeometry(1, 1, 1)
+        geometry.set_position(position)
         material = rtx.LambertMaterial(0.3)
-        mapping = rtx.SolidColorMapping(random.choice(color_array))
+        mapping = rtx.SolidColorMapping(color)
         cube = rtx.Object(geometry, material, mapping)
         scene.add(cube)
 
@@ -137,100 +158,406 @@ def build_scene(color_array):
     return scene
 
 
-def main():
-    # Set GPU device
-    rtx.set_device(args.gpu_device)
-
-    # Initialize colors
+class RTXRenderer():
+    def __init__(self, image_size, gpu_device, backend="cuda"):
+        import rtx
+
+        # Set GPU device
+        if backend == "cuda":
+            rtx.set_device(gpu_device)
+
+        # Setting up a raytracer
+        self.rt_args = rtx.RayTracingArguments()
+        self.rt_args.num_rays_per_pixel = NUM_RAYS_PER_PIXEL
+        self.rt_args.max_bounce = MAX_BOUNCE
+        self.rt_args.supersampling_enabled = False
+        # Gamma correction and the bilateral filter run inside the renderer
+        self.rt_args.denoise_enabled = True
+
+        self.cuda_args = rtx.CUDAKernelLaunchArguments()
+        self.cuda_args.num_threads = 64
+        self.cuda_args.num_rays_per_thread = 32
+
+        self.renderer = rtx.Renderer(backend=backend)
+        self.image_size = image_size
+        self.rtx = rtx
+        self.cameras = []
+        self.scene = None
+        self.num_cubes = 0
+
+    def enable_adaptive_sampling(self, pixel_error_tolerance,
+                                 image_error_tolerance):
+        # Rays are spent in passes only on the pixels that have not
+        # converged yet
+        self.rt_args.adaptive_sampling_enabled = True
+        self.rt_args.num_rays_per_pixel = ADAPTIVE_NUM_RAYS_PER_PASS
+        self.rt_args.max_passes = ADAPTIVE_MAX_PASSES
+        self.rt_args.pixel_error_tolerance = pixel_error_tolerance
+        self.rt_args.image_error_tolerance = image_error_tolerance
+
+    def set_seed(self, seed):
+        self.rt_args.seed = seed
+
+    def set_scene(self, cubes):
+        # Lights, materials and geometries are built once and only the
+        # cube positions and colors are replaced for each observation
+        if self.scene is None or self.num_cubes != len(cubes):
+            self.scene = build_scene(cubes)
+            self.num_cubes = len(cubes)
+            return
+        positions, colors = zip(*cubes)
+        self.scene.set_object_transforms(np.array(positions, dtype=np.float32))
+        # Alpha is not part of SolidColorMapping
+        self.scene.set_colors(np.array(colors, dtype=np.float32)[:, :3])
+
+    def render_views(self, eyes, center):
+        # The scene is serialized once for all of the viewpoints and
+        # the renderer writes uint8 sRGB images
+        while len(self.cameras) < len(eyes):
+            self.cameras.append(self.rtx.OrthographicCamera())
+        cameras = self.cameras[:len(eyes)]
+        for camera, eye in zip(cameras, eyes):
+            camera.look_at(eye, center, up=(0, 1, 0))
+        images = np.zeros(
+            (len(eyes), self.image_size, self.image_size, 3), dtype=np.uint8)
+        self.renderer.render_views(self.scene, cameras, self.rt_args,
+                                   self.cuda_args, images)
+        return images
+
+
+class CPURenderer():
+    # Stand-in for rtx that needs no GPU: the cubes are ray cast with the same
+    # orthographic camera and shaded by the two lights as directional lights
+    def __init__(self, image_size):
+        self.image_size = image_size
+        self.render_buffer = np.zeros(
+            (image_size, image_size, 3), dtype=np.float32)
+        rotation = rotation_matrix(-math.pi / 3, math.pi / 4)
+        self.lights = [
+            (rotation @ np.array([-1.0, 0.0, 0.0]), 0.9),
+            (rotation @ np.array([1.0, 0.0, 0.0]), 0.1),
+        ]
+        self.cubes = None
+
+    def set_seed(self, seed):
+        # Ray casting draws no random numbers
+        pass
+
+    def set_scene(self, cubes):
+        self.cubes = cubes
+
+    def render(self, eye, center):
+        eye = np.asarray(eye, dtype=np.float64)
+        forward = np.asarray(center, dtype=np.float64) - eye
+        forward /= np.linalg.norm(forward)
+        right = np.cross(forward, (0, 1, 0))
+        right /= np.linalg.norm(right)
+        up = np.cross(right, forward)
+
+        # rtx spans [-|eye|, |eye|] on both screen axes for orthographic cameras
+        extent = np.linalg.norm(eye)
+        screen = 2 * np.arange(self.image_size) / self.image_size - 1
+        x = screen[None, :, None] * extent
+        y = -screen[:, None, None] * extent
+        origins = eye + x * right + y * up
+
+        direction = np.where(np.abs(forward) < 1e-8, 1e-8, forward)
+        nearest = np.full((self.image_size, self.image_size), np.inf)
+        normals = np.zeros((self.image_size, self.image_size, 3))
+        colors = np.zeros((self.image_size, self.image_size, 3))
+        for position, color in self.cubes:
+            t0 = (np.asarray(position) - 0.5 - origins) / direction
+            t1 = (np.asarray(position) + 0.5 - origins) / direction
+            t_near = np.minimum(t0, t1)
+            t_far = np.maximum(t0, t1).min(axis=2)
+            axis = t_near.argmax(axis=2)
+            t_near = t_near.max(axis=2)
+            hit = (t_near <= t_far) & (t_far > 0) & (t_near < nearest)
+            nearest[hit] = t_near[hit]
+            normal = np.zeros_like(normals)
+            np.put_along_axis(normal, axis[..., None], 1, axis=2)
+            normals[hit] = -np.sign(direction) * normal[hit]
+            colors[hit] = color[:3]
+
+        shading = np.zeros((self.image_size, self.image_size))
+        for light_direction, intensity in self.lights:
+            shading += intensity * np.clip(normals @ light_direction, 0, None)
+        self.render_buffer[...] = colors * shading[..., None]
+        return self.render_buffer
+
+    def render_views(self, eyes, center):
+        render_buffers = np.stack([self.render(eye, center).copy() for eye in eyes])
+        return gqn.postprocess.to_images(render_buffers)
+
+
+def rotation_matrix(pitch, yaw):
+    cos_x, sin_x = math.cos(pitch), math.sin(pitch)
+    cos_y, sin_y = math.cos(yaw), math.sin(yaw)
+    rotation_x = np.array([[1, 0, 0], [0, cos_x, -sin_x], [0, sin_x, cos_x]])
+    rotation_y = np.array([[cos_y, 0, sin_y], [0, 1, 0], [-sin_y, 0, cos_y]])
+    return rotation_y @ rotation_x
+
+
+def create_renderer(worker_index):
+    if args.renderer == "cpu":
+        return CPURenderer(args.image_size)
+    if args.renderer == "rtx-cpu":
+        renderer = RTXRenderer(args.image_size, None, backend="cpu")
+    else:
+        gpu_device = args.gpu_device[worker_index % len(args.gpu_device)]
+        renderer = RTXRenderer(args.image_size, gpu_device)
+    if args.adaptive_sampling:
+        renderer.enable_adaptive_sampling(args.pixel_error_tolerance,
+                                          args.image_error_tolerance)
+    return renderer
+
+
+def get_color_array(num_colors):
     color_array = []
-    for n in range(args.num_colors):
-        hue = n / (args.num_colors - 1)
+    for n in range(num_colors):
+        hue = n / (num_colors - 1)
         saturation = 0.9
         lightness = 1
         red, green, blue = colorsys.hsv_to_rgb(hue, saturation, lightness)
         color_array.append((red, green, blue, 1))
+    return color_array
 
-    screen_width = args.image_size
-    screen_height = args.image_size
 
-    # Setting up a raytracer
-    rt_args = rtx.RayTracingArguments()
-    rt_args.num_rays_per_pixel = 512
-    rt_args.max_bounce = 2
-    rt_args.supersampling_enabled = False
+def get_observation_index(file_number, observation_index_in_file):
+    # Index of the observation counted from the first observation of file 001
+    return (file_number - 1) * get_num_observations_per_file(
+    ) + observation_index_in_file
 
-    cuda_args = rtx.CUDAKernelLaunchArguments()
-    cuda_args.num_threads = 64
-    cuda_args.num_rays_per_thread = 32
 
-    renderer = rtx.Renderer()
-    render_buffer = np.zeros(
-        (screen_height, screen_width, 3), dtype=np.float32)
+def generate_observation(renderer, color_array, observation_index):
+    # The cubes, the viewpoints and the path tracing noise are all drawn from
+    # the seed of the observation, so any observation can be regenerated alone
+    random_state = np.random.RandomState([args.seed, observation_index])
+    renderer.set_seed(random_state.randint(2**31))
+    cubes = generate_scene_description(args.num_cubes, color_array,
+                                       random_state)
+    renderer.set_scene(cubes)
+    scene_data = gqn.archiver.SceneData((args.image_size, args.image_size),
+                                        args.num_views_per_scene,
+                                        args.frames_per_rotation)
+
+    view_radius = 3
+    angle_rad = 0
+    center = (0, 0, 0)
+
+    rotation_eyes = []
+    for _ in range(args.frames_per_rotation):
+        eye = rotate_viewpoint(angle_rad)
+        eye = tuple(view_radius * (eye / np.linalg.norm(eye)))
+        rotation_eyes.append(eye)
+        angle_rad += 2 * math.pi / args.frames_per_rotation
+
+    eyes = []
+    for _ in range(args.num_views_per_scene):
+        eye = random_state.normal(size=3)
+        eye = tuple(view_radius * (eye / np.linalg.norm(eye)))
+        eyes.append(eye)
+
+    # Every frame of the scene is rendered in one call as sRGB images
+    images = renderer.render_views(rotation_eyes + eyes, center)
+
+    for image in images[:args.frames_per_rotation]:
+        scene_data.add_orig(image)
+
+    for eye, image in zip(eyes, images[args.frames_per_rotation:]):
+        # plt.imshow(image, interpolation="none")
+        # plt.pause(1e-8)
+
+        yaw = gqn.math.yaw(eye, center)
+        pitch = gqn.math.pitch(eye, center)
+        scene_data.add(image, eye, math.cos(yaw), math.sin(yaw),
+                       math.cos(pitch), math.sin(pitch))
+
+    return scene_data
+
+
+def get_num_observations_per_file():
+    return min(args.num_observations_per_file, args.total_observations)
+
+
+def get_file_observations(file_index):
+    # Number of observations that go into the file_index-th file
+    num_observations_per_file = get_num_observations_per_file()
+    start = file_index * num_observations_per_file
+    return min(num_observations_per_file, args.total_observations - start)
+
+
+def get_metadata():
+    # Every argument and setting that the rendered observations depend on.
+    # Files written with different metadata are generated again on resume
+    return {
+        "seed": args.seed,
+        "image_size": args.image_size,
+        "num_views_per_scene": args.num_views_per_scene,
+        "frames_per_rotation": args.frames_per_rotation,
+        "num_cubes": args.num_cubes,
+        "num_colors": args.num_colors,
+        "renderer": args.renderer,
+        "num_rays_per_pixel": NUM_RAYS_PER_PIXEL,
+        "max_bounce": MAX_BOUNCE,
+        "adaptive_sampling": args.adaptive_sampling,
+        "adaptive_num_rays_per_pass": ADAPTIVE_NUM_RAYS_PER_PASS,
+        "adaptive_max_passes": ADAPTIVE_MAX_PASSES,
+        "pixel_error_tolerance": args.pixel_error_tolerance,
+        "image_error_tolerance": args.image_error_tolerance,
+    }
+
+
+def is_file_complete(manifest, file_index):
+    entry = manifest.get(args.initial_file_number + file_index)
+    if entry is None:
+        return False
+    num_observations = get_file_observations(file_index)
+    image_shape = [args.image_size, args.image_size, 3]
+    shapes = {
+        "images": [num_observations, args.num_views_per_scene] + image_shape,
+        "viewpoints": [num_observations, args.num_views_per_scene, 7],
+        "original_images":
+        [num_observations, args.frames_per_rotation] + image_shape,
+    }
+    if entry["format"] != args.format or entry["metadata"] != get_metadata():
+        return False
+    for name, shape in shapes.items():
+        if entry["arrays"][name]["shape"] != shape:
+            return False
+    return gqn.archiver.verify_entry(args.output_directory, entry)
+
+
+def get_incomplete_file_indices(num_files):
+    # Files in the manifest that were generated with the same arguments are
+    # kept, so an interrupted run continues where it stopped
+    manifest = gqn.archiver.load_manifest(args.output_directory)
+    return [
+        file_index for file_index in range(num_files)
+        if is_file_complete(manifest, file_index) is False
+    ]
+
+
+def generate_files(worker_index, file_indices, update_progress):
+    # Every observation is generated from its own seed, so the output does not
+    # depend on how the files are split between workers
+    renderer = create_renderer(worker_index)
+    color_array = get_color_array(args.num_colors)
 
     dataset = gqn.archiver.Archiver(
         directory=args.output_directory,
-        total_observations=args.total_observations,
-        num_observations_per_file=min(args.num_observations_per_file,
-                                      args.total_observations),
+        total_observations=sum(
+            get_file_observations(file_index) for file_index in file_indices),
+        num_observations_per_file=get_num_observations_per_file(),
         image_size=(args.image_size, args.image_size),
         num_views_per_scene=args.num_views_per_scene,
         frames_per_rotation=args.frames_per_rotation,
-        initial_file_number=args.initial_file_number)
+        initial_file_number=args.initial_file_number + file_indices[0],
+        streaming=args.streaming,
+        async_write=args.async_write,
+        format=args.format,
+        metadata=get_metadata())
+
+    for file_index in file_indices:
+        file_number = args.initial_file_number + file_index
+        dataset.start_file(file_number)
+        for n in range(get_file_observations(file_index)):
+            scene_data = generate_observation(
+                renderer, color_array, get_observation_index(file_number, n))
+            dataset.add(scene_data)
+            update_progress(1)
+
+    dataset.close()
+    return dataset.write_stats
+
+
+def run_worker(worker_arguments, worker_index, file_indices, progress_queue):
+    global args
+    args = worker_arguments
+    try:
+        # A finished worker sends the write stats of its files
+        write_stats = generate_files(worker_index, file_indices, progress_queue.put)
+        progress_queue.put(write_stats)
+    except Exception:
+        progress_queue.put(traceback.format_exc())
+
+
+def print_write_stats(write_stats):
+    for stats in sorted(write_stats, key=lambda stats: stats["file_number"]):
+        print("file {:03d}: {:.2f} sec, {:.1f} MB/s".format(
+            stats["file_number"], stats["seconds"],
+            stats["bytes"] / max(stats["seconds"], 1e-8) / 1024**2))
+    seconds = sum(stats["seconds"] for stats in write_stats)
+    num_bytes = sum(stats["bytes"] for stats in write_stats)
+    if len(write_stats) > 0:
+        print("{} files: {:.2f} sec per file, {:.1f} MB/s".format(
+            len(write_stats), seconds / len(write_stats),
+            num_bytes / max(seconds, 1e-8) / 1024**2))
+
+
+def generate_dataset(file_indices):
+    num_observations = sum(
+        get_file_observations(file_index) for file_index in file_indices)
+    num_workers = min(args.num_workers, len(file_indices))
+
+    if num_workers == 1:
+        with tqdm(total=num_observations) as progress_bar:
+            write_stats = generate_files(0, file_indices, progress_bar.update)
+        print_write_stats(write_stats)
+        return
+
+    # Each worker gets a contiguous range of files; spawn keeps CUDA state out
+    # of the children
+    context = multiprocessing.get_context("spawn")
+    progress_queue = context.Queue()
+    workers = []
+    for worker_index, indices in enumerate(
+            np.array_split(file_indices, num_workers)):
+        worker = context.Process(
+            target=run_worker,
+            args=(args, worker_index, [int(index) for index in indices],
+                  progress_queue))
+        worker.start()
+        workers.append(worker)
+
+    num_finished = 0
+    errors = []
+    write_stats = []
+    with tqdm(total=num_observations) as progress_bar:
+        while num_finished < num_workers:
+            message = progress_queue.get()
+            if isinstance(message, int):
+                progress_bar.update(message)
+                continue
+            num_finished += 1
+            if isinstance(message, list):
+                write_stats.extend(message)
+            else:
+                errors.append(message)
+    for worker in workers:
+        worker.join()
+    if len(errors) > 0:
+        raise RuntimeError("\n".join(errors))
+    print_write_stats(write_stats)
 
-    camera = rtx.OrthographicCamera()
 
-    for _ in tqdm(range(args.total_observations)):
-        scene = build_scene(color_array)
-        scene_data = gqn.archiver.SceneData((args.image_size, args.image_size),
-                                            args.num_views_per_scene,
-                                            args.frames_per_rotation)
-
-        view_radius = 3
-        angle_rad = 0
-
-        for _ in range(args.frames_per_rotation):
-            eye = rotate_viewpoint(angle_rad)
-            eye = tuple(view_radius * (eye / np.linalg.norm(eye)))
-            center = (0, 0, 0)
-            camera.look_at(eye, center, up=(0, 1, 0))
-
-            renderer.render(scene, camera, rt_args, cuda_args, render_buffer)
-
-            # Convert to sRGB
-            image = np.power(np.clip(render_buffer, 0, 1), 1.0 / 2.2)
-            image = np.uint8(image * 255)
-            image = cv2.bilateralFilter(image, 3, 25, 25)
-
-            scene_data.add_orig(image)
-            angle_rad += 2 * math.pi / args.frames_per_rotation
-
-        for _ in range(args.num_views_per_scene):
-            eye = np.random.normal(size=3)
-            eye = tuple(view_radius * (eye / np.linalg.norm(eye)))
-            center = (0, 0, 0)
-            camera.look_at(eye, center, up=(0, 1, 0))
-
-            renderer.render(scene, camera, rt_args, cuda_args, render_buffer)
-
-            # Convert to sRGB
-            image = np.power(np.clip(render_buffer, 0, 1), 1.0 / 2.2)
-            image = np.uint8(image * 255)
-            image = cv2.bilateralFilter(image, 3, 25, 25)
-
-            # plt.imshow(image, interpolation="none")
-            # plt.pause(1e-8)
-
-            yaw = gqn.math.yaw(eye, center)
-            pitch = gqn.math.pitch(eye, center)
-            scene_data.add(image, eye, math.cos(yaw), math.sin(yaw),
-                           math.cos(pitch), math.sin(pitch))
-
-        dataset.add(scene_data)
+def main():
+    num_files = math.ceil(
+        args.total_observations / get_num_observations_per_file())
+    file_indices = get_incomplete_file_indices(num_files)
+    if len(file_indices) < num_files:
+        print("{} of {} files are already complete".format(
+            num_files - len(file_indices), num_files))
+    if len(file_indices) > 0:
+        generate_dataset(file_indices)
+    # Written once after every worker has finished, so that workers never
+    # race on it
+    dataset_index.update(args.output_directory)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--gpu-device", "-gpu", type=int, default=0)
+    parser.add_argument("--gpu-device", "-gpu", type=int, nargs="+", default=[0])
     parser.add_argument(
         "--total-observations", "-total", type=int, default=2000000)
     parser.add_argument(
@@ -241,6 +568,17 @@ if __name__ == "__main__":
     parser.add_argument("--image-size", type=int, default=64)
     parser.add_argument("--num-cubes", "-cubes", type=int, default=5)
     parser.add_argument("--num-colors", "-colors", type=int, default=12)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--async-write", action="store_true")
+    parser.add_argument(
+        "--format", type=str, default="npy", choices=["npy", "chunked"])
+    parser.add_argument("--num-workers", "-workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--renderer", type=str, default="rtx", choices=["rtx", "rtx-cpu", "cpu"])
+    parser.add_argument("--adaptive-sampling", action="store_true")
+    parser.add_argument("--pixel-error-tolerance", type=float, default=0.01)
+    parser.add_argument("--image-error-tolerance", type=float, default=0.005)
     parser.add_argument(
         "--output-directory",
         "-out",
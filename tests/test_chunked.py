@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from gqn.data import chunked
+
+
+@pytest.fixture
+def arrays(tmp_path):
+    array = np.arange(5 * 2 * 3 * 4, dtype=np.float32).reshape((5, 2, 3, 4))
+    path = str(tmp_path / "001") + chunked.EXTENSION
+    chunked.save(path, array)
+    chunked_array = chunked.load(path, mmap_mode="r")
+    yield array, chunked_array
+    chunked_array.close()
+
+
+@pytest.mark.parametrize("key", [
+    (0, 1),
+    (0, 0, 0),
+    (-1, 1, 2, 3),
+    (slice(1, 4), 0),
+    (slice(None), slice(None), 1),
+    ([3, 0], 1, slice(0, 2)),
+    (np.array([True, False, True, False, True]), 0),
+    (Ellipsis, 2),
+    (2, Ellipsis, 1),
+    (),
+])
+def test_tuple_keys_match_ndarray(arrays, key):
+    array, chunked_array = arrays
+    np.testing.assert_array_equal(chunked_array[key], array[key])
+
+
+def test_take_raises_for_out_of_range_indices(arrays):
+    array, chunked_array = arrays
+    np.testing.assert_array_equal(chunked_array.take([-5, 4]), array.take([-5, 4], axis=0))
+    for indices in ([5], [-6], [0, 7]):
+        with pytest.raises(IndexError):
+            chunked_array.take(indices)
+    with pytest.raises(IndexError):
+        chunked_array[[1, 5]]
+    with pytest.raises(IndexError):
+        chunked_array[5, 0]
+
+
+def test_save_and_load_without_scenes(tmp_path):
+    path = str(tmp_path / "empty.npy")
+    np.save(path, np.zeros((0, 3, 4), np.float32))
+    output_path = str(tmp_path / "empty") + chunked.EXTENSION
+    chunked.save(output_path, np.load(path, mmap_mode="r"))
+    chunked_array = chunked.load(output_path, mmap_mode="r")
+    assert chunked_array.shape == (0, 3, 4)
+    assert chunked_array.dtype == np.float32
+    assert chunked_array[:].shape == (0, 3, 4)
+    chunked_array.close()
+
+
+def test_writer_without_scenes_needs_scene_shape(tmp_path):
+    writer = chunked.ChunkedWriter(str(tmp_path / "empty") + chunked.EXTENSION)
+    with pytest.raises(ValueError):
+        writer.close()
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+
+from gqn.data import Dataset
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for file_number in range(1, 4):
+        arrays = {
+            "images": np.zeros((4, 2, 8, 8, 3), dtype=np.uint8),
+            "viewpoints": np.zeros((4, 2, 7), dtype=np.float32),
+            "original_images": np.zeros((4, 2, 16, 16, 3), dtype=np.uint8),
+        }
+        for name, array in arrays.items():
+            os.makedirs(str(tmp_path / name), exist_ok=True)
+            np.save(str(tmp_path / name / "{:03d}.npy".format(file_number)), array)
+    return str(tmp_path)
+
+
+def test_cache_charges_loaded_arrays(directory):
+    # One subset is 4 * (2 * 8 * 8 * 3 + 2 * 7 * 4 + 2 * 16 * 16 * 3) bytes
+    subset_bytes = 4 * (384 + 56 + 1536)
+    with Dataset(directory, cache_bytes=2 * subset_bytes) as dataset:
+        for subset_index in (0, 1, 2, 0):
+            dataset[subset_index]
+        assert dataset.cache.num_bytes == 2 * subset_bytes
+        assert dataset.cache.hits == 0
+
+
+def test_cache_keeps_memory_mapped_subsets(directory):
+    # A budget smaller than one loaded subset still keeps every memory map
+    with Dataset(directory, mmap_mode="r", cache_bytes=1) as dataset:
+        for subset_index in (0, 1, 2, 0):
+            dataset[subset_index]
+        assert len(dataset.cache) == 3
+        assert dataset.cache.hits == 1
@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+import pytest
+
+rtx = pytest.importorskip("rtx")
+
+SEED = 7
+IMAGE_SIZE = 16
+
+
+def build_scene():
+    scene = rtx.Scene(ambient_color=(0, 0, 0))
+    for position, color in (((-1, 0, 0), (1, 0, 0)), ((1, 0, 0), (0, 0, 1))):
+        geometry = rtx.BoxGeometry(1, 1, 1)
+        geometry.set_position(position)
+        scene.add(
+            rtx.Object(geometry, rtx.LambertMaterial(0.5),
+                       rtx.SolidColorMapping(color)))
+    geometry = rtx.PlainGeometry(50, 50)
+    geometry.set_rotation((0, math.pi / 2, 0))
+    geometry.set_position((-10, 0, 0))
+    scene.add(
+        rtx.Object(geometry, rtx.EmissiveMaterial(10, visible=False),
+                   rtx.SolidColorMapping((1, 1, 1))))
+    return scene
+
+
+def make_cameras(num_views):
+    cameras = []
+    for view_index in range(num_views):
+        rad = 2 * math.pi * view_index / num_views
+        camera = rtx.OrthographicCamera()
+        camera.look_at((3 * math.cos(rad), 1, 3 * math.sin(rad)), (0, 0, 0),
+                       up=(0, 1, 0))
+        cameras.append(camera)
+    return cameras
+
+
+def make_args():
+    rt_args = rtx.RayTracingArguments()
+    rt_args.num_rays_per_pixel = 16
+    rt_args.max_bounce = 2
+    rt_args.seed = SEED
+    cuda_args = rtx.CUDAKernelLaunchArguments()
+    cuda_args.num_threads = 64
+    cuda_args.num_rays_per_thread = 16
+    return rt_args, cuda_args
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+@pytest.mark.parametrize("adaptive_sampling", [False, True])
+def test_render_views_matches_render(dtype, adaptive_sampling):
+    scene = build_scene()
+    cameras = make_cameras(3)
+    rt_args, cuda_args = make_args()
+    if adaptive_sampling:
+        rt_args.adaptive_sampling_enabled = True
+        rt_args.max_passes = 4
+        rt_args.pixel_error_tolerance = 0.01
+        rt_args.image_error_tolerance = 0.005
+
+    views = np.zeros((len(cameras), IMAGE_SIZE, IMAGE_SIZE, 3), dtype=dtype)
+    renderer = rtx.Renderer(backend="cpu")
+    renderer.render_views(scene, cameras, rt_args, cuda_args, views)
+    num_rays_spent = renderer.num_rays_spent
+
+    # View k is rendered like a fresh render() with seed + k
+    renderer = rtx.Renderer(backend="cpu")
+    for view_index, camera in enumerate(cameras):
+        rt_args.seed = SEED + view_index
+        image = np.zeros((IMAGE_SIZE, IMAGE_SIZE, 3), dtype=dtype)
+        renderer.render(scene, camera, rt_args, cuda_args, image)
+        assert np.array_equal(views[view_index], image)
+        assert renderer.num_rays_spent == [num_rays_spent[view_index]]
+
+
+def test_render_views_decorrelates_views():
+    scene = build_scene()
+    camera = make_cameras(1)[0]
+    rt_args, cuda_args = make_args()
+    views = np.zeros((2, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+    rtx.Renderer(backend="cpu").render_views(scene, [camera, camera], rt_args,
+                                             cuda_args, views)
+    assert not np.array_equal(views[0], views[1])
@@ -0,0 +1,47 @@
+import argparse
+
+import gqn
+import shepard_matzler_generate_with_original as generator
+
+
+def make_args(directory, **kwargs):
+    values = dict(
+        gpu_device=[0],
+        total_observations=2,
+        num_observations_per_file=2,
+        initial_file_number=1,
+        num_views_per_scene=1,
+        frames_per_rotation=1,
+        image_size=4,
+        num_cubes=2,
+        num_colors=3,
+        streaming=False,
+        async_write=False,
+        format="npy",
+        num_workers=1,
+        seed=0,
+        renderer="cpu",
+        adaptive_sampling=True,
+        pixel_error_tolerance=0.01,
+        image_error_tolerance=0.005,
+        output_directory=directory)
+    values.update(kwargs)
+    return argparse.Namespace(**values)
+
+
+def test_resume_keeps_files_with_the_same_arguments(tmp_path):
+    generator.args = make_args(str(tmp_path))
+    generator.main()
+    assert generator.get_incomplete_file_indices(1) == []
+
+
+def test_resume_regenerates_files_with_another_tolerance(tmp_path):
+    generator.args = make_args(str(tmp_path))
+    generator.main()
+
+    generator.args = make_args(str(tmp_path), pixel_error_tolerance=0.02)
+    assert generator.get_incomplete_file_indices(1) == [0]
+    generator.main()
+    entry = gqn.archiver.load_manifest(str(tmp_path))[1]
+    assert entry["metadata"]["pixel_error_tolerance"] == 0.02
+    assert generator.get_incomplete_file_indices(1) == []
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pytest
+
+from gqn.data import Dataset, GlobalSampler, Iterator
+from gqn.data.sampler import Permutation
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    # Observation i has every image pixel and viewpoint set to i
+    start = 0
+    for file_number, size in enumerate([7, 5, 9], 1):
+        values = np.arange(start, start + size)
+        arrays = {
+            "images": np.broadcast_to(values[:, None, None, None, None], (size, 2, 4, 4, 3)).astype(np.uint8),
+            "viewpoints": np.broadcast_to(values[:, None, None], (size, 2, 7)).astype(np.float32),
+            "original_images": np.broadcast_to(values[:, None, None, None, None], (size, 3, 4, 4, 3)).astype(np.uint8),
+        }
+        for name, array in arrays.items():
+            os.makedirs(str(tmp_path / name), exist_ok=True)
+            np.save(str(tmp_path / name / "{:03d}.npy".format(file_number)), array)
+        start += size
+    dataset = Dataset(str(tmp_path))
+    yield dataset
+    dataset.close()
+
+
+def test_iterator_over_global_sampler(dataset):
+    sampler = GlobalSampler(dataset, buffer_size=8, seed=1)
+    iterator = Iterator(dataset.observations, batch_size=4, drop_last=False, sampler=sampler)
+    for epoch in range(2):
+        seen = []
+        for images, viewpoints, original_images in iterator.batches():
+            assert np.all(images == images[:, :1, :1, :1, :1])
+            assert np.array_equal(viewpoints[:, 0, 0], images[:, 0, 0, 0, 0])
+            assert np.array_equal(original_images[:, 0, 0, 0, 0], images[:, 0, 0, 0, 0])
+            seen.extend(images[:, 0, 0, 0, 0].tolist())
+        assert sorted(seen) == list(range(21))
+        assert sampler.epoch == epoch + 1
+
+
+def test_global_sampler_pairs_match_indices(dataset):
+    sampler = GlobalSampler(dataset, buffer_size=8, seed=2)
+    offsets = [0, 7, 12]
+    pairs = list(sampler)
+    assert sorted(offsets[subset_index] + index for subset_index, index in pairs) == list(range(21))
+    sampler.epoch = 0
+    assert [offsets[s] + i for s, i in pairs] == sampler.indices(0, 21).tolist()
+
+
+def test_global_sampler_resumes_without_replaying(dataset):
+    sampler = GlobalSampler(dataset, buffer_size=8, seed=3)
+    sampler.epoch = 5
+    pairs = list(sampler)
+
+    resumed = GlobalSampler(dataset, buffer_size=8, seed=0)
+    resumed.load_state_dict({"seed": 3, "epoch": 5, "position": 17})
+    assert list(resumed) == pairs[17:]
+    assert resumed.epoch == 6 and resumed.position == 0
+
+
+class LargeDataset:
+    # Only the sizes are needed by the sampler
+    def __len__(self):
+        return 10000
+
+    def subset_size(self, subset_index):
+        return 100000
+
+
+def test_global_sampler_resumes_late_in_a_large_epoch():
+    sampler = GlobalSampler(LargeDataset())
+    position = len(sampler) - 3
+    sampler.load_state_dict({"seed": 0, "epoch": 0, "position": position})
+    # Replaying a billion positions would not finish
+    pairs = [pair for pair in sampler]
+    assert len(pairs) == 3
+    indices = GlobalSampler(LargeDataset()).indices(position, position + 3)
+    assert indices.tolist() == [100000 * subset_index + index for subset_index, index in pairs]
+
+
+def test_permutation_of_size_zero():
+    permutation = Permutation(0)
+    assert permutation(np.arange(0)).shape == (0, )
+    with pytest.raises(IndexError):
+        permutation([0])
+    with pytest.raises(ValueError):
+        Permutation(-1)
+
+
+def test_global_sampler_skips_empty_subsets(tmp_path):
+    for file_number, size in enumerate([3, 0, 2, 0], 1):
+        for name, shape in [("images", (2, 4, 4, 3)), ("viewpoints", (2, 7))]:
+            os.makedirs(str(tmp_path / name), exist_ok=True)
+            np.save(str(tmp_path / name / "{:03d}.npy".format(file_number)), np.zeros((size, ) + shape))
+    sampler = GlobalSampler(Dataset(str(tmp_path), use_original_images=False), buffer_size=2)
+    assert sorted(sampler) == [(0, 0), (0, 1), (0, 2), (2, 0), (2, 1)]
+
+
+def test_global_sampler_over_empty_dataset(tmp_path):
+    os.makedirs(str(tmp_path / "images"))
+    sampler = GlobalSampler(Dataset(str(tmp_path)))
+    assert len(sampler) == 0
+    assert list(sampler) == []